@@ -0,0 +1,316 @@
+"""
+Binary snapshots of a SocialMediaAnalyzer.
+
+Layout:
+
+    prefix   magic, format version, header length (little-endian)
+    header   UTF-8 JSON: metadata plus a table of sections, each with an
+             offset relative to the data start, a dtype and a shape
+    data     sections, each aligned to 64 bytes
+
+Ids and attributes are JSON-encoded into string tables (a UTF-8 blob plus
+int64 offsets); post and comment text is stored as raw UTF-8. Everything
+else is int64. Adjacency lists (connections, comments per post or user,
+posts authored) are stored as CSR index/pointer pairs.
+
+Loading maps every section, but only the view event columns are used in
+place. Everything else is decoded into User, Post and Comment objects and
+the analyzer builds its graph and indexes from them, so a snapshot saves
+parsing and per-view objects, not the cost of rebuilding the rest.
+"""
+import datetime
+import json
+import struct
+from collections import Counter, defaultdict
+import numpy as np
+from socialMediaAnalysis import User, Post, Comment, ViewEventStore, _EPOCH, _EPOCH_UTC, _MICROSECOND
+
+MAGIC = b'SMASNAP\0'
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct('<8sIIQ')  # magic, format version, reserved, header length
+_ALIGNMENT = 64
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+class _Clock:
+    """Converts datetimes to epoch microseconds, refusing to mix naive and aware times."""
+    def __init__(self, aware=None):
+        self.aware = aware
+
+    def to_micros(self, value):
+        aware = value.tzinfo is not None
+        if self.aware is None:
+            self.aware = aware
+        elif self.aware != aware:
+            raise ValueError("Cannot snapshot a mix of naive and timezone-aware datetimes.")
+        return (value - (_EPOCH_UTC if aware else _EPOCH)) // _MICROSECOND
+
+    def from_micros(self, micros):
+        return (_EPOCH_UTC if self.aware else _EPOCH) + datetime.timedelta(microseconds=micros)
+
+
+class _Table:
+    """Assigns dense indexes to objects in first-seen order."""
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.index = {}
+
+    def index_of(self, item, add=True):
+        key = self.key(item)
+        i = self.index.get(key)
+        if i is None and add:
+            i = self.index[key] = len(self.items)
+            self.items.append(item)
+        return i
+
+
+def _string_table(strings):
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _json_table(values, what):
+    try:
+        return _string_table(json.dumps(value, sort_keys=True) for value in values)
+    except TypeError as e:
+        raise ValueError(f"Cannot snapshot {what}: {e}") from e
+
+
+def _decode_strings(blob, offsets):
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _csr(groups):
+    indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum([len(group) for group in groups], out=indptr[1:])
+    indices = np.fromiter((i for group in groups for i in group), dtype=np.int64, count=int(indptr[-1]))
+    return indptr, indices
+
+
+def _int64(values):
+    return np.array(values, dtype=np.int64)
+
+
+def save_snapshot(analyzer, path):
+    """Writes the analyzer's users, posts, views, comments and connections to path."""
+    clock = _Clock()
+    users = _Table(lambda user: user.username)
+    posts = _Table(lambda post: post.post_id)
+    comments = _Table(id)
+    sections = {}
+
+    for user in analyzer.users.values():
+        users.index_of(user)
+    for post in analyzer.posts.values():
+        posts.index_of(post)
+    post_authors = _int64([users.index_of(post.author) for post in posts.items])
+    post_times = _int64([clock.to_micros(post.creation_time) for post in posts.items])
+
+    if analyzer.view_store is not None:
+        store = analyzer.view_store
+        user_column, post_column, time_column = store.column_arrays()
+        user_map = _int64([users.index_of(user) for user in store.users])
+        post_map = _int64([posts.index.get(post.post_id, -1) for post in store.posts])
+        # Drop views of posts that were attached to the store but never added to the analyzer.
+        keep = post_map[post_column] >= 0
+        view_users = user_map[user_column[keep]]
+        view_posts = post_map[post_column[keep]]
+        view_times = np.array(time_column[keep], dtype=np.int64)
+        if len(view_times):
+            clock.aware = clock.aware if clock.aware is not None else store._aware
+            if clock.aware != store._aware:
+                raise ValueError("Cannot snapshot a mix of naive and timezone-aware datetimes.")
+    else:
+        # Same merge as ViewEventStore adoption: reads recorded only on the
+        # user side become extra view events.
+        view_users, view_posts, view_times = [], [], []
+        logged = defaultdict(Counter)
+        for post_index, post in enumerate(list(posts.items)):
+            for viewer, view_time in post.viewers:
+                view_users.append(users.index_of(viewer))
+                view_posts.append(post_index)
+                view_times.append(clock.to_micros(view_time))
+                logged[viewer.username][(post.post_id, view_time)] += 1
+        for user in list(users.items):
+            for post, view_time in user.posts_read:
+                post_index = posts.index_of(post, add=False)
+                key = (post.post_id, view_time)
+                if post_index is None:
+                    continue
+                if logged[user.username][key]:
+                    logged[user.username][key] -= 1
+                else:
+                    view_users.append(users.index_of(user))
+                    view_posts.append(post_index)
+                    view_times.append(clock.to_micros(view_time))
+        view_users, view_posts, view_times = _int64(view_users), _int64(view_posts), _int64(view_times)
+
+    post_comments = [[comments.index_of(comment) for comment in post.comments
+                      if posts.index_of(comment.post, add=False) is not None]
+                     for post in posts.items]
+    for comment in comments.items:
+        users.index_of(comment.author)
+
+    # Users can be discovered while walking connections, so iterate until the table stops growing.
+    connection_groups, authored_groups, user_comment_groups = [], [], []
+    categories = _Table(lambda category: category)
+    i = 0
+    while i < len(users.items):
+        user = users.items[i]
+        connection_groups.append([(users.index_of(other), categories.index_of(category))
+                                  for category, others in user.connections.items() for other in others])
+        authored_groups.append([j for j in (posts.index_of(post, add=False) for post in user.posts_authored)
+                                if j is not None])
+        user_comment_groups.append([comments.index_of(comment) for comment in user.comments_made
+                                    if posts.index_of(comment.post, add=False) is not None])
+        for j in user_comment_groups[-1]:
+            users.index_of(comments.items[j].author)
+        i += 1
+
+    comment_items = comments.items
+    sections['comment_author'] = _int64([users.index_of(comment.author) for comment in comment_items])
+    sections['comment_post'] = _int64([posts.index_of(comment.post) for comment in comment_items])
+    sections['comment_time'] = _int64([clock.to_micros(comment.creation_time) for comment in comment_items])
+    sections['comment_ids'], sections['comment_id_offsets'] = _json_table(
+        (comment.comment_id for comment in comment_items), 'comment ids')
+    sections['comment_content'], sections['comment_content_offsets'] = _string_table(
+        comment.content for comment in comment_items)
+
+    sections['user_names'], sections['user_name_offsets'] = _json_table(
+        (user.username for user in users.items), 'usernames')
+    sections['user_attributes'], sections['user_attribute_offsets'] = _json_table(
+        (user.attributes for user in users.items), 'user attributes')
+    sections['post_ids'], sections['post_id_offsets'] = _json_table(
+        (post.post_id for post in posts.items), 'post ids')
+    sections['post_content'], sections['post_content_offsets'] = _string_table(
+        post.content for post in posts.items)
+    sections['post_author'] = post_authors
+    sections['post_time'] = post_times
+    sections['post_comment_counts'] = _int64([len(group) for group in post_comments])
+    sections['post_view_counts'] = np.bincount(view_posts, minlength=len(posts.items)).astype(np.int64)
+    sections['view_user'] = view_users
+    sections['view_post'] = view_posts
+    sections['view_time'] = view_times
+    sections['post_comment_indptr'], sections['post_comment_indices'] = _csr(post_comments)
+    sections['user_comment_indptr'], sections['user_comment_indices'] = _csr(user_comment_groups)
+    sections['authored_indptr'], sections['authored_indices'] = _csr(authored_groups)
+    sections['connection_indptr'] = _csr([[0] * len(group) for group in connection_groups])[0]
+    pairs = np.array([pair for group in connection_groups for pair in group], dtype=np.int64).reshape(-1, 2)
+    sections['connection_target'] = np.ascontiguousarray(pairs[:, 0])
+    sections['connection_category'] = np.ascontiguousarray(pairs[:, 1])
+
+    table = {}
+    offset = 0
+    for name, values in sections.items():
+        offset = _align(offset)
+        table[name] = {'offset': offset, 'dtype': values.dtype.str, 'shape': list(values.shape)}
+        offset += values.nbytes
+    header = json.dumps({
+        'format': 'social-media-analyzer-snapshot',
+        'aware': bool(clock.aware),
+        'bucket_width_micros': analyzer._engagement.bucket_width // _MICROSECOND,
+        'categories': categories.items,
+        'counts': {'users': len(users.items), 'posts': len(posts.items),
+                   'views': len(view_times), 'comments': len(comment_items)},
+        'sections': table,
+    }).encode('utf-8')
+
+    data_start = _align(_PREFIX.size + len(header))
+    with open(path, 'wb') as handle:
+        handle.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, 0, len(header)))
+        handle.write(header)
+        for name, values in sections.items():
+            handle.seek(data_start + table[name]['offset'])
+            handle.write(np.ascontiguousarray(values).tobytes())
+        handle.truncate(data_start + _align(offset))
+
+
+def read_sections(path):
+    """
+    Returns (header, sections) with every section memory-mapped copy-on-write,
+    so processes loading the same snapshot share its pages until they write.
+    """
+    with open(path, 'rb') as handle:
+        prefix = handle.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f"'{path}' is not a SocialMediaAnalyzer snapshot.")
+        magic, version, _, header_length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a SocialMediaAnalyzer snapshot.")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Snapshot format version {version} is newer than supported ({FORMAT_VERSION}).")
+        header = json.loads(handle.read(header_length).decode('utf-8'))
+
+    data_start = _align(_PREFIX.size + header_length)
+    sections = {}
+    for name, info in header['sections'].items():
+        shape = tuple(info['shape'])
+        dtype = np.dtype(info['dtype'])
+        if 0 in shape:
+            sections[name] = np.zeros(shape, dtype=dtype)
+        else:
+            sections[name] = np.memmap(path, dtype=dtype, mode='c', offset=data_start + info['offset'], shape=shape)
+    return header, sections
+
+
+def load_snapshot(path, analyzer_cls):
+    """
+    Rebuilds an analyzer (in compact mode) from a snapshot written by
+    save_snapshot. The view events stay in the mapped columns; users, posts,
+    comments and connections are decoded into objects and the analyzer
+    constructor builds the graph and indexes from them.
+    """
+    header, sections = read_sections(path)
+    clock = _Clock(header['aware'])
+
+    usernames = [json.loads(name) for name in _decode_strings(sections['user_names'], sections['user_name_offsets'])]
+    attributes = [json.loads(attrs) for attrs in
+                  _decode_strings(sections['user_attributes'], sections['user_attribute_offsets'])]
+    users = [User(username, attrs) for username, attrs in zip(usernames, attributes)]
+
+    post_ids = [json.loads(post_id) for post_id in _decode_strings(sections['post_ids'], sections['post_id_offsets'])]
+    contents = _decode_strings(sections['post_content'], sections['post_content_offsets'])
+    posts = [Post(post_id, users[author], content, clock.from_micros(micros))
+             for post_id, author, content, micros in zip(post_ids, sections['post_author'].tolist(), contents,
+                                                         sections['post_time'].tolist())]
+
+    comment_ids = [json.loads(comment_id) for comment_id in
+                   _decode_strings(sections['comment_ids'], sections['comment_id_offsets'])]
+    comment_contents = _decode_strings(sections['comment_content'], sections['comment_content_offsets'])
+    comments = [Comment(comment_id, users[author], posts[post], content, clock.from_micros(micros))
+                for comment_id, author, post, content, micros in zip(
+                    comment_ids, sections['comment_author'].tolist(), sections['comment_post'].tolist(),
+                    comment_contents, sections['comment_time'].tolist())]
+
+    def groups(indptr, indices):
+        indptr, indices = indptr.tolist(), indices.tolist()
+        return [indices[indptr[i]:indptr[i + 1]] for i in range(len(indptr) - 1)]
+
+    for post, group in zip(posts, groups(sections['post_comment_indptr'], sections['post_comment_indices'])):
+        post.comments = [comments[i] for i in group]
+    for user, group in zip(users, groups(sections['user_comment_indptr'], sections['user_comment_indices'])):
+        user.comments_made = [comments[i] for i in group]
+    for user, group in zip(users, groups(sections['authored_indptr'], sections['authored_indices'])):
+        user.posts_authored = [posts[i] for i in group]
+    categories = header['categories']
+    targets = sections['connection_target'].tolist()
+    kinds = sections['connection_category'].tolist()
+    indptr = sections['connection_indptr'].tolist()
+    for i, user in enumerate(users):
+        for j in range(indptr[i], indptr[i + 1]):
+            user.add_connection(users[targets[j]], categories[kinds[j]])
+
+    store = ViewEventStore.from_columns(users, posts, sections['view_user'], sections['view_post'],
+                                        sections['view_time'], aware=header['aware'],
+                                        views_per_post=sections['post_view_counts'])
+    bucket_width = datetime.timedelta(microseconds=header['bucket_width_micros'])
+    return analyzer_cls(users, posts, view_store=store, bucket_width=bucket_width)
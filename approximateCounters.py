@@ -0,0 +1,381 @@
+"""
+Memory-bounded approximate counters for SocialMediaAnalyzer's opt-in
+approximate mode.
+
+HyperLogLog estimates distinct viewers per post in at most 2**precision
+bytes; CountMinSketch estimates word frequencies in a fixed table and tracks
+the heaviest words. Both hash with keyed BLAKE2b, so sketches built in
+different processes, shards or time windows with the same parameters can be
+merged.
+"""
+import hashlib
+import math
+from array import array
+from collections import Counter
+import numpy as np
+
+
+def _hash64(item, seed):
+    return int.from_bytes(hashlib.blake2b(str(item).encode('utf-8'), digest_size=8,
+                                          key=seed.to_bytes(8, 'little')).digest(), 'little')
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch with relative standard error about
+    1.04 / sqrt(2**precision). Small sets are kept as a list of hashes
+    (exact up to hash collisions) until that would outgrow the dense
+    registers, so a post with a handful of viewers costs a few bytes.
+
+    Args:
+        error (float): Target relative standard error; picks the precision.
+        precision (int): Register bits (4-18); overrides error.
+        seed (int): Hash seed; sketches must share it to be merged.
+    """
+    def __init__(self, error=0.05, precision=None, seed=0):
+        if precision is None:
+            if not 0 < error < 1:
+                raise ValueError("error must be between 0 and 1.")
+            precision = math.ceil(math.log2((1.04 / error) ** 2))
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18.")
+        self.precision = precision
+        self.seed = seed
+        self._hashes = array('Q')
+        self._registers = None
+        self._estimate = 0
+
+    @property
+    def num_registers(self):
+        return 1 << self.precision
+
+    def add(self, item):
+        """Adds item; returns True if the sketch changed."""
+        return self._add_hash(_hash64(item, self.seed))
+
+    def count(self):
+        """Returns the estimated number of distinct items added."""
+        if self._estimate is None:
+            self._estimate = self._compute_estimate()
+        return self._estimate
+
+    def _compute_estimate(self):
+        if self._registers is None:
+            return len(self._hashes)
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / np.ldexp(1.0, -self._registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self._registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        """Adds every item of other (same precision and seed) into this sketch."""
+        if (other.precision, other.seed) != (self.precision, self.seed):
+            raise ValueError("Can only merge HyperLogLog sketches with the same precision and seed.")
+        if other._registers is None:
+            for hashed in other._hashes:
+                self._add_hash(hashed)
+        else:
+            self._densify()
+            np.maximum(self._registers, other._registers, out=self._registers)
+            self._estimate = None
+        return self
+
+    def memory_usage(self):
+        """Bytes held by the hashes or registers."""
+        if self._registers is None:
+            return self._hashes.itemsize * len(self._hashes)
+        return self._registers.nbytes
+
+    def _add_hash(self, hashed):
+        if self._registers is None:
+            if hashed in self._hashes:
+                return False
+            self._hashes.append(hashed)
+            if self._hashes.itemsize * len(self._hashes) > self.num_registers:
+                self._densify()
+            self._estimate = None
+            return True
+        index, rank = self._register_of(hashed)
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+            self._estimate = None
+            return True
+        return False
+
+    def _register_of(self, hashed):
+        bits = 64 - self.precision
+        return hashed >> bits, bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+
+    def _densify(self):
+        if self._registers is not None:
+            return
+        self._registers = np.zeros(self.num_registers, dtype=np.uint8)
+        for hashed in self._hashes:
+            index, rank = self._register_of(hashed)
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+        self._hashes = array('Q')
+        self._estimate = None
+
+
+class CountMinSketch:
+    """
+    Frequency sketch whose estimates never undercount and, with probability
+    1 - delta, overcount by at most epsilon times the total count. The
+    heavy_hitters most frequent items are tracked alongside the table.
+
+    Args:
+        epsilon (float): Error bound relative to the total count; sets the width.
+        delta (float): Failure probability of the bound; sets the depth.
+        heavy_hitters (int): Number of top items to track.
+        seed (int): Hash seed; sketches must share it to be merged.
+    """
+    def __init__(self, epsilon=1e-4, delta=0.01, heavy_hitters=1000, seed=0):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1.")
+        if heavy_hitters <= 0:
+            raise ValueError("heavy_hitters must be positive.")
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.heavy_hitters = heavy_hitters
+        self.seed = seed
+        self.total = 0
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self._candidates = {}
+        self._depth_steps = np.arange(self.depth, dtype=np.uint64)
+
+    def add(self, item, count=1):
+        self.update({item: count})
+
+    def update(self, counts):
+        """Adds a mapping of item -> count (e.g. a Counter) in one vectorized pass."""
+        items = [item for item, count in counts.items() if count]
+        if not items:
+            return
+        amounts = np.fromiter((counts[item] for item in items), dtype=np.int64, count=len(items))
+        if (amounts < 0).any():
+            raise ValueError("CountMinSketch counts must be non-negative.")
+        columns = self._columns(items)
+        rows = np.broadcast_to(np.arange(self.depth), columns.shape)
+        np.add.at(self.table, (rows, columns), amounts[:, None])
+        self.total += int(amounts.sum())
+        estimates = self.table[rows, columns].min(axis=1)
+        self._candidates.update(zip(items, estimates.tolist()))
+        if len(self._candidates) > 2 * self.heavy_hitters:
+            self._prune()
+
+    def estimate(self, item):
+        columns = self._columns([item])[0]
+        return int(self.table[np.arange(self.depth), columns].min())
+
+    def most_common(self, n=None):
+        """Returns up to n (item, estimated count) pairs among the tracked heavy hitters, largest first."""
+        self._prune()
+        ranked = sorted(self._candidates.items(), key=lambda entry: entry[1], reverse=True)
+        return ranked[:n] if n is not None else ranked
+
+    def merge(self, other):
+        """Adds other (same epsilon, delta and seed) into this sketch."""
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Can only merge CountMinSketch sketches with the same dimensions and seed.")
+        self.table += other.table
+        self.total += other.total
+        self._candidates.update(other._candidates)
+        self._prune()
+        return self
+
+    def discard(self, items):
+        """Stops tracking items as heavy hitters; their counts stay in the table."""
+        for item in items:
+            self._candidates.pop(item, None)
+
+    def resize(self, heavy_hitters):
+        """Changes the number of tracked heavy hitters, dropping the smallest when it shrinks."""
+        if heavy_hitters <= 0:
+            raise ValueError("heavy_hitters must be positive.")
+        self.heavy_hitters = heavy_hitters
+        self._prune()
+
+    def memory_usage(self):
+        return self.table.nbytes
+
+    def _columns(self, items):
+        digests = [hashlib.blake2b(str(item).encode('utf-8'), digest_size=16,
+                                   key=self.seed.to_bytes(8, 'little')).digest() for item in items]
+        pairs = np.frombuffer(b''.join(digests), dtype=np.uint64).reshape(len(items), 2)
+        # Double hashing: column_i = h1 + i * h2 for each row i.
+        return ((pairs[:, :1] + self._depth_steps * (pairs[:, 1:] | np.uint64(1))) % np.uint64(self.width)).astype(np.int64)
+
+    def _prune(self):
+        if not self._candidates:
+            return
+        items = list(self._candidates)
+        columns = self._columns(items)
+        estimates = self.table[np.arange(self.depth), columns].min(axis=1)
+        keep = np.argsort(-estimates, kind='stable')[:self.heavy_hitters]
+        self._candidates = {items[i]: int(estimates[i]) for i in keep}
+
+
+class ApproximateAnalytics:
+    """
+    Sketch configuration and per-post distinct-viewer sketches for
+    SocialMediaAnalyzer(approximate=...). In approximate mode views are not
+    stored per event: each post keeps a HyperLogLog of its viewers, whose
+    estimate is the post's view count for importance, and word clouds are
+    built from a CountMinSketch's heavy hitters instead of an exact Counter.
+
+    New views also go into one CountMinSketch of (username, post_id) pairs
+    whose heavy hitters stand in for the per-pair 'viewed' edges in
+    influence ranking and level-of-detail reduction, so memory does not
+    grow with the number of distinct viewer/post pairs.
+
+    Words are sketched as posts are ingested (record_words), into one
+    CountMinSketch per shard of shard_posts consecutive posts, so roughly
+    per time window. A query merges the shards it covers completely and
+    only tokenizes the posts of partly covered shards; no per-post Counters
+    are kept. Shards track twice heavy_hitters candidates, so words dropped
+    by a query's own stopwords can be replaced by the next most frequent.
+
+    Args:
+        viewer_error (float): HyperLogLog relative standard error per post.
+        word_epsilon (float): CountMinSketch error relative to the token total.
+        word_delta (float): CountMinSketch failure probability.
+        heavy_hitters (int): Words tracked (and shown) per word cloud.
+        seed (int): Hash seed shared by all sketches, for merging.
+        shard_posts (int): Posts per ingest-time word sketch shard.
+        view_pair_heavy_hitters (int): (username, post_id) view pairs tracked.
+    """
+    def __init__(self, viewer_error=0.05, word_epsilon=1e-4, word_delta=0.01, heavy_hitters=1000, seed=0,
+                 shard_posts=16384, view_pair_heavy_hitters=10000):
+        self.viewer_error = viewer_error
+        self.word_epsilon = word_epsilon
+        self.word_delta = word_delta
+        self.heavy_hitters = heavy_hitters
+        self.seed = seed
+        self.shard_posts = shard_posts
+        self.view_pair_heavy_hitters = view_pair_heavy_hitters
+        if not 0 < viewer_error < 1:
+            raise ValueError("viewer_error must be between 0 and 1.")
+        if not 0 < word_epsilon < 1 or not 0 < word_delta < 1:
+            raise ValueError("word_epsilon and word_delta must be between 0 and 1.")
+        if heavy_hitters <= 0:
+            raise ValueError("heavy_hitters must be positive.")
+        if shard_posts <= 0 or view_pair_heavy_hitters <= 0:
+            raise ValueError("shard_posts and view_pair_heavy_hitters must be positive.")
+        self.viewers = {}
+        self.view_pairs = None
+        self.word_shards = []
+        self._shard_of = {}
+        self._pending = Counter()
+        self._pending_posts = 0
+
+    def viewer_sketch(self, post_id):
+        sketch = self.viewers.get(post_id)
+        if sketch is None:
+            sketch = self.viewers[post_id] = HyperLogLog(self.viewer_error, seed=self.seed)
+        return sketch
+
+    def record_view(self, post_id, username):
+        """Adds a viewer and returns the change in the post's distinct-viewer estimate."""
+        sketch = self.viewer_sketch(post_id)
+        before = sketch.count()
+        if not sketch.add(username):
+            return 0
+        return sketch.count() - before
+
+    def record_view_pair(self, username, post_id, count=1):
+        """Counts views of post_id by username in the view pair sketch."""
+        if self.view_pairs is None:
+            self.view_pairs = self._new_sketch(self.view_pair_heavy_hitters)
+        self.view_pairs.add((username, post_id), count)
+
+    def heavy_view_pairs(self):
+        """Returns the tracked ((username, post_id), estimated views) pairs, most viewed first."""
+        return self.view_pairs.most_common() if self.view_pairs is not None else []
+
+    def distinct_viewers(self, post_id):
+        sketch = self.viewers.get(post_id)
+        return sketch.count() if sketch is not None else 0
+
+    def record_words(self, post_id, counts, chunk_size=256):
+        """
+        Adds a post's word counts to the current word shard. The counts are
+        buffered and added to the shard's sketch chunk_size posts at a time.
+        """
+        if not self.word_shards or len(self.word_shards[-1][1]) >= self.shard_posts:
+            self._flush_words()
+            self.word_shards.append((self._new_sketch(2 * self.heavy_hitters), set()))
+        self.word_shards[-1][1].add(post_id)
+        self._shard_of[post_id] = len(self.word_shards) - 1
+        self._pending.update(counts)
+        self._pending_posts += 1
+        if self._pending_posts >= chunk_size:
+            self._flush_words()
+
+    def word_sketch(self, posts, stopwords=frozenset(), tokenize=None, chunk_size=1024):
+        """
+        Returns a CountMinSketch of the words of posts, skipping stopwords.
+        Shards recorded with record_words whose posts are all included are
+        merged in; the other posts are tokenized with tokenize (default
+        Post.token_counts) and streamed in chunk_size posts at a time.
+        Stopwords dropped at record_words time must be among stopwords.
+        Stopwords are discarded from the merged candidates before they are
+        cut down to heavy_hitters.
+        """
+        tokenize = tokenize or (lambda post: post.token_counts())
+        self._flush_words()
+        sketch = self._new_sketch(2 * self.heavy_hitters)
+        by_shard = {}
+        for post in posts:
+            by_shard.setdefault(self._shard_of.get(post.post_id), []).append(post)
+        remaining = []
+        for shard, shard_posts in by_shard.items():
+            if shard is not None and len(shard_posts) == len(self.word_shards[shard][1]):
+                sketch.merge(self.word_shards[shard][0])
+            else:
+                remaining.extend(shard_posts)
+        chunk = Counter()
+        for i, post in enumerate(remaining, 1):
+            chunk.update(tokenize(post))
+            if i % chunk_size == 0:
+                sketch.update(self._without(chunk, stopwords))
+                chunk = Counter()
+        sketch.update(self._without(chunk, stopwords))
+        sketch.discard(stopwords)
+        sketch.resize(self.heavy_hitters)
+        return sketch
+
+    def merge(self, other):
+        """Merges the per-post viewer sketches and view pairs of other (e.g. another shard or time window)."""
+        for post_id, sketch in other.viewers.items():
+            self.viewer_sketch(post_id).merge(sketch)
+        if other.view_pairs is not None:
+            if self.view_pairs is None:
+                self.view_pairs = self._new_sketch(self.view_pair_heavy_hitters)
+            self.view_pairs.merge(other.view_pairs)
+        return self
+
+    def memory_usage(self):
+        return (sum(sketch.memory_usage() for sketch in self.viewers.values())
+                + sum(sketch.memory_usage() for sketch, _ in self.word_shards)
+                + (self.view_pairs.memory_usage() if self.view_pairs is not None else 0))
+
+    def _new_sketch(self, heavy_hitters):
+        return CountMinSketch(self.word_epsilon, self.word_delta, heavy_hitters, self.seed)
+
+    def _flush_words(self):
+        if self._pending_posts:
+            self.word_shards[-1][0].update(self._pending)
+            self._pending = Counter()
+            self._pending_posts = 0
+
+    @staticmethod
+    def _without(counts, stopwords):
+        for word in stopwords & counts.keys():
+            del counts[word]
+        return counts
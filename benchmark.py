@@ -0,0 +1,253 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from socialMediaAnalysis import User, Post, Comment, SocialMediaAnalyzer
+
+LOCATIONS = ["NYC", "LA", "Chicago", "Houston", "Seattle", "Boston", "Denver", "Miami"]
+DEPARTMENTS = ["engineering", "sales", "marketing", "support", "research"]
+CONNECTION_CATEGORIES = ["friend", "colleague", "family"]
+TOPIC_WORDS = ["technology", "data", "science", "machine", "learning", "weather", "hiking", "music",
+               "coffee", "travel", "football", "election", "movie", "book", "recipe", "startup",
+               "python", "network", "photo", "weekend", "concert", "garden", "market", "health"]
+FILLER_WORDS = ["the", "a", "is", "and", "to", "of", "in", "it", "this", "that", "for", "on", "with",
+                "my", "was", "so", "just", "really", "today", "love", "great", "new", "about", "what"]
+
+# Filter specs exercised by the filtering and word-frequency benchmarks.
+FILTER_SPECS = [
+    {"include_keywords": ["technology", "data"]},
+    {"exclude_keywords": ["weather"]},
+    {"user_attribute_filters": {"location": "NYC"}},
+    {"include_keywords": ["learning"], "user_attribute_filters": {"department": "research"}},
+]
+
+# Modules that must stay out of a plain `import socialMediaAnalysis`; they are
+# loaded on demand by the rendering and influence code paths.
+HEAVY_MODULES = ("matplotlib", "wordcloud", "PIL", "scipy")
+IMPORT_TIME_BUDGET = 0.6
+
+_IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def generate_synthetic_data(num_posts, num_users=None, seed=0):
+    """
+    Generates a reproducible synthetic dataset.
+
+    Connections follow preferential attachment (power-law degrees), view
+    counts per post are Zipfian, comments are a fraction of views and post
+    text draws Zipf-weighted topic words mixed with common filler words.
+
+    Returns:
+        tuple: (users, posts) lists ready for SocialMediaAnalyzer.
+    """
+    rng = np.random.default_rng(seed)
+    num_users = num_users or max(10, num_posts // 10)
+    start = datetime.datetime(2024, 1, 1)
+
+    users = [User(f"user{i}", {"age": int(rng.integers(18, 70)),
+                               "location": LOCATIONS[i % len(LOCATIONS)],
+                               "department": DEPARTMENTS[int(rng.integers(len(DEPARTMENTS)))]})
+             for i in range(num_users)]
+
+    # Barabasi-Albert style: each new user links to targets sampled in proportion to degree.
+    endpoints = [0]
+    for i in range(1, num_users):
+        for target in set(endpoints[j] for j in rng.integers(0, len(endpoints), size=min(3, i))):
+            category = CONNECTION_CATEGORIES[int(rng.integers(len(CONNECTION_CATEGORIES)))]
+            users[i].add_connection(users[target], category)
+            endpoints.append(target)
+            endpoints.append(i)
+        endpoints.append(i)
+
+    topic_weights = 1.0 / np.arange(1, len(TOPIC_WORDS) + 1)
+    topic_weights /= topic_weights.sum()
+    lengths = rng.integers(8, 30, size=num_posts)
+    authors = rng.integers(0, num_users, size=num_posts)
+    created_offsets = np.sort(rng.integers(0, 365 * 24 * 3600, size=num_posts))
+    view_counts = np.minimum(rng.zipf(1.8, size=num_posts) - 1, num_users)
+    comment_counts = rng.binomial(view_counts, 0.1)
+
+    posts = []
+    for i in range(num_posts):
+        num_topic = int(lengths[i]) // 3
+        words = list(rng.choice(TOPIC_WORDS, size=num_topic, p=topic_weights)) + \
+                list(rng.choice(FILLER_WORDS, size=int(lengths[i]) - num_topic))
+        rng.shuffle(words)
+        created = start + datetime.timedelta(seconds=int(created_offsets[i]))
+        post = Post(f"post{i}", users[authors[i]], " ".join(words).capitalize() + ".", created)
+
+        viewers = rng.choice(num_users, size=int(view_counts[i]), replace=False)
+        view_offsets = np.sort(rng.integers(60, 7 * 24 * 3600, size=len(viewers)))
+        for viewer, offset in zip(viewers.tolist(), view_offsets.tolist()):
+            post.add_viewer(users[viewer], created + datetime.timedelta(seconds=offset))
+        for j, commenter in enumerate(viewers[:int(comment_counts[i])].tolist()):
+            comment_time = created + datetime.timedelta(seconds=int(view_offsets[j]) + 30)
+            post.add_comment(Comment(f"c{i}_{j}", users[commenter], post, "Nice post!", comment_time))
+        posts.append(post)
+    return users, posts
+
+
+def _measure(operation, measure_memory):
+    """Runs operation once for wall time and, optionally, once more under tracemalloc for peak memory."""
+    gc.collect()
+    start = time.perf_counter()
+    result = operation()
+    record = {'seconds': time.perf_counter() - start}
+    if measure_memory:
+        gc.collect()
+        tracemalloc.start()
+        operation()
+        record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, record
+
+
+def run_benchmarks(sizes, seed=0, measure_memory=True, diagram_max_posts=2000):
+    """
+    Benchmarks every analyzer operation at each dataset size.
+
+    Returns:
+        dict: {'meta': ..., 'results': {size: {operation: {'seconds', 'peak_bytes'}}}}
+    """
+    results = {}
+    for size in sizes:
+        users, posts = generate_synthetic_data(size, seed=seed)
+        size_results = results[str(size)] = {}
+
+        analyzer, size_results['init'] = _measure(lambda: SocialMediaAnalyzer(users, posts), measure_memory)
+
+        def importance():
+            analyzer._importance.invalidate()
+            analyzer._calculate_post_importance(0.6, 0.4)
+        _, size_results['calculate_post_importance'] = _measure(importance, measure_memory)
+
+        def filtering():
+            analyzer._post_index._keyword_cache.clear()
+            analyzer.query_cache.clear()
+            return [analyzer._get_filtered_posts(**spec) for spec in FILTER_SPECS]
+        filtered, size_results['get_filtered_posts'] = _measure(filtering, measure_memory)
+
+        stopwords = analyzer._stopword_set()
+        _, size_results['word_frequencies'] = _measure(
+            lambda: [analyzer._word_frequencies(matched, stopwords) for matched in filtered], measure_memory)
+
+        if size <= diagram_max_posts:
+            with tempfile.TemporaryDirectory() as tmp:
+                def diagram():
+                    analyzer.layout_cache._latest.clear()
+                    return analyzer.create_diagram(output_path=os.path.join(tmp, "diagram.png"), show_labels=False)
+                stages, record = _measure(diagram, measure_memory)
+                record['stages'] = stages
+                size_results['create_diagram'] = record
+
+        print(f"{size} posts: " + ", ".join(f"{name}={record['seconds']:.3f}s"
+                                            for name, record in size_results.items()))
+    return {
+        'meta': {
+            'seed': seed,
+            'sizes': list(sizes),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+
+def measure_import_time(module="socialMediaAnalysis", repeats=5):
+    """
+    Imports module in fresh interpreters and returns the best wall time plus
+    any HEAVY_MODULES the import pulled in.
+
+    Returns:
+        dict: {'seconds': float, 'heavy_modules': [str]}
+    """
+    script = _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    best, heavy = float('inf'), []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout.splitlines()
+        best = min(best, float(output[0]))
+        heavy = [name for name in output[1].split(",") if name] if len(output) > 1 else []
+    return {'seconds': best, 'heavy_modules': heavy}
+
+
+def compare_to_baseline(current, baseline, tolerance=1.2):
+    """
+    Returns a list of (size, operation, metric, baseline, current) tuples for
+    every measurement more than tolerance times worse than the baseline.
+    Import times are reported with size 'import'.
+    """
+    regressions = []
+    for module, record in current.get('import', {}).items():
+        previous = baseline.get('import', {}).get(module, {}).get('seconds')
+        if previous and record['seconds'] > previous * tolerance:
+            regressions.append(('import', module, 'seconds', previous, record['seconds']))
+    for size, operations in current['results'].items():
+        for operation, record in operations.items():
+            previous = baseline.get('results', {}).get(size, {}).get(operation)
+            if previous is None:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if metric in record and previous.get(metric) and record[metric] > previous[metric] * tolerance:
+                    regressions.append((size, operation, metric, previous[metric], record[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SocialMediaAnalyzer on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Numbers of posts to generate (e.g. 1000 10000 1000000).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results.")
+    parser.add_argument('--baseline', help="Earlier results JSON to compare against.")
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help="Ratio over the baseline that counts as a regression.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc peak-memory runs.")
+    parser.add_argument('--diagram-max-posts', type=int, default=2000,
+                        help="Largest size for which create_diagram is benchmarked.")
+    parser.add_argument('--import-budget', type=float, default=IMPORT_TIME_BUDGET,
+                        help="Maximum seconds allowed for `import socialMediaAnalysis`.")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.sizes, args.seed, not args.no_memory, args.diagram_max_posts)
+    current['import'] = {'socialMediaAnalysis': measure_import_time()}
+    import_record = current['import']['socialMediaAnalysis']
+    print(f"import socialMediaAnalysis: {import_record['seconds']:.3f}s")
+    over_budget = import_record['seconds'] > args.import_budget or import_record['heavy_modules']
+    if over_budget:
+        print(f"IMPORT BUDGET EXCEEDED: {import_record['seconds']:.3f}s (budget {args.import_budget:.3f}s), "
+              f"heavy modules loaded: {import_record['heavy_modules']}")
+    with open(args.output, 'w') as handle:
+        json.dump(current, handle, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare_to_baseline(current, json.load(handle), args.tolerance)
+        for size, operation, metric, before, after in regressions:
+            print(f"REGRESSION {size} posts {operation} {metric}: {before:.4g} -> {after:.4g}")
+        if regressions:
+            return 1
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
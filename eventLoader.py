@@ -0,0 +1,249 @@
+import csv
+import datetime
+import gzip
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+from socialMediaAnalysis import User, Post, Comment, _EPOCH
+
+
+def _open_text(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    return open(path, 'r', newline='', encoding='utf-8')
+
+
+def _detect_format(path):
+    name = str(path)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.jsonl') or name.endswith('.ndjson') or name.endswith('.json'):
+        return 'jsonl'
+    raise ValueError(f"Cannot infer event file format from '{path}'; pass file_format='jsonl' or 'csv'.")
+
+
+def read_event_chunks(path, chunk_size=10000, file_format=None):
+    """
+    Lazily reads an event dump and yields lists of at most chunk_size row dicts.
+    Only one chunk is held in memory at a time.
+
+    Args:
+        path (str): JSONL or CSV file, optionally gzip-compressed (.gz).
+        chunk_size (int): Number of rows per yielded chunk.
+        file_format (str): 'jsonl' or 'csv'; inferred from the extension if None.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive.")
+    file_format = file_format or _detect_format(path)
+    with _open_text(path) as handle:
+        if file_format == 'csv':
+            rows = ({key: value for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(handle))
+        elif file_format == 'jsonl':
+            rows = (json.loads(line) for line in handle if line.strip())
+        else:
+            raise ValueError("file_format must be 'jsonl' or 'csv'.")
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def parse_time(value):
+    """Parses an ISO 8601 string or epoch seconds into a datetime."""
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return _EPOCH + datetime.timedelta(seconds=value)
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return _EPOCH + datetime.timedelta(seconds=float(value))
+
+
+class EventLoader:
+    """
+    Streams user, post, view, comment and connection events into a
+    SocialMediaAnalyzer through its incremental mutation methods.
+
+    Each chunk is grouped by event type and applied users first, then posts,
+    connections and comments, so rows may reference entities from later in
+    the same chunk. Views are collected and recorded with one
+    analyzer.record_views call per chunk, which appends them in bulk and
+    updates each user -> post edge once.
+
+    Each row needs a 'type' field plus the fields for that type:
+        user:       username, attributes (object, or JSON string in CSV)
+        post:       post_id, author, content, creation_time
+        view:       username, post_id, view_time
+        comment:    comment_id, username, post_id, content, creation_time
+        connection: username, other_username, category
+
+    Events that reference a user or post that has not been loaded yet are
+    parked and replayed as soon as that entity arrives, so dumps do not need
+    to be ordered by dependency.
+    """
+    def __init__(self, analyzer, batch_size=10000):
+        self.analyzer = analyzer
+        self.batch_size = batch_size
+        self.stats = {'rows': 0, 'applied': 0, 'deferred': 0, 'duplicates': 0, 'seconds': 0.0}
+        self._pending = defaultdict(list)
+        self._views = []
+        self._handlers = {
+            'user': self._apply_user,
+            'post': self._apply_post,
+            'view': self._apply_view,
+            'comment': self._apply_comment,
+            'connection': self._apply_connection,
+        }
+
+    @property
+    def pending_count(self):
+        """Number of events still waiting for a referenced user or post."""
+        return sum(len(events) for events in self._pending.values())
+
+    def missing_entities(self):
+        """Returns the ('user' | 'post', id) keys that parked events are waiting on."""
+        return list(self._pending)
+
+    def load(self, path, file_format=None, progress=None):
+        """
+        Loads one event file in batches and returns the cumulative stats,
+        including rows_per_sec for this call. 'deferred' counts every time an
+        event was parked; 'pending' is how many are still parked.
+
+        Args:
+            path (str): Event dump to read.
+            file_format (str): 'jsonl' or 'csv'; inferred from the extension if None.
+            progress (callable): Optional callback receiving the stats dict after each batch.
+        """
+        return self.load_chunks(read_event_chunks(path, self.batch_size, file_format), progress)
+
+    def load_chunks(self, chunks, progress=None):
+        """Applies an iterable of row batches; see load."""
+        start = time.perf_counter()
+        rows_before = self.stats['rows']
+        for chunk in chunks:
+            self._apply_chunk(chunk)
+            if progress is not None:
+                progress(dict(self.stats))
+        elapsed = time.perf_counter() - start
+        self.stats['seconds'] += elapsed
+        rows = self.stats['rows'] - rows_before
+        self.stats['rows_per_sec'] = rows / elapsed if elapsed > 0 else float('inf')
+        self.stats['pending'] = self.pending_count
+        return dict(self.stats)
+
+    def apply(self, row):
+        """Applies a single event row."""
+        self._apply_chunk([row])
+
+    def _apply_chunk(self, chunk):
+        by_type = defaultdict(list)
+        for row in chunk:
+            event_type = row.get('type')
+            if event_type not in self._handlers:
+                raise ValueError(f"Unknown event type: {event_type!r}")
+            by_type[event_type].append(row)
+        self.stats['rows'] += len(chunk)
+        for event_type in ('user', 'post', 'connection', 'comment', 'view'):
+            for row in by_type[event_type]:
+                self._handlers[event_type](row)
+        self._flush_views()
+
+    def _flush_views(self):
+        views, self._views = self._views, []
+        self.analyzer.record_views(views)
+
+    def create_missing_users(self):
+        """
+        Creates attribute-less users for every username that parked events are
+        still waiting on, then replays those events.
+        """
+        for kind, key in list(self._pending):
+            if kind == 'user' and key not in self.analyzer.users:
+                self.analyzer.add_user(User(key))
+                self._release('user', key)
+        self._flush_views()
+
+    def _defer(self, kind, key, row):
+        self._pending[(kind, key)].append(row)
+        self.stats['deferred'] += 1
+
+    def _release(self, kind, key):
+        for row in self._pending.pop((kind, key), ()):
+            self._handlers[row['type']](row)
+
+    def _resolve_user(self, username, row):
+        user = self.analyzer.users.get(username)
+        if user is None:
+            self._defer('user', username, row)
+        return user
+
+    def _resolve_post(self, post_id, row):
+        post = self.analyzer.posts.get(post_id)
+        if post is None:
+            self._defer('post', post_id, row)
+        return post
+
+    def _apply_user(self, row):
+        username = row['username']
+        if username in self.analyzer.users:
+            self.stats['duplicates'] += 1
+            return
+        attributes = row.get('attributes') or {}
+        if isinstance(attributes, str):
+            attributes = json.loads(attributes)
+        self.analyzer.add_user(User(username, attributes))
+        self.stats['applied'] += 1
+        self._release('user', username)
+
+    def _apply_post(self, row):
+        post_id = row['post_id']
+        if post_id in self.analyzer.posts:
+            self.stats['duplicates'] += 1
+            return
+        author = self._resolve_user(row['author'], row)
+        if author is None:
+            return
+        post = Post(post_id, author, row.get('content', ''), parse_time(row['creation_time']))
+        author.add_post(post)
+        self.analyzer.add_post(post)
+        self.stats['applied'] += 1
+        self._release('post', post_id)
+
+    def _apply_view(self, row):
+        user = self._resolve_user(row['username'], row)
+        if user is None:
+            return
+        post = self._resolve_post(row['post_id'], row)
+        if post is None:
+            return
+        self._views.append((user, post, parse_time(row['view_time'])))
+        self.stats['applied'] += 1
+
+    def _apply_comment(self, row):
+        user = self._resolve_user(row['username'], row)
+        if user is None:
+            return
+        post = self._resolve_post(row['post_id'], row)
+        if post is None:
+            return
+        comment = Comment(row['comment_id'], user, post, row.get('content', ''),
+                          parse_time(row['creation_time']))
+        self.analyzer.record_comment(comment)
+        self.stats['applied'] += 1
+
+    def _apply_connection(self, row):
+        user = self._resolve_user(row['username'], row)
+        if user is None:
+            return
+        other_user = self._resolve_user(row['other_username'], row)
+        if other_user is None:
+            return
+        self.analyzer.add_connection(user, other_user, row['category'])
+        self.stats['applied'] += 1
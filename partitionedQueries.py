@@ -0,0 +1,316 @@
+"""
+Map-reduce execution of analyzer queries over creation-time partitions.
+
+Posts are sorted by creation_time and split into contiguous ranges of equal
+size. Each range is shipped once to its own worker process, which builds a
+PostIndex over lightweight copies of its posts and keeps it for later
+queries. A query is mapped over the partitions (skipping those outside a
+post_time_range) and the partial results are reduced in the parent:
+
+    filter:           matched global positions, merged and sorted
+    word frequencies: per-partition Counters (stopwords removed) summed, with
+                      words ordered by first occurrence as in the serial path
+    importance:       partition maxima of comments and views reduced to the
+                      global maxima, then every partition normalizes its own
+                      counts with them
+
+Results are identical to the serial analyzer methods. Posts added later are
+shipped as a delta to the partition whose time range covers them (normally
+the last one), and engagement changes just send the new counts; partitions
+are only rebuilt when a delta would make one more than twice its even share.
+"""
+import math
+import os
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from socialMediaAnalysis import (User, Post, PostIndex, SocialMediaAnalyzer, _importance_scores, _top_k_indices,
+                                 _validate_weights)
+
+# State of the partition owned by a worker process, set by _load_partition.
+_partition = None
+
+
+def _load_partition(rows, author_attributes, comment_counts, view_counts):
+    """Worker initializer: rebuilds the partition's posts and index."""
+    global _partition
+    authors = {username: User(username, attributes) for username, attributes in author_attributes.items()}
+    posts = [Post(post_id, authors[author], content, creation_time)
+             for _, post_id, author, content, creation_time in rows]
+    _partition = {
+        'index': PostIndex(posts),
+        'authors': authors,
+        'positions': {post_id: position for position, post_id, _, _, _ in rows},
+        'comment_counts': comment_counts,
+        'view_counts': view_counts,
+    }
+
+
+def _add_posts(rows, author_attributes):
+    """Indexes posts added to the analyzer after the partition was loaded."""
+    authors = _partition['authors']
+    for username, attributes in author_attributes.items():
+        if username not in authors:
+            authors[username] = User(username, attributes)
+    for position, post_id, author, content, creation_time in rows:
+        _partition['index'].add_post(Post(post_id, authors[author], content, creation_time))
+        _partition['positions'][post_id] = position
+
+
+def _partition_size():
+    return len(_partition['positions'])
+
+
+def _update_counts(comment_counts, view_counts):
+    _partition['comment_counts'] = comment_counts
+    _partition['view_counts'] = view_counts
+
+
+def _match_partition(spec):
+    index = _partition['index']
+    return [(_partition['positions'][post_id], index.posts[post_id]) for post_id in index.match(**spec)]
+
+
+def _map_filter(spec):
+    return [position for position, _ in _match_partition(spec)]
+
+
+def _map_word_frequencies(spec, stopwords):
+    """Returns (counts, first) where first maps each word to its first (position, offset)."""
+    counts = Counter()
+    first = {}
+    for position, post in _match_partition(spec):
+        tokens = post.token_counts()
+        counts.update(tokens)
+        for offset, word in enumerate(tokens):
+            if word not in first:
+                first[word] = (position, offset)
+    for word in stopwords & counts.keys():
+        del counts[word]
+    return counts, first
+
+
+def _map_count_maxima():
+    return (int(_partition['comment_counts'].max(initial=0)), int(_partition['view_counts'].max(initial=0)))
+
+
+def _map_importance(comment_weight, view_weight, max_comments, max_views):
+    return _importance_scores(_partition['comment_counts'], _partition['view_counts'],
+                              comment_weight, view_weight, max_comments, max_views)
+
+
+def _match_spec(include_keywords=None, exclude_keywords=None, user_attribute_filters=None, post_time_range=None):
+    """Normalizes filter arguments the way _get_filtered_posts does before PostIndex.match."""
+    return {
+        'include_keywords': [k.lower() for k in include_keywords] if include_keywords else [],
+        'exclude_keywords': [k.lower() for k in exclude_keywords] if exclude_keywords else [],
+        'user_attribute_filters': user_attribute_filters if user_attribute_filters is not None else {},
+        'post_time_range': post_time_range,
+    }
+
+
+class PartitionedAnalyzer:
+    """
+    Runs filter, word-frequency and importance queries for a
+    SocialMediaAnalyzer across creation-time partitions, one worker process
+    per partition. Use as a context manager or call close() to stop the
+    workers.
+
+    Args:
+        analyzer (SocialMediaAnalyzer): The analyzer to query. Queries see its
+            state as of the call; changes are synced to the workers first.
+        num_partitions (int): Number of partitions and worker processes;
+            defaults to os.cpu_count().
+        mp_context: Optional multiprocessing context for the workers.
+    """
+    def __init__(self, analyzer, num_partitions=None, mp_context=None):
+        num_partitions = num_partitions or os.cpu_count() or 1
+        if num_partitions <= 0:
+            raise ValueError("num_partitions must be positive.")
+        self.analyzer = analyzer
+        self.num_partitions = num_partitions
+        self.mp_context = mp_context
+        self.partitions = []
+        self._pools = []
+        self._content_version = None
+        self._version = None
+        self._shipped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for pool in self._pools:
+            pool.shutdown(wait=True)
+        self._pools = []
+        self.partitions = []
+        self._content_version = self._version = None
+        self._shipped = 0
+
+    def sync(self):
+        """
+        Brings the workers up to date with the analyzer: posts added since
+        the last sync are shipped to the partitions covering their creation
+        times, users added without posts are ignored, and the comment and
+        view counts are resent whenever they changed.
+        """
+        analyzer = self.analyzer
+        # Every count change, including views and comments added directly on posts, moves this version.
+        version = analyzer._importance.version
+        if self._content_version is None:
+            self._build_partitions()
+        elif self._content_version != analyzer.content_version and self._shipped < len(analyzer._importance.post_ids):
+            if self._ship_new_posts():
+                self._version = None
+        if self._version is not None and self._version != version:
+            comment_counts = analyzer._importance.comment_counts
+            view_counts = analyzer._importance.view_counts
+            for future in [pool.submit(_update_counts, comment_counts[partition['positions']],
+                                       view_counts[partition['positions']])
+                           for pool, partition in zip(self._pools, self.partitions)]:
+                future.result()
+        self._content_version = analyzer.content_version
+        self._version = version
+
+    def filter_post_ids(self, include_keywords=None, exclude_keywords=None,
+                        user_attribute_filters=None, post_time_range=None):
+        """Returns the ids of the posts _get_filtered_posts would return, in the same order."""
+        spec = _match_spec(include_keywords, exclude_keywords, user_attribute_filters, post_time_range)
+        positions = sorted(position for partial in self._map(_map_filter, spec, time_range=post_time_range)
+                           for position in partial)
+        post_ids = self.analyzer._importance.post_ids
+        return [post_ids[position] for position in positions]
+
+    def get_filtered_posts(self, include_keywords=None, exclude_keywords=None,
+                           user_attribute_filters=None, post_time_range=None):
+        """Partitioned equivalent of SocialMediaAnalyzer._get_filtered_posts."""
+        posts = self.analyzer.posts
+        return [posts[post_id] for post_id in self.filter_post_ids(include_keywords, exclude_keywords,
+                                                                   user_attribute_filters, post_time_range)]
+
+    def word_frequencies(self, include_keywords=None, exclude_keywords=None,
+                         user_attribute_filters=None, post_time_range=None, stopwords=None):
+        """
+        Returns the word Counter generate_word_cloud would render for these
+        filters, equal to the serial result including its word order.
+        """
+        spec = _match_spec(include_keywords, exclude_keywords, user_attribute_filters, post_time_range)
+        final_stopwords = SocialMediaAnalyzer._stopword_set(stopwords)
+        totals = Counter()
+        first = {}
+        for counts, partial_first in self._map(_map_word_frequencies, spec, final_stopwords,
+                                               time_range=post_time_range):
+            totals.update(counts)
+            for word, seen in partial_first.items():
+                if word not in first or seen < first[word]:
+                    first[word] = seen
+        return Counter({word: totals[word] for word in sorted(totals, key=first.__getitem__)})
+
+    def importance_scores(self, comment_weight=0.5, view_weight=0.5):
+        """
+        Returns importance scores aligned with analyzer._importance.post_ids,
+        identical to PostImportanceEngine.scores.
+        """
+        _validate_weights(comment_weight, view_weight)
+        maxima = self._map(_map_count_maxima)
+        max_comments = max((partial[0] for partial in maxima), default=0)
+        max_views = max((partial[1] for partial in maxima), default=0)
+        scores = np.zeros(len(self.analyzer._importance.post_ids))
+        for partition, partial in zip(self.partitions, self._map(_map_importance, comment_weight, view_weight,
+                                                                 max_comments, max_views)):
+            scores[partition['positions']] = partial
+        return scores
+
+    def top_k(self, k, comment_weight=0.5, view_weight=0.5):
+        """Returns the k (post_id, importance) pairs with the highest importance."""
+        scores = self.importance_scores(comment_weight, view_weight)
+        post_ids = self.analyzer._importance.post_ids
+        return [(post_ids[i], float(scores[i])) for i in _top_k_indices(scores, k).tolist()]
+
+    def _map(self, function, *args, time_range=None):
+        """Runs function in every partition worker (overlapping time_range, if given) and returns the results."""
+        self.sync()
+        futures = []
+        for pool, partition in zip(self._pools, self.partitions):
+            if time_range is not None and (partition['end'] < time_range[0] or partition['start'] > time_range[1]):
+                continue
+            futures.append(pool.submit(function, *args))
+        return [future.result() for future in futures]
+
+    def _ship_new_posts(self):
+        """
+        Sends the posts added since the last sync to the partitions whose
+        time ranges cover them, extending the first or last range for posts
+        outside all of them. Returns True if the counts were shipped too
+        (because the partitions had to be rebuilt instead).
+        """
+        post_ids = self.analyzer._importance.post_ids
+        if not self.partitions:
+            self._build_partitions()
+            return True
+        starts = [partition['start'] for partition in self.partitions]
+        deltas = {}
+        for position in range(self._shipped, len(post_ids)):
+            creation_time = self.analyzer.posts[post_ids[position]].creation_time
+            deltas.setdefault(max(bisect_right(starts, creation_time) - 1, 0), []).append(position)
+        share = math.ceil(len(post_ids) / len(self.partitions))
+        if any(self.partitions[i]['size'] + len(positions) > 2 * share for i, positions in deltas.items()):
+            self._build_partitions()
+            return True
+
+        futures = []
+        for i, positions in deltas.items():
+            partition = self.partitions[i]
+            # New positions are larger than every shipped one, so the partition's stay ascending.
+            positions = np.array(positions, dtype=np.int64)
+            rows, author_attributes, times = self._partition_rows(positions)
+            partition['positions'] = np.concatenate([partition['positions'], positions])
+            partition['start'] = min(partition['start'], min(times))
+            partition['end'] = max(partition['end'], max(times))
+            partition['size'] += len(rows)
+            futures.append(self._pools[i].submit(_add_posts, rows, author_attributes))
+        for future in futures:
+            future.result()
+        self._shipped = len(post_ids)
+        return False
+
+    def _partition_rows(self, positions):
+        """Returns the worker rows, author attributes and creation times of the posts at positions."""
+        analyzer = self.analyzer
+        post_ids = analyzer._importance.post_ids
+        posts = [analyzer.posts[post_ids[position]] for position in positions.tolist()]
+        rows = [(position, post.post_id, post.author.username, post.content, post.creation_time)
+                for position, post in zip(positions.tolist(), posts)]
+        author_attributes = {post.author.username: post.author.attributes for post in posts}
+        return rows, author_attributes, [post.creation_time for post in posts]
+
+    def _build_partitions(self):
+        for pool in self._pools:
+            pool.shutdown(wait=True)
+        self._pools = []
+        self.partitions = []
+
+        analyzer = self.analyzer
+        post_ids = analyzer._importance.post_ids
+        comment_counts = analyzer._importance.comment_counts
+        view_counts = analyzer._importance.view_counts
+        self._shipped = len(post_ids)
+        order = sorted(range(len(post_ids)), key=lambda position: analyzer.posts[post_ids[position]].creation_time)
+        if not order:
+            return
+        for chunk in np.array_split(np.array(order, dtype=np.int64), min(self.num_partitions, len(order))):
+            # Positions ascending inside a partition keep the serial order of ties.
+            positions = np.sort(chunk)
+            rows, author_attributes, times = self._partition_rows(positions)
+            self.partitions.append({'positions': positions, 'start': min(times), 'end': max(times),
+                                    'size': len(rows)})
+            self._pools.append(ProcessPoolExecutor(
+                max_workers=1, mp_context=self.mp_context, initializer=_load_partition,
+                initargs=(rows, author_attributes, comment_counts[positions], view_counts[positions])))
+        # Start every worker now so partitions are indexed in parallel rather than on first query.
+        for future in [pool.submit(_partition_size) for pool in self._pools]:
+            future.result()
@@ -0,0 +1,425 @@
+"""
+Asyncio query service over a live SocialMediaAnalyzer.
+
+The protocol is newline-delimited JSON over a local TCP socket. Each request
+line is {"id": ..., "op": ..., "params": {...}} and is answered by one line
+{"id": ..., "ok": true, "result": ...} or {"id": ..., "ok": false, "error": "..."}.
+Requests on one connection are handled concurrently, so responses can arrive
+out of order; match them by id.
+
+Ops:
+    filter:           _get_filtered_posts arguments -> {'post_ids': [...]}
+    importance:       k, comment_weight, view_weight -> [[post_id, importance], ...]
+    top_engaging:     k, window_hours, comment_weight, view_weight -> [[post_id, importance], ...]
+    word_frequencies: filter arguments, stopwords, limit -> [[word, count], ...]
+    ingest:           events (EventLoader rows) -> loader stats
+    word_clouds:      generate_word_clouds arguments -> per-spec results
+    diagram:          create_diagram arguments with output_path -> stage timings
+    stats:            latency percentiles, queue depth and lock state
+
+Time values (post_time_range, event times) may be ISO 8601 strings or epoch
+seconds.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import time
+from collections import defaultdict, deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import numpy as np
+from eventLoader import EventLoader, parse_time
+from socialMediaAnalysis import _normalize_filter_spec
+
+# Upper bound on one request line; ingest batches can be large.
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class ReadWriteLock:
+    """
+    asyncio reader-writer lock. Any number of readers share the lock; a
+    writer waits for active readers to finish and, while it waits, new
+    readers queue behind it so a steady read load cannot starve ingest.
+    """
+    def __init__(self):
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self.writing and not self.waiting_writers)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.readers -= 1
+                if not self.readers:
+                    self._condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._condition:
+            self.waiting_writers += 1
+            try:
+                await self._condition.wait_for(lambda: not self.writing and not self.readers)
+            finally:
+                self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.writing = False
+                self._condition.notify_all()
+
+
+def _filter_arguments(params):
+    """Picks the _get_filtered_posts keyword arguments out of request params."""
+    time_range = params.get('post_time_range')
+    return {
+        'include_keywords': params.get('include_keywords'),
+        'exclude_keywords': params.get('exclude_keywords'),
+        'user_attribute_filters': params.get('user_attribute_filters'),
+        'post_time_range': (parse_time(time_range[0]), parse_time(time_range[1])) if time_range else None,
+    }
+
+
+class QueryService:
+    """
+    Serves concurrent read queries and ingest updates for one analyzer.
+
+    Queries run under the read side of a ReadWriteLock and ingest batches
+    under the write side, so readers never see a half-applied batch. Fast
+    queries run on the event loop; rendering (word_clouds, diagram) runs in
+    the executor so the loop keeps answering other clients. A render holds
+    the read lock only while it copies what it draws out of the analyzer
+    (word counts, or the graph and drawing attributes); layout and drawing
+    run after it is released, so a waiting ingest does not hold up other
+    readers for a whole render. Renders are serialized among themselves
+    because they share the analyzer's layout and level-of-detail caches. The caches that queries on the loop also use
+    (the query cache, keyword postings, importance scores and the importance
+    node attributes) guard their updates with their own locks.
+
+    Args:
+        analyzer (SocialMediaAnalyzer): The live analyzer to serve.
+        host (str): Interface to bind; defaults to localhost only.
+        port (int): TCP port; 0 picks a free one (see address after start()).
+        executor (concurrent.futures.Executor): Runs rendering work; a
+            single-thread pool is created (and shut down on close) if None.
+        latency_window (int): Number of recent latencies kept per op.
+    """
+    def __init__(self, analyzer, host='127.0.0.1', port=0, executor=None, latency_window=10000):
+        self.analyzer = analyzer
+        self.host = host
+        self.port = port
+        self.address = None
+        self.lock = ReadWriteLock()
+        self.loader = EventLoader(analyzer)
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._render_lock = asyncio.Lock()
+        self._server = None
+        self._connections = {}
+        self._latencies = defaultdict(lambda: deque(maxlen=latency_window))
+        self._requests = Counter()
+        self._errors = Counter()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self._handlers = {
+            'filter': self._filter,
+            'importance': self._importance,
+            'top_engaging': self._top_engaging,
+            'word_frequencies': self._word_frequencies,
+            'ingest': self._ingest,
+            'word_clouds': self._word_clouds,
+            'diagram': self._diagram,
+            'stats': self._stats,
+        }
+
+    async def start(self):
+        """Starts listening; the bound (host, port) is stored in self.address."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='query-render')
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_LINE_BYTES)
+        self.address = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def handle(self, request):
+        """
+        Answers one decoded request dict and returns the response dict.
+        Also usable in-process without the socket.
+        """
+        start = time.perf_counter()
+        op = request.get('op') if isinstance(request, dict) else None
+        try:
+            handler = self._handlers.get(op)
+            if handler is None:
+                raise ValueError(f"Unknown op: {op!r}")
+            result = await handler(request.get('params') or {})
+            response = {'id': request.get('id'), 'ok': True, 'result': result}
+        except Exception as e:
+            # Any failure is reported to the client; raising here would leave its request unanswered.
+            self._errors[op] += 1
+            response = {'id': request.get('id') if isinstance(request, dict) else None,
+                        'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        self._requests[op] += 1
+        self._latencies[op].append(time.perf_counter() - start)
+        return response
+
+    def stats(self):
+        """
+        Returns request and error counts, p50/p99 latency in seconds per op
+        (over the latency window), the current and peak number of requests
+        in flight (queue_depth counts every request read from a connection
+        and not yet answered, including ones waiting for the lock or the
+        executor), the lock state and the analyzer's query cache statistics.
+        """
+        latency = {}
+        for op, samples in self._latencies.items():
+            values = np.fromiter(samples, dtype=float, count=len(samples))
+            p50, p99 = np.percentile(values, [50, 99])
+            latency[op] = {'count': len(values), 'p50': float(p50), 'p99': float(p99)}
+        return {
+            'requests': dict(self._requests),
+            'errors': dict(self._errors),
+            'latency': latency,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'active_readers': self.lock.readers,
+            'waiting_writers': self.lock.waiting_writers,
+            'query_cache': self.analyzer.query_cache.info() if self.analyzer.query_cache is not None else None,
+        }
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[asyncio.current_task()] = writer
+        write_lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                self.queue_depth += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+                task = asyncio.create_task(self._respond(line, writer, write_lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _respond(self, line, writer, write_lock):
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'id': None, 'ok': False, 'error': f"Malformed request: {e}"}
+            else:
+                response = await self.handle(request)
+            async with write_lock:
+                writer.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+                await writer.drain()
+        finally:
+            self.queue_depth -= 1
+
+    async def _run_render(self, prepare, render):
+        """
+        Runs prepare() under the read lock, then render(prepared) after
+        releasing it, both in the executor. Only prepare reads the analyzer,
+        so a pending ingest waits for it but not for the render.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._render_lock:
+            async with self.lock.read():
+                prepared = await loop.run_in_executor(self._executor, prepare)
+            return await loop.run_in_executor(self._executor, lambda: render(prepared))
+
+    async def _filter(self, params):
+        async with self.lock.read():
+            posts = self.analyzer._get_filtered_posts(**_filter_arguments(params))
+        return {'post_ids': [post.post_id for post in posts]}
+
+    async def _importance(self, params):
+        async with self.lock.read():
+            top = self.analyzer._importance.top_k(params.get('k', 10), params.get('comment_weight', 0.5),
+                                                  params.get('view_weight', 0.5))
+        return [[post_id, importance] for post_id, importance in top]
+
+    async def _top_engaging(self, params):
+        async with self.lock.read():
+            end = params.get('end')
+            top = self.analyzer.top_engaging_posts(
+                params.get('k', 10), window=datetime.timedelta(hours=params.get('window_hours', 24)),
+                end=parse_time(end) if end is not None else None,
+                comment_weight=params.get('comment_weight', 0.5), view_weight=params.get('view_weight', 0.5))
+        return [[post_id, importance] for post_id, importance in top]
+
+    async def _word_frequencies(self, params):
+        async with self.lock.read():
+            arguments = _filter_arguments(params)
+            posts = self.analyzer._get_filtered_posts(**arguments)
+            counts = self.analyzer._filtered_word_frequencies(
+                _normalize_filter_spec(**arguments), posts, self.analyzer._stopword_set(params.get('stopwords')))
+        return [[word, count] for word, count in counts.most_common(params.get('limit', 50))]
+
+    async def _ingest(self, params):
+        events = params['events']
+        async with self.lock.write():
+            return self.loader.load_chunks([events])
+
+    async def _word_clouds(self, params):
+        specs = [dict(spec, **_filter_arguments(spec)) for spec in params['filter_specs']]
+        options = {key: params[key] for key in ('max_words', 'stopwords', 'background_color', 'image_format')
+                   if key in params}
+
+        def render(prepared):
+            results, render_jobs = prepared
+            self.analyzer._render_word_cloud_jobs(render_jobs, params.get('max_workers'))
+            return results
+
+        return await self._run_render(
+            lambda: self.analyzer._word_cloud_jobs(specs, params['output_dir'], **options), render)
+
+    async def _diagram(self, params):
+        options = {key: params[key] for key in ('comment_weight', 'view_weight', 'dimensions',
+                                                'num_important_posts_to_highlight', 'max_nodes',
+                                                'max_communities') if key in params}
+        return await self._run_render(
+            lambda: self.analyzer._diagram_snapshot(**options),
+            lambda snapshot: self.analyzer._draw_diagram(snapshot, show_labels=params.get('show_labels', True),
+                                                         output_path=params['output_path']))
+
+    async def _stats(self, params):
+        return self.stats()
+
+
+class QueryClient:
+    """
+    Client for QueryService. Requests may be awaited concurrently over the
+    one connection; failed queries raise ValueError with the server's message.
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._waiting = {}
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE_BYTES)
+        return cls(reader, writer)
+
+    async def request(self, op, **params):
+        if self._reader_task.done():
+            raise ConnectionError("Query service connection closed.")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self._writer.write(json.dumps({'id': request_id, 'op': op, 'params': params}, default=str).encode('utf-8')
+                           + b'\n')
+        await self._writer.drain()
+        response = await future
+        if not response['ok']:
+            raise ValueError(response['error'])
+        return response['result']
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self._reader_task
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _read_responses(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._waiting.pop(response.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except ConnectionError:
+            pass
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Query service connection closed."))
+            self._waiting.clear()
+
+
+def main(argv=None):
+    from socialMediaAnalysis import SocialMediaAnalyzer
+
+    parser = argparse.ArgumentParser(description="Serve queries over a SocialMediaAnalyzer snapshot.")
+    parser.add_argument('snapshot', help="Snapshot written by SocialMediaAnalyzer.save().")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    async def serve():
+        service = QueryService(SocialMediaAnalyzer.load(args.snapshot), args.host, args.port)
+        await service.start()
+        print(f"Serving on {service.address[0]}:{service.address[1]}")
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,19 +1,76 @@
+import cProfile
 import datetime
-from collections import defaultdict, Counter
+import functools
+import hashlib
+import heapq
+import importlib.util
+import inspect
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import types
+import weakref
+from array import array
+from collections import defaultdict, Counter, OrderedDict
 import networkx as nx
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud, STOPWORDS
+import numpy as np
 import re
 import math
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+
+def _count_tokens(content):
+    """Counter of the lowercased word tokens longer than one character, as Post.token_counts."""
+    return Counter(token for token in _TOKEN_PATTERN.findall(content.lower()) if len(token) > 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _default_stopwords():
+    """
+    wordcloud's STOPWORDS, read straight from its data file so that filtering
+    and word counting never import wordcloud (and with it matplotlib).
+    """
+    spec = importlib.util.find_spec('wordcloud')
+    try:
+        with open(os.path.join(spec.submodule_search_locations[0], 'stopwords')) as handle:
+            return frozenset(line.strip() for line in handle)
+    except (AttributeError, TypeError, OSError):
+        from wordcloud import STOPWORDS
+        return frozenset(STOPWORDS)
 
 class User:
+    __slots__ = ('username', 'attributes', 'connections', 'posts_authored', '_posts_read',
+                 'comments_made', 'view_store')
+
     def __init__(self, username, attributes=None):
         self.username = username
         self.attributes = attributes if attributes is not None else {}
         self.connections = defaultdict(list)
         self.posts_authored = []
-        self.posts_read = []
+        self._posts_read = []
         self.comments_made = []
+        self.view_store = None
+
+    @property
+    def posts_read(self):
+        if self.view_store is not None:
+            return self.view_store.views_of_user(self)
+        return self._posts_read
+
+    @posts_read.setter
+    def posts_read(self, value):
+        if self.view_store is not None:
+            raise AttributeError("posts_read is read-only once the user is attached to a ViewEventStore.")
+        self._posts_read = value
 
     def add_connection(self, other_user, category):
         self.connections[category].append(other_user)
@@ -22,7 +79,10 @@ class User:
         self.posts_authored.append(post)
 
     def add_read_post(self, post, view_time):
-        self.posts_read.append((post, view_time))
+        if self.view_store is not None:
+            self.view_store.append(self, post, view_time)
+        else:
+            self._posts_read.append((post, view_time))
 
     def add_comment(self, comment):
         self.comments_made.append(comment)
@@ -31,30 +91,108 @@ class User:
         return f"User(username='{self.username}')"
 
 class Post:
+    __slots__ = ('post_id', 'author', 'content', 'creation_time', 'comments', '_viewers', 'view_store',
+                 '_token_counts', '_watchers')
+
     def __init__(self, post_id, author, content, creation_time):
         self.post_id = post_id
         self.author = author
         self.content = content
         self.creation_time = creation_time
         self.comments = []
-        self.viewers = []
+        self._viewers = []
+        self.view_store = None
+        self._token_counts = None
+        self._watchers = None
+
+    @property
+    def viewers(self):
+        if self.view_store is not None:
+            return self.view_store.views_of_post(self)
+        return self._viewers
+
+    @viewers.setter
+    def viewers(self, value):
+        if self.view_store is not None:
+            raise AttributeError("viewers is read-only once the post is attached to a ViewEventStore.")
+        self._viewers = value
 
     def add_comment(self, comment):
         self.comments.append(comment)
+        self._notify('comment', comment.author)
 
     def add_viewer(self, user, view_time):
-        self.viewers.append((user, view_time))
+        if self.view_store is not None:
+            # The store notifies the watchers, also for views it logs on its own.
+            self.view_store.append(user, self, view_time)
+        else:
+            self._viewers.append((user, view_time))
+            self._notify('view', user)
+
+    def add_viewers(self, views):
+        """Adds many (user, view_time) views, notifying the watchers once."""
+        views = list(views)
+        if self.view_store is not None:
+            self.view_store.extend((user, self, view_time) for user, view_time in views)
+        elif views:
+            self._viewers.extend(views)
+            self._notify('views', [user for user, _ in views])
+
+    def watch(self, watcher):
+        """
+        Calls watcher.post_changed(post, kind, user) for every later view
+        ('view') or comment ('comment'). Views added in bulk are reported
+        once per post as kind 'views' with the list of viewing users.
+        Watchers are held weakly.
+        """
+        watchers = [ref for ref in self._watchers or () if ref() is not None and ref() is not watcher]
+        watchers.append(weakref.ref(watcher))
+        self._watchers = watchers
+
+    def __getstate__(self):
+        # Watchers are weak references to live analyzers, not part of the post's data.
+        return None, {slot: getattr(self, slot) for slot in self.__slots__ if slot != '_watchers'}
+
+    def __setstate__(self, state):
+        for slot, value in state[1].items():
+            setattr(self, slot, value)
+        self._watchers = None
+
+    def _notify(self, kind, user):
+        if self._watchers:
+            for ref in self._watchers:
+                watcher = ref()
+                if watcher is not None:
+                    watcher.post_changed(self, kind, user)
 
     def get_num_comments(self):
         return len(self.comments)
 
+    def token_counts(self):
+        """
+        Returns a Counter of the lowercased word tokens (longer than one
+        character) in the content. Computed once and cached on the post.
+        """
+        if self._token_counts is None:
+            self._token_counts = _count_tokens(self.content)
+        return self._token_counts
+
     def get_num_views(self):
-        return len(self.viewers)
+        """
+        Number of stored views. Views recorded by an analyzer in approximate
+        mode are not stored on the post; use analyzer.distinct_viewers(post)
+        for the estimate importance is based on there.
+        """
+        if self.view_store is not None:
+            return self.view_store.count_for_post(self)
+        return len(self._viewers)
 
     def __repr__(self):
         return f"Post(id='{self.post_id}', author='{self.author.username}', created='{self.creation_time.strftime('%Y-%m-%d %H:%M:%S')}')"
 
 class Comment:
+    __slots__ = ('comment_id', 'author', 'post', 'content', 'creation_time')
+
     def __init__(self, comment_id, author, post, content, creation_time):
         self.comment_id = comment_id
         self.author = author
@@ -64,14 +202,1456 @@ class Comment:
 
     def __repr__(self):
         return f"Comment(id='{self.comment_id}', author='{self.author.username}', post_id='{self.post.post_id}')"
-    
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class ViewEventStore:
+    """
+    Columnar log of view events for compact mode. Each view is one row of
+    three int64 columns (user id, post id, epoch microseconds) held in
+    array buffers, and Post.viewers / User.posts_read become read-only
+    views over this single log instead of two lists of tuples.
+    """
+    def __init__(self):
+        self.user_column = array('q')
+        self.post_column = array('q')
+        self.time_column = array('q')
+        self.users = []
+        self.posts = []
+        self._user_index = {}
+        self._post_index = {}
+        self._views_per_post = array('q')
+        self._aware = None
+        self._unreconciled = {}
+        self._groupings = {}
+
+    def __len__(self):
+        self._reconcile()
+        return len(self.time_column)
+
+    @classmethod
+    def from_columns(cls, users, posts, user_column, post_column, time_column, aware=False,
+                     views_per_post=None):
+        """
+        Builds a store over existing int64 columns, e.g. memory-mapped
+        snapshot sections. The columns are only copied into appendable
+        buffers on the first append, so read-only use shares their pages.
+        user_column/post_column hold indexes into users/posts.
+        """
+        store = cls()
+        for user in users:
+            store._user_index[user.username] = len(store.users)
+            store.users.append(user)
+            user._posts_read = []
+            user.view_store = store
+        for post in posts:
+            store._post_index[post.post_id] = len(store.posts)
+            store.posts.append(post)
+            post._viewers = []
+            post.view_store = store
+        store.user_column = user_column
+        store.post_column = post_column
+        store.time_column = time_column
+        if views_per_post is None:
+            views_per_post = np.bincount(np.asarray(post_column), minlength=len(posts)).astype(np.int64)
+        store._views_per_post = views_per_post
+        store._aware = aware if len(time_column) else None
+        return store
+
+    def adopt(self, users, posts):
+        """Attaches posts and users, moving their existing view lists into the log."""
+        for post in posts:
+            self.attach_post(post)
+        for user in users:
+            self.attach_user(user)
+        self._reconcile()
+
+    def attach_post(self, post):
+        """Attaches a post; its existing viewers are appended to the log."""
+        post_key = self._post_index.get(post.post_id)
+        if post_key is not None:
+            return post_key
+        post_key = len(self.posts)
+        self._post_index[post.post_id] = post_key
+        self.posts.append(post)
+        self._make_appendable()
+        self._views_per_post.append(0)
+        legacy = post.viewers
+        post.view_store = None
+        post._viewers = []
+        post.view_store = self
+        # Moving existing views into the log does not change the post's counts.
+        for user, view_time in legacy:
+            self._append_row(user, post, view_time)
+        return post_key
+
+    def attach_user(self, user):
+        """
+        Attaches a user. Entries in its existing posts_read that are not already
+        logged through a post's viewers are appended on the next read.
+        """
+        user_key = self._user_index.get(user.username)
+        if user_key is not None:
+            return user_key
+        user_key = len(self.users)
+        self._user_index[user.username] = user_key
+        self.users.append(user)
+        legacy = user.posts_read
+        if legacy:
+            self._unreconciled[user_key] = legacy
+        user.view_store = None
+        user._posts_read = []
+        user.view_store = self
+        return user_key
+
+    def append(self, user, post, view_time):
+        """Appends one view event and notifies the post's watchers. Amortized O(1)."""
+        self._append_row(user, post, view_time)
+        post._notify('view', user)
+
+    def extend(self, views):
+        """
+        Appends many (user, post, view_time) events with one extend per
+        column, then notifies each post's watchers once with its viewers.
+        """
+        views = list(views)
+        if not views:
+            return
+        for user in {user.username: user for user, _, _ in views}.values():
+            self.attach_user(user)
+        for post in {post.post_id: post for _, post, _ in views}.values():
+            self.attach_post(post)
+        self._make_appendable()
+        self.user_column.extend([self._user_index[user.username] for user, _, _ in views])
+        post_keys = [self._post_index[post.post_id] for _, post, _ in views]
+        self.post_column.extend(post_keys)
+        self.time_column.extend([self._to_micros(view_time) for _, _, view_time in views])
+        viewers = defaultdict(list)
+        for (user, _, _), post_key in zip(views, post_keys):
+            viewers[post_key].append(user)
+        for post_key, users in viewers.items():
+            self._views_per_post[post_key] += len(users)
+            self.posts[post_key]._notify('views', users)
+
+    def _append_row(self, user, post, view_time):
+        user_key = self.attach_user(user)
+        post_key = self.attach_post(post)
+        self._make_appendable()
+        self.user_column.append(user_key)
+        self.post_column.append(post_key)
+        self.time_column.append(self._to_micros(view_time))
+        self._views_per_post[post_key] += 1
+
+    def count_for_post(self, post):
+        self._reconcile()
+        return int(self._views_per_post[self._post_index[post.post_id]])
+
+    def views_of_post(self, post):
+        """Returns the (user, view_time) pairs for a post in insertion order."""
+        self._reconcile()
+        rows = self._rows('post', self._post_index[post.post_id])
+        return [(self.users[self.user_column[row]], self._from_micros(int(self.time_column[row]))) for row in rows]
+
+    def views_of_user(self, user):
+        """Returns the (post, view_time) pairs for a user in insertion order."""
+        self._reconcile()
+        return self._views_of_user_key(self._user_index[user.username])
+
+    def memory_usage(self):
+        """
+        Reports the bytes held by the event columns and by the cached per-column
+        argsorts that _rows builds on the first read (up to 16 bytes per event
+        per column), alongside an estimate of what the same events cost as
+        (object, datetime) tuples stored in both Post.viewers and User.posts_read.
+        """
+        self._reconcile()
+        events = len(self.time_column)
+        column_bytes = sum(len(column) * column.itemsize
+                           for column in (self.user_column, self.post_column, self.time_column))
+        index_bytes = sum(order.nbytes + sorted_values.nbytes for _, order, sorted_values in self._groupings.values())
+        pointer_size = sys.getsizeof([None]) - sys.getsizeof([])
+        legacy_per_event = (2 * sys.getsizeof((None, None)) + sys.getsizeof(_EPOCH) + 2 * pointer_size)
+        return {
+            'events': events,
+            'bytes': column_bytes + index_bytes,
+            'column_bytes': column_bytes,
+            'index_bytes': index_bytes,
+            'bytes_per_event': (column_bytes + index_bytes) / events if events else 0.0,
+            'legacy_bytes_per_event': legacy_per_event,
+        }
+
+    def _views_of_user_key(self, user_key):
+        rows = self._rows('user', user_key)
+        return [(self.posts[self.post_column[row]], self._from_micros(int(self.time_column[row]))) for row in rows]
+
+    def _rows(self, column_name, key):
+        """
+        Returns log rows whose column equals key, in insertion order. Rows
+        covered by the cached stable argsort are found by binary search and
+        rows appended since are scanned directly; the argsort is rebuilt only
+        once that tail outgrows a sixteenth of the log, so interleaved appends
+        and reads stay amortized O(log n) per event.
+        """
+        column = self.user_column if column_name == 'user' else self.post_column
+        if isinstance(column, np.ndarray):
+            values = column
+        else:
+            values = np.frombuffer(column, dtype=np.int64) if len(column) else np.zeros(0, dtype=np.int64)
+        cached = self._groupings.get(column_name)
+        if cached is None or not cached[0] <= len(values) <= cached[0] + max(4096, cached[0] // 16):
+            order = np.argsort(values, kind='stable')
+            cached = (len(values), order, values[order])
+            self._groupings[column_name] = cached
+        sorted_length, order, sorted_values = cached
+        lo = np.searchsorted(sorted_values, key, side='left')
+        hi = np.searchsorted(sorted_values, key, side='right')
+        rows = order[lo:hi]
+        tail = np.flatnonzero(values[sorted_length:] == key)
+        if len(tail):
+            rows = np.concatenate([rows, tail + sorted_length])
+        return rows.tolist()
+
+    def column_arrays(self):
+        """Returns the (user, post, time) columns as int64 NumPy arrays."""
+        self._reconcile()
+        return tuple(column if isinstance(column, np.ndarray) else np.array(column, dtype=np.int64)
+                     for column in (self.user_column, self.post_column, self.time_column))
+
+    def _make_appendable(self):
+        if isinstance(self.time_column, array):
+            return
+        for name in ('user_column', 'post_column', 'time_column', '_views_per_post'):
+            column = array('q')
+            column.frombytes(np.ascontiguousarray(getattr(self, name), dtype=np.int64).tobytes())
+            setattr(self, name, column)
+
+    def _reconcile(self):
+        while self._unreconciled:
+            user_key = next(iter(self._unreconciled))
+            legacy = self._unreconciled.pop(user_key)
+            user = self.users[user_key]
+            # Attach every referenced post first so its viewers are already logged.
+            for post, _ in legacy:
+                self.attach_post(post)
+            logged = Counter((post.post_id, view_time) for post, view_time in self._views_of_user_key(user_key))
+            for post, view_time in legacy:
+                key = (post.post_id, view_time)
+                if logged[key]:
+                    logged[key] -= 1
+                else:
+                    self.append(user, post, view_time)
+
+    def _to_micros(self, view_time):
+        aware = view_time.tzinfo is not None
+        if self._aware is None:
+            self._aware = aware
+        elif self._aware != aware:
+            raise ValueError("Cannot mix naive and timezone-aware view times in one ViewEventStore.")
+        return (view_time - (_EPOCH_UTC if aware else _EPOCH)) // _MICROSECOND
+
+    def _from_micros(self, micros):
+        return (_EPOCH_UTC if self._aware else _EPOCH) + datetime.timedelta(microseconds=micros)
+
+
+def _validate_weights(comment_weight, view_weight):
+    if not (0 <= comment_weight <= 1 and 0 <= view_weight <= 1 and abs(comment_weight + view_weight - 1) < 1e-6):
+        raise ValueError("Weights must be between 0 and 1 and sum to 1.")
+
+
+def _importance_scores(comment_counts, view_counts, comment_weight, view_weight,
+                       max_comments=None, max_views=None):
+    """
+    Weighted sum of comment and view counts, each normalized by its maximum.
+    Partitioned callers pass the global maxima of all partitions.
+    """
+    if max_comments is None:
+        max_comments = comment_counts.max(initial=0)
+    if max_views is None:
+        max_views = view_counts.max(initial=0)
+    norm_max_comments = max_comments if max_comments > 0 else 1
+    norm_max_views = max_views if max_views > 0 else 1
+
+    return (comment_weight * (comment_counts / norm_max_comments)) + \
+           (view_weight * (view_counts / norm_max_views))
+
+
+def _top_k_indices(scores, k):
+    """
+    Indexes of the k highest scores, highest first with ties in index order.
+    Uses a partial selection rather than a full sort.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class PostImportanceEngine:
+    """
+    Keeps per-post comment and view counts in NumPy arrays so importance
+    scores are computed in one vectorized pass. Scores are cached per
+    (comment_weight, view_weight) pair until the counts change.
+
+    The engine watches its posts (see Post.watch), so views and comments
+    added with Post.add_viewer / Post.add_comment are counted as they happen.
+    With viewer_sketches set (approximate mode) a view instead adds the
+    change in the post's distinct-viewer estimate.
+    """
+    def __init__(self, posts=()):
+        self.post_ids = []
+        self.post_index = {}
+        self._comment_buffer = np.zeros(0, dtype=np.int64)
+        self._view_buffer = np.zeros(0, dtype=np.int64)
+        self.version = 0
+        self.viewer_sketches = None
+        self._score_cache = {}
+        self._lock = threading.RLock()
+        self.load(posts)
+
+    @property
+    def comment_counts(self):
+        return self._comment_buffer[:len(self.post_ids)]
+
+    @property
+    def view_counts(self):
+        return self._view_buffer[:len(self.post_ids)]
+
+    def load(self, posts):
+        """Replaces the tracked posts and their counts with the given posts."""
+        posts = list(posts)
+        self.post_ids = [post.post_id for post in posts]
+        self.post_index = {post_id: i for i, post_id in enumerate(self.post_ids)}
+        self._comment_buffer = np.fromiter((post.get_num_comments() for post in posts),
+                                           dtype=np.int64, count=len(posts))
+        self._view_buffer = np.fromiter((post.get_num_views() for post in posts),
+                                        dtype=np.int64, count=len(posts))
+        for post in posts:
+            post.watch(self)
+        self.invalidate()
+
+    def add_post(self, post):
+        """Appends a post; the count buffers grow geometrically so this is amortized O(1)."""
+        row = len(self.post_ids)
+        if row == len(self._comment_buffer):
+            self._grow(max(16, 2 * row))
+        self.post_index[post.post_id] = row
+        self.post_ids.append(post.post_id)
+        self._comment_buffer[row] = post.get_num_comments()
+        self._view_buffer[row] = post.get_num_views()
+        post.watch(self)
+        self.invalidate()
+
+    def post_changed(self, post, kind, user):
+        """Post.watch callback: counts new views or a new comment on a tracked post."""
+        if self.post_index.get(post.post_id) is None:
+            return
+        users = user if kind == 'views' else [user]
+        if kind == 'comment':
+            self.record_comments(post.post_id)
+        elif self.viewer_sketches is not None:
+            added = sum(self.viewer_sketches.record_view(post.post_id, viewer.username) for viewer in users)
+            if added:
+                self.record_views(post.post_id, added)
+        else:
+            self.record_views(post.post_id, len(users))
+
+    def record_views(self, post_id, count=1):
+        self._view_buffer[self.post_index[post_id]] += count
+        self.invalidate()
+
+    def record_comments(self, post_id, count=1):
+        self._comment_buffer[self.post_index[post_id]] += count
+        self.invalidate()
+
+    def _grow(self, capacity):
+        size = len(self.post_ids)
+        for name in ('_comment_buffer', '_view_buffer'):
+            grown = np.zeros(capacity, dtype=np.int64)
+            grown[:size] = getattr(self, name)[:size]
+            setattr(self, name, grown)
+
+    def invalidate(self):
+        """Drops cached scores; call whenever the counts change."""
+        with self._lock:
+            self.version += 1
+            self._score_cache.clear()
+
+    def scores(self, comment_weight=0.5, view_weight=0.5):
+        """
+        Returns a read-only array of importance scores aligned with post_ids.
+        """
+        key = (comment_weight, view_weight)
+        with self._lock:
+            cached = self._score_cache.get(key)
+            if cached is not None:
+                return cached
+
+            scores = _importance_scores(self.comment_counts, self.view_counts, comment_weight, view_weight)
+            scores.setflags(write=False)
+            self._score_cache[key] = scores
+            return scores
+
+    def top_k(self, k, comment_weight=0.5, view_weight=0.5):
+        """
+        Returns (post_id, importance) pairs for the k most important posts,
+        highest first. Uses a partial selection rather than a full sort.
+        """
+        scores = self.scores(comment_weight, view_weight)
+        return [(self.post_ids[i], float(scores[i])) for i in _top_k_indices(scores, k).tolist()]
+
+    def highlight_threshold(self, k, comment_weight=0.5, view_weight=0.5):
+        """
+        Returns the importance of the k-th most important post, or 0 when
+        there are no posts.
+        """
+        scores = self.scores(comment_weight, view_weight)
+        n = len(scores)
+        if n == 0:
+            return 0
+        k = min(k, n)
+        if k <= 0:
+            return float(scores.min())
+        return float(np.partition(scores, n - k)[n - k])
+
+
+class PostIndex:
+    """
+    Inverted indexes over posts used by _get_filtered_posts: a token posting
+    list, a hash index per author attribute and a creation-time sorted array.
+    Filters are answered by intersecting posting lists, so query cost follows
+    the size of the candidate sets rather than the number of posts.
+
+    Substring keyword matches are cached for the max_cached_keywords most
+    recently used keywords. Posts added later are not tested against the
+    cached keywords up front; a cached keyword catches up on them the next
+    time it is used.
+    """
+    def __init__(self, posts=(), max_cached_keywords=1024):
+        if max_cached_keywords <= 0:
+            raise ValueError("max_cached_keywords must be positive.")
+        self.posts = {}
+        self.positions = {}
+        self.token_postings = defaultdict(set)
+        self.attribute_postings = defaultdict(dict)
+        self.max_cached_keywords = max_cached_keywords
+        self._post_order = []
+        self._time_entries = []
+        self._time_sorted = True
+        self._keyword_cache = OrderedDict()
+        self._lock = threading.RLock()
+        for post in posts:
+            self.add_post(post)
+
+    def add_post(self, post):
+        """Indexes a single post. Amortized O(tokens + attributes)."""
+        post_id = post.post_id
+        self.positions[post_id] = len(self.positions)
+        self.posts[post_id] = post
+        self._post_order.append(post_id)
+
+        # Single-character tokens are not counted by Post.token_counts but must stay searchable.
+        for token in _TOKEN_PATTERN.findall(post.content.lower()):
+            self.token_postings[token].add(post_id)
+
+        for attr_key, attr_value in post.author.attributes.items():
+            try:
+                self.attribute_postings[attr_key].setdefault(attr_value, set()).add(post_id)
+            except TypeError:
+                # Unhashable values cannot equal a hashable filter value; they
+                # are only reachable through the unhashable fallback below.
+                pass
+
+        self._time_entries.append((post.creation_time, self.positions[post_id], post_id))
+        self._time_sorted = False
+
+    def match(self, include_keywords=(), exclude_keywords=(),
+              user_attribute_filters=None, post_time_range=None, stats=None):
+        """
+        Returns ids of the posts matching every filter, in insertion order.
+        Keywords are expected to be lowercased already. If a stats dict is
+        given, 'posts_scanned' is set to the number of candidate posts walked.
+        """
+        candidate_sets = []
+        unhashable_filters = {}
+
+        if post_time_range:
+            candidate_sets.append(self._posts_in_time_range(*post_time_range))
+
+        for attr_key, attr_value in (user_attribute_filters or {}).items():
+            try:
+                postings = self.attribute_postings.get(attr_key, {}).get(attr_value, set())
+            except TypeError:
+                unhashable_filters[attr_key] = attr_value
+                continue
+            candidate_sets.append(postings)
+
+        if include_keywords:
+            included = set()
+            for keyword in include_keywords:
+                included |= self._keyword_postings(keyword)
+            candidate_sets.append(included)
+
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            result = set(candidate_sets[0])
+            if stats is not None:
+                stats['posts_scanned'] = len(result)
+            for postings in candidate_sets[1:]:
+                if not result:
+                    break
+                result &= postings
+        else:
+            result = set(self.posts)
+            if stats is not None:
+                stats['posts_scanned'] = len(result)
+
+        for keyword in exclude_keywords:
+            if not result:
+                break
+            result -= self._keyword_postings(keyword)
+
+        if unhashable_filters:
+            result = {post_id for post_id in result
+                      if all(attr_key in self.posts[post_id].author.attributes and
+                             self.posts[post_id].author.attributes[attr_key] == attr_value
+                             for attr_key, attr_value in unhashable_filters.items())}
+
+        return sorted(result, key=self.positions.__getitem__)
+
+    def _posts_in_time_range(self, start_time, end_time):
+        with self._lock:
+            if not self._time_sorted:
+                self._time_entries.sort()
+                self._time_sorted = True
+            lo = bisect_left(self._time_entries, start_time, key=lambda entry: entry[0])
+            hi = bisect_right(self._time_entries, end_time, key=lambda entry: entry[0])
+            return {entry[2] for entry in self._time_entries[lo:hi]}
+
+    def _keyword_postings(self, keyword):
+        """
+        Returns ids of posts whose lowercased content contains keyword as a
+        substring, matching the original linear scan exactly.
+        """
+        with self._lock:
+            cached = self._keyword_cache.get(keyword)
+            if cached is not None:
+                self._keyword_cache.move_to_end(keyword)
+                matched, indexed = cached
+                if indexed < len(self._post_order):
+                    for post_id in self._post_order[indexed:]:
+                        if keyword in self.posts[post_id].content.lower():
+                            matched.add(post_id)
+                    cached[1] = len(self._post_order)
+                return matched
+
+            pieces = _TOKEN_PATTERN.findall(keyword)
+            if not pieces:
+                matched = {post_id for post_id, post in self.posts.items()
+                           if keyword in post.content.lower()}
+            else:
+                candidates = None
+                for piece in pieces:
+                    piece_posts = self._token_substring_postings(piece)
+                    candidates = piece_posts if candidates is None else candidates & piece_posts
+                if pieces == [keyword]:
+                    # A keyword made only of word characters can only occur inside a single token.
+                    matched = candidates
+                else:
+                    matched = {post_id for post_id in candidates
+                               if keyword in self.posts[post_id].content.lower()}
+
+            self._keyword_cache[keyword] = [matched, len(self._post_order)]
+            if len(self._keyword_cache) > self.max_cached_keywords:
+                self._keyword_cache.popitem(last=False)
+            return matched
+
+    def _token_substring_postings(self, piece):
+        matched = set(self.token_postings.get(piece, ()))
+        for token, post_ids in self.token_postings.items():
+            if piece in token and token != piece:
+                matched |= post_ids
+        return matched
+
+
+def _stable_hash(value):
+    """64-bit hash of repr(value) that is stable across processes."""
+    return int.from_bytes(hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _code_identity(code):
+    """Process-independent description of a code object, including nested ones."""
+    consts = []
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            consts.append(_code_identity(const))
+        elif isinstance(const, frozenset):
+            consts.append(sorted(map(repr, const)))
+        else:
+            consts.append(repr(const))
+    return code.co_code, code.co_names, consts
+
+
+def _layout_key(layout_algorithm, kwargs):
+    """
+    Cache name for layout_algorithm called with kwargs: its qualified name
+    plus a digest of its code, defaults, closure, partial arguments and the
+    kwargs, so lambdas and same-named functions do not share entries.
+    """
+    function, bound = layout_algorithm, []
+    while isinstance(function, functools.partial):
+        bound.append((function.args, sorted(function.keywords.items())))
+        function = function.func
+    function = inspect.unwrap(function)
+    code = getattr(function, '__code__', None)
+    identity = (
+        _code_identity(code) if code is not None else None,
+        getattr(function, '__defaults__', None),
+        getattr(function, '__kwdefaults__', None),
+        [cell.cell_contents for cell in getattr(function, '__closure__', None) or ()],
+        bound,
+        sorted(kwargs.items()),
+    )
+    name = f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', repr(function))}"
+    return f"{name}-{_stable_hash(identity):016x}"
+
+
+class LayoutCache:
+    """
+    Caches node positions keyed on a graph-structure fingerprint and the
+    layout algorithm (its code and arguments, see _layout_key), optionally
+    persisted to a directory as .npz files so other processes can reuse
+    them. When the structure changes, algorithms that accept pos/fixed
+    (such as nx.spring_layout) warm-start from the previous positions and
+    only move the nodes that are new.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.stats = {'hits': 0, 'disk_hits': 0, 'warm_starts': 0, 'misses': 0}
+        self._latest = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_layout(self, graph, fingerprint, layout_algorithm, seed=42):
+        """Returns positions for graph, computing them only when not cached."""
+        params = inspect.signature(layout_algorithm).parameters
+        kwargs = {'seed': seed} if 'seed' in params else {}
+        name = _layout_key(layout_algorithm, kwargs)
+        latest = self._latest.get(name)
+        if latest is not None and latest[0] == fingerprint:
+            self.stats['hits'] += 1
+            return latest[1]
+
+        pos = self._load(name, fingerprint, graph)
+        if pos is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            kept = {}
+            if latest is not None and 'pos' in params and 'fixed' in params:
+                previous = latest[1]
+                kept = {node: previous[node] for node in graph if node in previous}
+            if kept:
+                self.stats['warm_starts'] += 1
+                if len(kept) == graph.number_of_nodes():
+                    # Only edges changed; keep every node where it was.
+                    pos = kept
+                else:
+                    pos = layout_algorithm(graph, pos=kept, fixed=list(kept), **kwargs)
+            else:
+                self.stats['misses'] += 1
+                pos = layout_algorithm(graph, **kwargs)
+            self._save(name, fingerprint, pos)
+
+        self._latest[name] = (fingerprint, pos)
+        return pos
+
+    def _path(self, name, fingerprint):
+        safe_name = re.sub(r'[^\w.-]', '_', name)
+        return os.path.join(self.directory, f"{safe_name}-{fingerprint}.npz")
+
+    def _load(self, name, fingerprint, graph):
+        """
+        Reads positions saved by _save. Nodes are stored as their repr and
+        matched against graph's nodes; files that do not fit are ignored.
+        """
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(name, fingerprint), allow_pickle=False) as saved:
+                keys, positions = saved['nodes'].tolist(), saved['positions']
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None
+        nodes = {repr(node): node for node in graph}
+        if len(keys) != len(nodes) or not all(key in nodes for key in keys):
+            return None
+        return {nodes[key]: position for key, position in zip(keys, positions)}
+
+    def _save(self, name, fingerprint, pos):
+        if self.directory is None:
+            return
+        path = self._path(name, fingerprint)
+        nodes = list(pos)
+        positions = np.array([pos[node] for node in nodes], dtype=float) if nodes else np.zeros((0, 2))
+        # Write then rename so concurrent readers never see a partial file.
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as handle:
+            np.savez(handle, nodes=np.array([repr(node) for node in nodes], dtype=str), positions=positions)
+        os.replace(temp_path, path)
+
+
+class QueryResultCache:
+    """
+    Bounded LRU cache of filter results and word frequencies, keyed on the
+    normalized filter spec (see _normalize_filter_spec). Every entry carries
+    the data version it was computed at; the first lookup at a newer version
+    drops all entries. Entries are evicted least recently used first once
+    max_entries or the estimated max_bytes is exceeded (None disables a limit).
+    Lookups and stores are serialized by a lock, so the cache can be shared
+    with a rendering thread.
+    """
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("max_entries must be positive or None.")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be positive or None.")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self.version = None
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_post_ids(self, key, version):
+        """Returns the cached tuple of matched post ids, or None on a miss."""
+        with self._lock:
+            entry = self._lookup(key, version)
+            if entry is None or entry['post_ids'] is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry['post_ids']
+
+    def put_post_ids(self, key, version, post_ids):
+        post_ids = tuple(post_ids)
+        self._store(key, version, 'post_ids', post_ids, sys.getsizeof(post_ids))
+        return post_ids
+
+    def get_frequencies(self, key, stopwords, version):
+        """Returns the cached word Counter for key and stopwords, or None on a miss."""
+        with self._lock:
+            entry = self._lookup(key, version)
+            counts = entry['frequencies'].get(stopwords) if entry is not None else None
+            self.stats['hits' if counts is not None else 'misses'] += 1
+            return counts
+
+    def put_frequencies(self, key, stopwords, version, counts):
+        self._store(key, version, stopwords, counts, sys.getsizeof(counts))
+        return counts
+
+    def info(self):
+        """Returns the statistics plus the current entry count and estimated size."""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self.bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
+
+    def _lookup(self, key, version):
+        self._check_version(version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, version, slot, value, size):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {'post_ids': None, 'frequencies': {}, 'bytes': 0}
+            else:
+                self._entries.move_to_end(key)
+            if slot == 'post_ids':
+                entry['post_ids'] = value
+            else:
+                entry['frequencies'][slot] = value
+            entry['bytes'] += size
+            self.bytes += size
+            while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                                     or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted['bytes']
+                self.stats['evictions'] += 1
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.stats['invalidations'] += 1
+                self.clear()
+            self.version = version
+
+
+# When several relations land on the same user -> post edge, _build_graph
+# leaves the one added by its latest pass; incremental updates follow suit.
+_RELATION_PRIORITY = {'authorship': 0, 'viewed': 1, 'commented_on': 2}
+
+
+def _fold_engagement(data, relation, count, first_time, last_time):
+    """Folds count events between first_time and last_time into a user -> post edge's data."""
+    if _RELATION_PRIORITY[relation] >= _RELATION_PRIORITY.get(data['relation'], -1):
+        data['relation'] = relation
+    if first_time is not None:
+        if data['first_time'] is None or first_time < data['first_time']:
+            data['first_time'] = first_time
+        if data['last_time'] is None or last_time > data['last_time']:
+            data['last_time'] = last_time
+    if relation == 'viewed':
+        data['views'] += count
+    elif relation == 'commented_on':
+        data['comments'] += count
+
+
+def _distinct_counts(*columns):
+    """
+    Returns the distinct rows of aligned integer columns, sorted by the first
+    column, then the second and so on, as one list per column followed by
+    the number of occurrences of each row.
+    """
+    order = np.lexsort(columns[::-1])
+    columns = [np.asarray(column)[order] for column in columns]
+    is_start = np.zeros(len(order), dtype=bool)
+    is_start[:1] = True
+    for column in columns:
+        is_start[1:] |= column[1:] != column[:-1]
+    starts = np.flatnonzero(is_start)
+    counts = np.diff(np.append(starts, len(order)))
+    return [column[starts].tolist() for column in columns] + [counts.tolist()]
+
+
+def _micros_list(times):
+    """
+    Returns (epoch microseconds as an int64 array, aware) for a list of
+    datetimes that are either all naive or all timezone-aware.
+    """
+    if not times:
+        return np.zeros(0, dtype=np.int64), None
+    aware = times[0].tzinfo is not None
+    epoch = _EPOCH_UTC if aware else _EPOCH
+    try:
+        micros = np.fromiter(((value - epoch) // _MICROSECOND for value in times), dtype=np.int64, count=len(times))
+    except TypeError as e:
+        raise ValueError("Cannot mix naive and timezone-aware times in one EngagementTimeSeries.") from e
+    return micros, aware
+
+
+def _datetimes(micros, aware):
+    """Converts an array of epoch microseconds back to a list of datetimes (UTC-aware if aware)."""
+    if aware:
+        return [_EPOCH_UTC + datetime.timedelta(microseconds=value) for value in np.asarray(micros).tolist()]
+    return np.asarray(micros, dtype='datetime64[us]').astype(object).tolist()
+
+
+_EVENT_KINDS = ('view', 'comment')
+
+
+class EngagementTimeSeries:
+    """
+    Per-post and per-user view and comment counts in fixed-width time
+    buckets. Each series is a pair of sorted bucket/count lists, and a
+    global bucket list records which posts were active in each bucket, so
+    window queries only touch the buckets inside the window regardless of
+    how much history has been recorded. Windows are rounded outward to
+    bucket boundaries. Use extend() to count existing events in bulk and
+    record() for single new ones.
+    """
+    def __init__(self, bucket_width=datetime.timedelta(hours=1)):
+        if bucket_width <= datetime.timedelta(0):
+            raise ValueError("bucket_width must be positive.")
+        self.bucket_width = bucket_width
+        self._width_micros = bucket_width // _MICROSECOND
+        self._series = {}
+        self._bucket_ids = []
+        self._bucket_activity = []
+        self._aware = None
+
+    def record(self, post_id, username, kind, event_time):
+        """Counts one 'view' or 'comment' event by username on post_id."""
+        if kind not in _EVENT_KINDS:
+            raise ValueError("kind must be 'view' or 'comment'.")
+        bucket = self._bucket_of(event_time)
+        self._add(('post', post_id, kind), bucket, 1)
+        self._add(('user', username, kind), bucket, 1)
+        self._add_activity(bucket, post_id, _EVENT_KINDS.index(kind), 1)
+
+    def extend(self, post_ids, usernames, posts, users, kinds, micros, aware=False):
+        """
+        Counts many events at once. posts and users are integer arrays
+        indexing post_ids and usernames, kinds holds 0 for a view and 1 for a
+        comment, and micros the event times in epoch microseconds (UTC when
+        aware). Buckets come from one vectorized floor division, and each
+        distinct (post or user, kind, bucket) is added once with its count.
+        """
+        if not len(micros):
+            return
+        if self._aware is None:
+            self._aware = aware
+        elif self._aware != aware:
+            raise ValueError("Cannot mix naive and timezone-aware times in one EngagementTimeSeries.")
+        buckets = np.asarray(micros, dtype=np.int64) // self._width_micros
+        for entity, keys, index in (('post', post_ids, posts), ('user', usernames, users)):
+            for key, kind, bucket, count in zip(*_distinct_counts(index, kinds, buckets)):
+                self._add((entity, keys[key], _EVENT_KINDS[kind]), bucket, count)
+        for bucket, key, kind, count in zip(*_distinct_counts(buckets, posts, kinds)):
+            self._add_activity(bucket, post_ids[key], kind, count)
+
+    def series(self, entity, key, kind='view', start=None, end=None):
+        """
+        Returns [(bucket_start, count), ...] for one post ('post', post_id)
+        or user ('user', username), limited to the [start, end) window.
+        """
+        buckets, counts = self._series.get((entity, key, kind), ((), ()))
+        lo, hi = self._window_slice(buckets, start, end)
+        return [(self._bucket_start(buckets[i]), counts[i]) for i in range(lo, hi)]
+
+    def window_count(self, entity, key, kind='view', start=None, end=None):
+        """Total events for one post or user inside the [start, end) window."""
+        buckets, counts = self._series.get((entity, key, kind), ((), ()))
+        lo, hi = self._window_slice(buckets, start, end)
+        return sum(counts[lo:hi])
+
+    def window_post_counts(self, start=None, end=None):
+        """
+        Returns (post_ids, comment_counts, view_counts) for the posts with any
+        engagement inside the window, as aligned list and NumPy arrays.
+        """
+        lo, hi = self._window_slice(self._bucket_ids, start, end)
+        totals = {}
+        for activity in self._bucket_activity[lo:hi]:
+            for post_id, (views, comments) in activity.items():
+                counts = totals.get(post_id)
+                if counts is None:
+                    totals[post_id] = [views, comments]
+                else:
+                    counts[0] += views
+                    counts[1] += comments
+        post_ids = list(totals)
+        view_counts = np.fromiter((totals[p][0] for p in post_ids), dtype=np.int64, count=len(post_ids))
+        comment_counts = np.fromiter((totals[p][1] for p in post_ids), dtype=np.int64, count=len(post_ids))
+        return post_ids, comment_counts, view_counts
+
+    def latest_time(self):
+        """End of the most recent bucket with any engagement, or None."""
+        if not self._bucket_ids:
+            return None
+        return self._bucket_start(self._bucket_ids[-1] + 1)
+
+    def _add(self, series_key, bucket, count):
+        series = self._series.get(series_key)
+        if series is None:
+            series = self._series[series_key] = ([], [])
+        buckets, counts = series
+        # Events mostly arrive in time order, so the common case is an append.
+        if buckets and buckets[-1] == bucket:
+            counts[-1] += count
+            return
+        i = bisect_left(buckets, bucket)
+        if i < len(buckets) and buckets[i] == bucket:
+            counts[i] += count
+        else:
+            buckets.insert(i, bucket)
+            counts.insert(i, count)
+
+    def _add_activity(self, bucket, post_id, slot, count):
+        bucket_ids = self._bucket_ids
+        if bucket_ids and bucket_ids[-1] == bucket:
+            i = len(bucket_ids) - 1
+        else:
+            i = bisect_left(bucket_ids, bucket)
+            if i == len(bucket_ids) or bucket_ids[i] != bucket:
+                bucket_ids.insert(i, bucket)
+                self._bucket_activity.insert(i, {})
+        counts = self._bucket_activity[i].setdefault(post_id, [0, 0])
+        counts[slot] += count
+
+    def _window_slice(self, buckets, start, end):
+        lo = 0 if start is None else bisect_left(buckets, self._bucket_of(start))
+        if end is None:
+            hi = len(buckets)
+        else:
+            # Buckets overlapping [start, end): exclude the bucket that begins exactly at end.
+            end_micros = self._micros(end)
+            last = -(-end_micros // self._width_micros)
+            hi = bisect_left(buckets, last)
+        return lo, max(lo, hi)
+
+    def _micros(self, event_time):
+        aware = event_time.tzinfo is not None
+        if self._aware is None:
+            self._aware = aware
+        elif self._aware != aware:
+            raise ValueError("Cannot mix naive and timezone-aware times in one EngagementTimeSeries.")
+        return (event_time - (_EPOCH_UTC if aware else _EPOCH)) // _MICROSECOND
+
+    def _bucket_of(self, event_time):
+        return self._micros(event_time) // self._width_micros
+
+    def _bucket_start(self, bucket):
+        return (_EPOCH_UTC if self._aware else _EPOCH) + datetime.timedelta(microseconds=bucket * self._width_micros)
+
+
+class EdgeColumns:
+    """
+    The analyzer's graph edges as growable NumPy columns, kept in step with
+    the graph: one row per edge with the source user, the endorsed user (the
+    post's author for user -> post edges), the connection category code (-1
+    for user -> post edges) and the edge's view and comment counts. Updates
+    are O(1), so InfluenceRanker builds its matrix with array operations
+    instead of walking the graph.
+    """
+    _NAMES = ('source', 'target', 'category', 'views', 'comments')
+
+    def __init__(self):
+        self.usernames = []
+        self.user_rows = {}
+        self.categories = []
+        self._category_codes = {}
+        self._slots = {}
+        self.size = 0
+        self._buffers = {name: np.zeros(0, dtype=np.int64) for name in self._NAMES}
+
+    def column(self, name):
+        return self._buffers[name][:self.size]
+
+    def user_row(self, username):
+        row = self.user_rows.get(username)
+        if row is None:
+            row = self.user_rows[username] = len(self.usernames)
+            self.usernames.append(username)
+        return row
+
+    def set_connection(self, source, target, category):
+        """Records the source -> target connection edge, replacing its category."""
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        slot = self._slot(source, target, target)
+        self._buffers['category'][slot] = code
+
+    def add_engagement(self, username, post_id, author, views=0, comments=0):
+        """Adds views and comments to the username -> post_id edge, creating it if needed."""
+        slot = self._slot(username, post_id, author)
+        self._buffers['views'][slot] += views
+        self._buffers['comments'][slot] += comments
+
+    def add_engagements(self, usernames, post_ids, authors, views):
+        """
+        add_engagement for many distinct edges at once, with views an aligned
+        integer array. Edges that do not exist yet are appended in one step.
+        """
+        keys = list(zip(usernames, post_ids))
+        slots = np.fromiter((self._slots.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        new = np.flatnonzero(slots < 0).tolist()
+        if new:
+            for username in dict.fromkeys([usernames[i] for i in new] + [authors[i] for i in new]):
+                self.user_row(username)
+            start, end = self.size, self.size + len(new)
+            self._reserve(end)
+            self._slots.update(zip([keys[i] for i in new], range(start, end)))
+            self._buffers['source'][start:end] = [self.user_rows[usernames[i]] for i in new]
+            self._buffers['target'][start:end] = [self.user_rows[authors[i]] for i in new]
+            self._buffers['category'][start:end] = -1
+            slots[new] = np.arange(start, end)
+            self.size = end
+        self._buffers['views'][slots] += np.asarray(views, dtype=np.int64)
+
+    def _reserve(self, capacity):
+        size = len(self._buffers['source'])
+        if capacity <= size:
+            return
+        for name in self._NAMES:
+            grown = np.zeros(max(16, 2 * size, capacity), dtype=np.int64)
+            grown[:self.size] = self._buffers[name][:self.size]
+            self._buffers[name] = grown
+
+    def _slot(self, source, node, target):
+        key = (source, node)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = self.size
+            self._reserve(slot + 1)
+            self._buffers['source'][slot] = self.user_row(source)
+            self._buffers['target'][slot] = self.user_row(target)
+            self._buffers['category'][slot] = -1
+            self.size += 1
+        return slot
+
+
+class InfluenceRanker:
+    """
+    PageRank-style user influence over a SciPy CSR matrix. A user endorses
+    another user through a connection (weighted by its category) or by
+    engaging with one of their posts, weighted by the edge's view and comment
+    counts times the 'viewed' / 'commented_on' weights. In approximate mode
+    the heavy hitters of the analyzer's view pair sketch add the views that
+    were not stored as edges.
+    The matrix is built from the analyzer's EdgeColumns with array
+    operations, only when the analyzer version or the weights change, and
+    ranking restarts power iteration from the previous vector.
+    """
+    DEFAULT_RELATION_WEIGHTS = {'friend': 1.0, 'colleague': 1.0, 'viewed': 0.5, 'commented_on': 1.0}
+
+    def __init__(self, relation_weights=None, default_weight=1.0, damping=0.85, tol=1e-10, max_iter=100):
+        self.relation_weights = dict(self.DEFAULT_RELATION_WEIGHTS if relation_weights is None else relation_weights)
+        self.default_weight = default_weight
+        self.damping = damping
+        self.tol = tol
+        self.max_iter = max_iter
+        self.iterations = 0
+        self._matrix_state = None
+        self._vector = None
+
+    def build_matrix(self, analyzer):
+        """
+        Returns (usernames, transition) where transition is the CSR matrix of
+        row-normalized endorsement weights, transposed for power iteration.
+        """
+        key = (analyzer.version, tuple(sorted(self.relation_weights.items())), self.default_weight)
+        if self._matrix_state is not None and self._matrix_state[0] == key:
+            return self._matrix_state[1], self._matrix_state[2]
+
+        from scipy import sparse
+
+        edges = analyzer.edge_columns
+        usernames = list(edges.usernames)
+        sources, targets, categories = edges.column('source'), edges.column('target'), edges.column('category')
+        # The trailing 0 is what user -> post edges (category -1) pick up before np.where replaces it.
+        category_weights = np.array([self.relation_weights.get(category, self.default_weight)
+                                     for category in edges.categories] + [0.0])
+        weights = np.where(categories >= 0, category_weights[categories],
+                           edges.column('views') * self.relation_weights.get('viewed', 0.0)
+                           + edges.column('comments') * self.relation_weights.get('commented_on', 0.0))
+        pairs = analyzer.approximate.heavy_view_pairs() if analyzer.approximate is not None else []
+        if pairs:
+            sources = np.concatenate([sources, [edges.user_rows[username] for (username, _), _ in pairs]])
+            targets = np.concatenate([targets, [edges.user_rows[analyzer.posts[post_id].author.username]
+                                                for (_, post_id), _ in pairs]])
+            weights = np.concatenate([weights, [count * self.relation_weights.get('viewed', 0.0)
+                                                for _, count in pairs]])
+        keep = (weights > 0) & (sources != targets)
+
+        n = len(usernames)
+        matrix = sparse.csr_matrix((weights[keep], (sources[keep], targets[keep])), shape=(n, n))
+        out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+        inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=out_weight > 0)
+        transition = (sparse.diags(inverse) @ matrix).T.tocsr()
+        self._matrix_state = (key, usernames, transition, out_weight == 0)
+        return usernames, transition
+
+    def rank(self, analyzer, warm_start=True):
+        """Returns (usernames, scores) with scores summing to 1."""
+        usernames, transition = self.build_matrix(analyzer)
+        dangling = self._matrix_state[3]
+        n = len(usernames)
+        if n == 0:
+            return usernames, np.zeros(0)
+
+        if warm_start and self._vector is not None and len(self._vector) <= n:
+            # Users are only ever appended, so earlier entries keep their meaning.
+            vector = np.full(n, 1.0 / n)
+            vector[:len(self._vector)] = self._vector
+            vector /= vector.sum()
+        else:
+            vector = np.full(n, 1.0 / n)
+
+        teleport = (1.0 - self.damping) / n
+        for self.iterations in range(1, self.max_iter + 1):
+            dangling_mass = vector[dangling].sum()
+            updated = self.damping * (transition @ vector) + (self.damping * dangling_mass / n + teleport)
+            delta = np.abs(updated - vector).sum()
+            vector = updated
+            if delta < self.tol:
+                break
+
+        self._vector = vector
+        return usernames, vector
+
+    def top_k(self, analyzer, k, warm_start=True):
+        """Returns the k (username, influence) pairs with the highest influence."""
+        usernames, scores = self.rank(analyzer, warm_start)
+        return [(usernames[i], float(scores[i])) for i in _top_k_indices(scores, k).tolist()]
+
+
+def _normalize_filter_spec(include_keywords=None, exclude_keywords=None,
+                           user_attribute_filters=None, post_time_range=None):
+    """
+    Returns a hashable key that is equal for filter arguments selecting the
+    same posts (keyword order and case do not matter).
+    """
+    return (
+        frozenset(k.lower() for k in include_keywords or ()),
+        frozenset(k.lower() for k in exclude_keywords or ()),
+        tuple(sorted(((repr(k), repr(v)) for k, v in (user_attribute_filters or {}).items()))),
+        tuple(post_time_range) if post_time_range else None,
+    )
+
+
+def _word_cloud_title(include_keywords=None, exclude_keywords=None,
+                      user_attribute_filters=None, post_time_range=None):
+    filter_summary = []
+    if include_keywords: filter_summary.append(f"Inc. Keywords: {', '.join(include_keywords)}")
+    if exclude_keywords: filter_summary.append(f"Exc. Keywords: {', '.join(exclude_keywords)}")
+    if user_attribute_filters: filter_summary.append(f"User Attrs: {user_attribute_filters}")
+    if post_time_range: filter_summary.append(f"Time: {post_time_range[0].strftime('%Y-%m-%d')} to {post_time_range[1].strftime('%Y-%m-%d')}")
+
+    title = "Word Cloud"
+    if filter_summary:
+        title += f" ({'; '.join(filter_summary)})"
+    return title
+
+
+def _render_word_cloud_file(word_counts, path, title, max_words, background_color):
+    """
+    Renders a word cloud to an image file without pyplot. Runs in worker
+    processes, so it only takes picklable arguments. Returns elapsed seconds.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from wordcloud import WordCloud
+
+    start = time.perf_counter()
+    wordcloud = WordCloud(width=800, height=400,
+                          background_color=background_color,
+                          max_words=max_words,
+                          min_font_size=10).generate_from_frequencies(word_counts)
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis('off')
+    ax.set_title(title)
+    fig.savefig(path)
+    return time.perf_counter() - start
+
+
+class Instrumentation:
+    """
+    Collects per-stage timings and counters from an analyzer. Attach one with
+    SocialMediaAnalyzer.instrument() or the instrumentation constructor
+    argument; when none is attached, instrumented calls cost a single
+    attribute check.
+
+    Callbacks receive (event, fields) for every finished stage ('stage',
+    with 'stage' and 'seconds') and for analyzer events such as
+    'importance_calculated' or 'no_posts_matched'. With profile=True each
+    outermost instrumented call is also captured with cProfile and stored as
+    pstats.Stats in profiles[call_name].
+    """
+    def __init__(self, callbacks=(), profile=False):
+        self.timings = defaultdict(float)
+        self.stage_calls = Counter()
+        self.counters = Counter()
+        self.callbacks = list(callbacks)
+        self.profile = profile
+        self.profiles = defaultdict(list)
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block as stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def call(self, name):
+        """Like stage, but also profiles the block when it is the outermost call."""
+        profiler = None
+        if self.profile and self._depth == 0:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        self._depth += 1
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            self._depth -= 1
+            if profiler is not None:
+                profiler.disable()
+                self.profiles[name].append(pstats.Stats(profiler))
+
+    def record(self, name, seconds):
+        """Adds an externally measured duration to stage name."""
+        self.timings[name] += seconds
+        self.stage_calls[name] += 1
+        self.emit('stage', stage=name, seconds=seconds)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def emit(self, event, **fields):
+        for callback in self.callbacks:
+            callback(event, fields)
+
+    def summary(self):
+        """Returns plain dicts of timings, stage call counts and counters."""
+        return {'timings': dict(self.timings), 'stage_calls': dict(self.stage_calls),
+                'counters': dict(self.counters)}
+
+
+_NO_STAGE = nullcontext()
+
+
+def _instrumented(name):
+    """Runs the decorated analyzer method inside Instrumentation.call(name) when enabled."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = self.instrumentation
+            if instrumentation is None:
+                return method(self, *args, **kwargs)
+            with instrumentation.call(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
 
 class SocialMediaAnalyzer:
-    def __init__(self, users, posts):
+    def __init__(self, users, posts, compact=False, bucket_width=datetime.timedelta(hours=1), view_store=None,
+                 instrumentation=None, approximate=None):
+        """
+        Args:
+            users (list): User objects.
+            posts (list): Post objects.
+            compact (bool): Store view events in a shared columnar ViewEventStore
+                instead of per-object lists of tuples.
+            bucket_width (timedelta): Bucket width for the engagement time series,
+                which is only filled on first use (see the engagement property).
+            view_store (ViewEventStore): Existing store to use; implies compact.
+            instrumentation (Instrumentation): Collects stage timings and counters,
+                including graph construction. See also instrument().
+            approximate (approximateCounters.ApproximateAnalytics or bool): Opt-in
+                approximate mode (True uses the default error bounds). New views are
+                then kept only in per-post HyperLogLog sketches and a heavy-hitter
+                sketch of view pairs (used by influence ranking and level-of-detail
+                reduction in place of 'viewed' edges), importance counts estimated
+                distinct viewers, and word clouds use count-min heavy hitters.
+        """
+        self.instrumentation = instrumentation
+        if approximate is True:
+            from approximateCounters import ApproximateAnalytics
+            approximate = ApproximateAnalytics()
+        self.approximate = approximate or None
         self.users = {user.username: user for user in users}
         self.posts = {post.post_id: post for post in posts}
+        self.version = 0
+        self.structure_version = 0
+        self.view_store = None
+        if compact or view_store is not None:
+            self.view_store = view_store if view_store is not None else ViewEventStore()
+            self.view_store.adopt(self.users.values(), self.posts.values())
         self.graph = nx.DiGraph()
-        self._build_graph()
+        self.edge_columns = EdgeColumns()
+        for username in self.users:
+            self.edge_columns.user_row(username)
+        with self._stage('build_graph'):
+            self._build_graph()
+        with self._stage('build_indexes'):
+            self._importance = PostImportanceEngine(self.posts.values())
+            self._importance.viewer_sketches = self.approximate
+            self._graph_importance_state = None
+            self._graph_importance_lock = threading.Lock()
+            self._post_index = PostIndex(self.posts.values())
+        self._diagram_cache = None
+        self._detail_cache = {}
+        self._fingerprint_state = None
+        self.layout_cache = LayoutCache()
+        self.content_version = 0
+        self.query_cache = QueryResultCache()
+        self._engagement = EngagementTimeSeries(bucket_width)
+        self._engagement_filled = False
+        self.influence = InfluenceRanker()
+        for post in self.posts.values():
+            self._seed_viewer_sketch(post)
+            self._sketch_words(post)
+
+    @property
+    def engagement(self):
+        """
+        The EngagementTimeSeries of all views and comments. It is filled from
+        the stored events in one vectorized pass on first use and kept up to
+        date by the record methods from then on, so analyzers that never run
+        windowed queries do not pay for it.
+        """
+        if not self._engagement_filled:
+            with self._stage('build_engagement'):
+                self._fill_engagement()
+        return self._engagement
+
+    def _fill_engagement(self):
+        post_ids = list(self.posts)
+        post_rows = {post_id: row for row, post_id in enumerate(post_ids)}
+        usernames = []
+        user_rows = {}
+
+        def user_row(username):
+            row = user_rows.get(username)
+            if row is None:
+                row = user_rows[username] = len(usernames)
+                usernames.append(username)
+            return row
+
+        if self.view_store is not None:
+            store = self.view_store
+            user_column, post_column, time_column = store.column_arrays()
+            store_posts = np.array([post_rows.get(post.post_id, -1) for post in store.posts], dtype=np.int64)
+            store_users = np.array([user_row(user.username) for user in store.users], dtype=np.int64)
+            view_posts = store_posts[post_column]
+            # Views of posts attached to the store but never added to the analyzer are skipped.
+            keep = view_posts >= 0
+            view_posts, view_users, view_micros = view_posts[keep], store_users[user_column[keep]], time_column[keep]
+            view_aware = store._aware
+        else:
+            view_posts, view_users, view_times = array('q'), array('q'), []
+            for row, post in enumerate(self.posts.values()):
+                for viewer, view_time in post.viewers:
+                    view_posts.append(row)
+                    view_users.append(user_row(viewer.username))
+                    view_times.append(view_time)
+            view_micros, view_aware = _micros_list(view_times)
+
+        comment_posts, comment_users, comment_times = array('q'), array('q'), []
+        for row, post in enumerate(self.posts.values()):
+            for comment in post.comments:
+                comment_posts.append(row)
+                comment_users.append(user_row(comment.author.username))
+                comment_times.append(comment.creation_time)
+        comment_micros, comment_aware = _micros_list(comment_times)
+        if len(view_micros) and len(comment_micros) and view_aware != comment_aware:
+            raise ValueError("Cannot mix naive and timezone-aware times in one EngagementTimeSeries.")
+
+        self._engagement.extend(
+            post_ids, usernames,
+            np.concatenate([np.asarray(view_posts, dtype=np.int64), np.asarray(comment_posts, dtype=np.int64)]),
+            np.concatenate([np.asarray(view_users, dtype=np.int64), np.asarray(comment_users, dtype=np.int64)]),
+            np.repeat(np.array([0, 1], dtype=np.int64), [len(view_micros), len(comment_micros)]),
+            np.concatenate([np.asarray(view_micros, dtype=np.int64), comment_micros]),
+            aware=bool(view_aware if len(view_micros) else comment_aware))
+        self._engagement_filled = True
 
     def _build_graph(self):
         for username, user in self.users.items():
@@ -82,51 +1662,400 @@ class SocialMediaAnalyzer:
                                 creation_time=post.creation_time)
 
         for post_id, post in self.posts.items():
-            self.graph.add_edge(post.author.username, post_id, relation='authorship')
-
-        for post_id, post in self.posts.items():
-            for viewer, view_time in post.viewers:
-                self.graph.add_edge(viewer.username, post_id, relation='viewed', view_time=view_time)
+            self._add_engagement_edge(post.author.username, post_id, 'authorship')
 
+        if self.view_store is not None:
+            self._add_logged_view_edges()
+        else:
+            for post_id, post in self.posts.items():
+                for viewer, view_time in post.viewers:
+                    self._add_engagement_edge(viewer.username, post_id, 'viewed', view_time)
 
         for post_id, post in self.posts.items():
             for comment in post.comments:
-                self.graph.add_edge(comment.author.username, post_id, relation='commented_on')
+                self._add_engagement_edge(comment.author.username, post_id, 'commented_on', comment.creation_time)
 
         for username, user in self.users.items():
             for category, connected_users in user.connections.items():
                 for connected_user in connected_users:
                     self.graph.add_edge(username, connected_user.username, relation=category)
+                    self.edge_columns.set_connection(username, connected_user.username, category)
 
+    def _add_logged_view_edges(self):
+        """
+        Adds the 'viewed' edges for every view in the compact-mode log at once.
+        Views are grouped per (post, user) with one lexsort, so each edge is
+        created with its final count and first/last times and no per-view
+        Post.viewers tuples are materialized.
+        """
+        store = self.view_store
+        user_column, post_column, time_column = store.column_arrays()
+        post_ids = list(self.posts)
+        post_rows = {post_id: row for row, post_id in enumerate(post_ids)}
+        store_rows = np.array([post_rows.get(post.post_id, -1) for post in store.posts], dtype=np.int64)
+        rows = store_rows[post_column]
+        # Views of posts attached to the store but never added to the analyzer are skipped.
+        keep = rows >= 0
+        rows, users, times = rows[keep], user_column[keep], time_column[keep]
+        if not len(rows):
+            return
+        order = np.lexsort((times, users, rows))
+        rows, users, times = rows[order], users[order], times[order]
+        is_start = np.ones(len(rows), dtype=bool)
+        is_start[1:] = (rows[1:] != rows[:-1]) | (users[1:] != users[:-1])
+        starts = np.flatnonzero(is_start)
+        ends = np.append(starts[1:], len(rows)) - 1
+        views = ends - starts + 1
+
+        edge_rows = rows[starts]
+        edge_posts = [post_ids[row] for row in edge_rows.tolist()]
+        edge_users = [store.users[key].username for key in users[starts].tolist()]
+        authors = [self.posts[post_id].author.username for post_id in edge_posts]
+        first_times = _datetimes(times[starts], store._aware)
+        last_times = _datetimes(times[ends], store._aware)
+        author_keys = np.array([store._user_index.get(self.posts[post_id].author.username, -1)
+                                for post_id in post_ids], dtype=np.int64)
+        own_posts = users[starts] == author_keys[edge_rows]
+        for i in np.flatnonzero(own_posts).tolist():
+            # An author viewing their own post: only the authorship edge (without times) exists yet.
+            data = self.graph[edge_users[i]][edge_posts[i]]
+            data.update(relation='viewed', views=data['views'] + int(views[i]),
+                        first_time=first_times[i], last_time=last_times[i])
+        self.graph.add_edges_from(
+            (edge_users[i], edge_posts[i], {'relation': 'viewed', 'views': count, 'comments': 0,
+                                            'first_time': first_times[i], 'last_time': last_times[i]})
+            for i, count in zip(np.flatnonzero(~own_posts).tolist(), views[~own_posts].tolist()))
+        self.edge_columns.add_engagements(edge_users, edge_posts, authors, views)
+
+    @contextmanager
+    def instrument(self, callbacks=(), profile=False):
+        """
+        Collects timings and counters for the calls made inside the block:
 
-    def _calculate_post_importance(self, comment_weight=0.5, view_weight=0.5):
-        if not (0 <= comment_weight <= 1 and 0 <= view_weight <= 1 and abs(comment_weight + view_weight - 1) < 1e-6):
-            raise ValueError("Weights must be between 0 and 1 and sum to 1.")
+            with analyzer.instrument() as stats:
+                analyzer.generate_word_cloud(include_keywords=["data"])
+            print(stats.summary())
+        """
+        previous = self.instrumentation
+        self.instrumentation = Instrumentation(callbacks, profile)
+        try:
+            yield self.instrumentation
+        finally:
+            self.instrumentation = previous
+
+    def _stage(self, name):
+        instrumentation = self.instrumentation
+        return instrumentation.stage(name) if instrumentation is not None else _NO_STAGE
+
+    def save(self, path):
+        """
+        Writes a versioned binary snapshot of users, posts, views, comments
+        and connections to path. See analyzerSnapshot for the layout.
+        """
+        from analyzerSnapshot import save_snapshot
+        save_snapshot(self, path)
 
-        max_comments = 0
-        max_views = 0
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a snapshot written by save() into a compact-mode analyzer. Only
+        the view events stay in memory-mapped (copy-on-write) columns, which
+        processes loading the same file share. Users, posts, comments and
+        connections are rebuilt as objects, and the graph and indexes are built
+        as by the constructor, so load time and the rest of the memory still
+        grow with the number of objects.
+        """
+        from analyzerSnapshot import load_snapshot
+        return load_snapshot(path, cls)
 
-        for post_id, post in self.posts.items():
-            num_comments = post.get_num_comments()
-            num_views = post.get_num_views()
-            if num_comments > max_comments:
-                max_comments = num_comments
-            if num_views > max_views:
-                max_views = num_views
+    def partitioned(self, num_partitions=None):
+        """
+        Returns a PartitionedAnalyzer that answers filter, word-frequency and
+        importance queries for this analyzer as map-reduce over creation-time
+        partitions in worker processes. See partitionedQueries.
+        """
+        from partitionedQueries import PartitionedAnalyzer
+        return PartitionedAnalyzer(self, num_partitions)
+
+    def add_user(self, user):
+        """Adds a user node to the graph."""
+        if user.username in self.users:
+            raise ValueError(f"User '{user.username}' already exists.")
+        self.users[user.username] = user
+        if self.view_store is not None:
+            self.view_store.attach_user(user)
+        self.graph.add_node(user.username, type='user', attributes=user.attributes)
+        self.edge_columns.user_row(user.username)
+        self.content_version += 1
+        self.structure_version += 1
+        self.version += 1
+
+    def add_post(self, post):
+        """
+        Adds a post, its authorship edge and any views or comments already
+        attached to it. Unknown authors are added as users first.
+        """
+        if post.post_id in self.posts:
+            raise ValueError(f"Post '{post.post_id}' already exists.")
+        if post.author.username not in self.users:
+            self.add_user(post.author)
+        self.posts[post.post_id] = post
+        # Read the post's own views before a view store takes them over, so
+        # compact mode does not look them up in the shared log.
+        viewers = post.viewers
+        if self.view_store is not None:
+            self.view_store.attach_post(post)
+        self.graph.add_node(post.post_id, type='post', content=post.content,
+                            creation_time=post.creation_time)
+        self._add_engagement_edge(post.author.username, post.post_id, 'authorship')
+        for viewer, view_time in viewers:
+            self._add_engagement_edge(viewer.username, post.post_id, 'viewed', view_time)
+        for comment in post.comments:
+            self._add_engagement_edge(comment.author.username, post.post_id, 'commented_on', comment.creation_time)
+        self._importance.add_post(post)
+        self._post_index.add_post(post)
+        if self._engagement_filled:
+            self._record_existing_engagement(post, viewers)
+        self._seed_viewer_sketch(post, viewers)
+        self._sketch_words(post)
+        self.content_version += 1
+        self.structure_version += 1
+        self.version += 1
+
+    def record_view(self, user, post, view_time):
+        """
+        Records that user viewed post at view_time. In approximate mode the
+        view is not stored and adds no graph edge: it updates the post's
+        viewer sketch, the view pair sketch and the time series, so memory
+        does not grow with the number of distinct viewer/post pairs.
+        """
+        self._require_post(post)
+        if user.username not in self.users:
+            self.add_user(user)
+        if self.approximate is not None:
+            self._importance.post_changed(post, 'view', user)
+            self.approximate.record_view_pair(user.username, post.post_id)
+            # The view is not stored anywhere else, so the time series must be filled first.
+            self.engagement.record(post.post_id, user.username, 'view', view_time)
+            self.version += 1
+            return
+        # The importance engine watches the post, so add_viewer also counts the view there.
+        post.add_viewer(user, view_time)
+        if user.view_store is None or user.view_store is not post.view_store:
+            # In compact mode both lists are views of the same logged event.
+            user.add_read_post(post, view_time)
+        self._add_engagement_edge(user.username, post.post_id, 'viewed', view_time)
+        if self._engagement_filled:
+            self._engagement.record(post.post_id, user.username, 'view', view_time)
+        self.version += 1
+
+    def record_views(self, views):
+        """
+        Records many (user, post, view_time) views with the same result as
+        calling record_view for each. Views are grouped per post and per
+        (user, post) pair: the posts' logs (or the ViewEventStore columns in
+        compact mode) are extended once, and each user -> post edge is
+        updated once with its view count and first/last time.
+        """
+        views = list(views)
+        for post in {id(post): post for _, post, _ in views}.values():
+            self._require_post(post)
+        for username, user in {user.username: user for user, _, _ in views}.items():
+            if username not in self.users:
+                self.add_user(user)
+        if self.approximate is not None:
+            for user, post, view_time in views:
+                self.record_view(user, post, view_time)
+            return
+        if not views:
+            return
+        if self.view_store is not None:
+            # In compact mode the store's columns are both posts' and users' view lists.
+            self.view_store.extend(views)
+        else:
+            by_post = defaultdict(list)
+            for user, post, view_time in views:
+                by_post[post.post_id].append((user, view_time))
+                if user.view_store is None or user.view_store is not post.view_store:
+                    user.add_read_post(post, view_time)
+            for post_id, post_views in by_post.items():
+                self.posts[post_id].add_viewers(post_views)
+        # Group the views per (user, post) with one lexsort, as _add_logged_view_edges does.
+        user_rows, post_index = self.edge_columns.user_rows, self._importance.post_index
+        users = np.fromiter((user_rows[user.username] for user, _, _ in views), dtype=np.int64, count=len(views))
+        posts = np.fromiter((post_index[post.post_id] for _, post, _ in views), dtype=np.int64, count=len(views))
+        times = np.empty(len(views), dtype=object)
+        times[:] = [view_time for _, _, view_time in views]
+        order = np.lexsort((posts, users))
+        users, posts, times = users[order], posts[order], times[order]
+        starts = np.flatnonzero(np.r_[True, (users[1:] != users[:-1]) | (posts[1:] != posts[:-1])])
+        counts = np.diff(np.append(starts, len(order)))
+        first_times = np.minimum.reduceat(times, starts).tolist()
+        last_times = np.maximum.reduceat(times, starts).tolist()
+        usernames = [self.edge_columns.usernames[row] for row in users[starts].tolist()]
+        post_ids = [self._importance.post_ids[row] for row in posts[starts].tolist()]
+        new_edges = []
+        for username, post_id, count, first_time, last_time in zip(usernames, post_ids, counts.tolist(),
+                                                                   first_times, last_times):
+            data = self.graph.get_edge_data(username, post_id)
+            if data is None:
+                new_edges.append((username, post_id, {'relation': 'viewed', 'views': count, 'comments': 0,
+                                                      'first_time': first_time, 'last_time': last_time}))
+            else:
+                _fold_engagement(data, 'viewed', count, first_time, last_time)
+        if new_edges:
+            self.graph.add_edges_from(new_edges)
+            self.structure_version += 1
+        self.edge_columns.add_engagements(usernames, post_ids, [self.posts[post_id].author.username
+                                                                for post_id in post_ids], counts)
+        if self._engagement_filled:
+            for user, post, view_time in views:
+                self._engagement.record(post.post_id, user.username, 'view', view_time)
+        self.version += 1
+
+    def record_comment(self, comment):
+        """Records a comment on its post."""
+        self._require_post(comment.post)
+        if comment.author.username not in self.users:
+            self.add_user(comment.author)
+        comment.post.add_comment(comment)
+        comment.author.add_comment(comment)
+        self._add_engagement_edge(comment.author.username, comment.post.post_id, 'commented_on',
+                                  comment.creation_time)
+        if self._engagement_filled:
+            self._engagement.record(comment.post.post_id, comment.author.username, 'comment',
+                                    comment.creation_time)
+        self.version += 1
+
+    def add_connection(self, user, other_user, category):
+        """Adds a categorized connection (e.g. 'friend') from user to other_user."""
+        for member in (user, other_user):
+            if member.username not in self.users:
+                self.add_user(member)
+        user.add_connection(other_user, category)
+        self.graph.add_edge(user.username, other_user.username, relation=category)
+        self.edge_columns.set_connection(user.username, other_user.username, category)
+        self.structure_version += 1
+        self.version += 1
+
+    def windowed_post_importance(self, start=None, end=None, comment_weight=0.5, view_weight=0.5):
+        """
+        Importance scores using the _calculate_post_importance weighting, but
+        counting only the views and comments inside the [start, end) window.
+        Posts without engagement in the window are omitted (their score is 0).
 
-        norm_max_comments = max_comments if max_comments > 0 else 1
-        norm_max_views = max_views if max_views > 0 else 1
+        Returns:
+            dict: post_id -> importance.
+        """
+        _validate_weights(comment_weight, view_weight)
+        post_ids, comment_counts, view_counts = self.engagement.window_post_counts(start, end)
+        scores = _importance_scores(comment_counts, view_counts, comment_weight, view_weight)
+        return dict(zip(post_ids, scores.tolist()))
 
-        for post_id, post in self.posts.items():
-            normalized_comments = post.get_num_comments() / norm_max_comments
-            normalized_views = post.get_num_views() / norm_max_views
-            importance = (comment_weight * normalized_comments) + (view_weight * normalized_views)
-            self.graph.nodes[post_id]['importance'] = importance
-        print(f"Calculated importance for posts using comment_weight={comment_weight}, view_weight={view_weight}")
+    def top_engaging_posts(self, k, window=datetime.timedelta(hours=24), end=None,
+                           comment_weight=0.5, view_weight=0.5):
+        """
+        Returns the k (post_id, importance) pairs with the highest windowed
+        importance over the window ending at end (default: the latest
+        recorded engagement).
+        """
+        end = end if end is not None else self.engagement.latest_time()
+        if end is None:
+            return []
+        scores = self.windowed_post_importance(end - window, end, comment_weight, view_weight)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def top_influential_users(self, k=10, warm_start=True):
+        """
+        Returns the k (username, influence) pairs ranked by self.influence.
+        Relation weights and damping are configured on that InfluenceRanker.
+        """
+        return self.influence.top_k(self, k, warm_start)
+
+    def _record_existing_engagement(self, post, viewers=None):
+        for viewer, view_time in post.viewers if viewers is None else viewers:
+            self.engagement.record(post.post_id, viewer.username, 'view', view_time)
+        for comment in post.comments:
+            self.engagement.record(post.post_id, comment.author.username, 'comment', comment.creation_time)
+
+    def distinct_viewers(self, post):
+        """
+        Returns the number of distinct users who viewed post; an estimate
+        from its HyperLogLog sketch in approximate mode.
+        """
+        if self.approximate is not None:
+            return self.approximate.distinct_viewers(post.post_id)
+        return len({viewer.username for viewer, _ in post.viewers})
+
+    def _sketch_words(self, post):
+        """
+        In approximate mode, adds the post's words (without the default
+        stopwords, which every query drops) to the current word shard.
+        """
+        if self.approximate is None:
+            return
+        counts = _count_tokens(post.content)
+        for word in _default_stopwords() & counts.keys():
+            del counts[word]
+        self.approximate.record_words(post.post_id, counts)
+
+    def _seed_viewer_sketch(self, post, viewers=None):
+        """In approximate mode, folds a post's stored viewers into its sketch and view count."""
+        if self.approximate is None:
+            return
+        for viewer, _ in post.viewers if viewers is None else viewers:
+            self.approximate.record_view(post.post_id, viewer.username)
+        row = self._importance.post_index[post.post_id]
+        self._importance.record_views(post.post_id, self.approximate.distinct_viewers(post.post_id)
+                                      - int(self._importance.view_counts[row]))
 
+    def _require_post(self, post):
+        if self.posts.get(post.post_id) is not post:
+            raise ValueError(f"Post '{post.post_id}' is not part of this analyzer.")
 
+    def _add_engagement_edge(self, username, post_id, relation, event_time=None):
+        """
+        Folds one authorship, view or comment event into the single user -> post
+        edge. The edge keeps the strongest relation seen ('commented_on' over
+        'viewed' over 'authorship'), the number of views and comments, and the
+        first and last engagement times, so repeated engagement never adds edges.
+        """
+        data = self.graph.get_edge_data(username, post_id)
+        if data is None:
+            self.graph.add_edge(username, post_id, relation=relation, views=0, comments=0,
+                                first_time=event_time, last_time=event_time)
+            data = self.graph[username][post_id]
+            # A first view or comment by this user is a new edge, so the structure changed.
+            self.structure_version += 1
+        _fold_engagement(data, relation, 1, event_time, event_time)
+        self.edge_columns.add_engagement(username, post_id, self.posts[post_id].author.username,
+                                         views=relation == 'viewed', comments=relation == 'commented_on')
+
+    @_instrumented('importance')
+    def _calculate_post_importance(self, comment_weight=0.5, view_weight=0.5):
+        _validate_weights(comment_weight, view_weight)
+
+        scores = self._importance.scores(comment_weight, view_weight)
+
+        # Only write scores back into the graph when they differ from the last write.
+        state = (comment_weight, view_weight, self._importance.version)
+        with self._graph_importance_lock:
+            if state != self._graph_importance_state:
+                nx.set_node_attributes(self.graph, dict(zip(self._importance.post_ids, scores.tolist())),
+                                       'importance')
+                self._graph_importance_state = state
+        logger.debug("Calculated importance for posts using comment_weight=%s, view_weight=%s",
+                     comment_weight, view_weight)
+        if self.instrumentation is not None:
+            self.instrumentation.count('posts_scored', len(scores))
+            self.instrumentation.emit('importance_calculated', comment_weight=comment_weight,
+                                      view_weight=view_weight, num_posts=len(scores))
+
+
+    @_instrumented('create_diagram')
     def create_diagram(self, comment_weight=0.5, view_weight=0.5, layout_algorithm=nx.spring_layout,
-                       dimensions='2d', num_important_posts_to_highlight=5, show_labels=True):
+                       dimensions='2d', num_important_posts_to_highlight=5, show_labels=True,
+                       output_path=None, max_nodes=None, max_communities=None):
         """
         Produces a 2D or 3D diagram of the social media data.
         Highlights the most important posts based on the chosen criteria.
@@ -135,78 +2064,152 @@ class SocialMediaAnalyzer:
             comment_weight (float): Weight for comments in importance calculation (0 to 1).
             view_weight (float): Weight for views in importance calculation (0 to 1).
             layout_algorithm: NetworkX layout function (e.g., nx.spring_layout, nx.circular_layout).
+                Positions are reused from self.layout_cache while the graph structure is unchanged.
             dimensions (str): '2d' or '3d'.
             num_important_posts_to_highlight (int): Number of top posts to visibly highlight.
             show_labels (bool): Whether to show node labels.
+            output_path (str): If given, render headlessly with the Agg backend and save
+                to this file (format from the extension, e.g. .png or .svg) instead of
+                calling plt.show(). Edges are then drawn as a single line collection.
+            max_nodes (int): Node budget. When the graph is larger, only the level-of-detail
+                graph from level_of_detail_graph() is laid out and drawn.
+            max_communities (int): Super-node limit passed to level_of_detail_graph().
+
+        Returns:
+            dict: Seconds spent per stage ('layout', 'nodes', 'edges', 'labels', 'render'),
+                plus 'reduce' when the graph was reduced to max_nodes.
         """
-        self._calculate_post_importance(comment_weight, view_weight)
-
-        node_sizes = []
-        node_colors = []
-        node_labels = {}
-        post_importance_scores = {}
-
-        for node, data in self.graph.nodes(data=True):
-            if data['type'] == 'post':
-                post_importance_scores[node] = data['importance']
-
-        sorted_posts_by_importance = sorted(post_importance_scores.items(), key=lambda item: item[1], reverse=True)
-        highlight_threshold = sorted_posts_by_importance[min(num_important_posts_to_highlight, len(sorted_posts_by_importance)) - 1][1] if sorted_posts_by_importance else 0
-
-        for node, data in self.graph.nodes(data=True):
-            if data['type'] == 'user':
-                node_sizes.append(100)
-                node_colors.append('skyblue')
-                node_labels[node] = node
-            elif data['type'] == 'post':
-                importance = data.get('importance', 0)
-                size = 50 + importance * 300
-                node_sizes.append(size)
-
-                if importance >= highlight_threshold and num_important_posts_to_highlight > 0:
-                    node_colors.append('red')
-                else:
-                    node_colors.append('lightcoral')
-                node_labels[node] = node
+        snapshot = self._diagram_snapshot(comment_weight, view_weight, dimensions,
+                                          num_important_posts_to_highlight, max_nodes, max_communities)
+        return self._draw_diagram(snapshot, layout_algorithm, show_labels, output_path)
 
-        pos = layout_algorithm(self.graph, seed=42)
+    def _diagram_snapshot(self, comment_weight=0.5, view_weight=0.5, dimensions='2d',
+                          num_important_posts_to_highlight=5, max_nodes=None, max_communities=None):
+        """
+        The part of create_diagram that reads the analyzer: importance, the
+        graph to draw (reduced to max_nodes if needed) and the per-node
+        drawing attributes. The result shares no mutable state with the
+        analyzer, so _draw_diagram can lay it out and render it while the
+        analyzer keeps changing.
+        """
+        if dimensions not in ('2d', '3d'):
+            raise ValueError("Dimensions must be '2d' or '3d'.")
 
-        fig = plt.figure(figsize=(12, 10))
+        self._calculate_post_importance(comment_weight, view_weight)
+        timings = {}
+
+        graph = self.graph
+        if max_nodes is not None and graph.number_of_nodes() > max_nodes:
+            stage_start = time.perf_counter()
+            graph = self.level_of_detail_graph(max_nodes, comment_weight, view_weight, max_communities)
+            timings['reduce'] = time.perf_counter() - stage_start
+            fingerprint = graph.graph['fingerprint']
+            arrays = self._graph_arrays(graph)
+        else:
+            fingerprint = self._structure_fingerprint()
+            arrays = self._diagram_arrays()
+            graph = graph.copy()
+
+        nodes = arrays['nodes']
+        is_post = arrays['is_post']
+        is_community = arrays['is_community']
+        scores = self._importance.scores(comment_weight, view_weight)
+        importance = np.zeros(len(nodes))
+        importance[is_post] = scores[arrays['post_rows']]
+        highlight_threshold = self._importance.highlight_threshold(num_important_posts_to_highlight,
+                                                                   comment_weight, view_weight)
+        highlighted = is_post & (importance >= highlight_threshold) & (num_important_posts_to_highlight > 0)
+        node_sizes = np.where(is_post, 50 + importance * 300,
+                              np.where(is_community, 100 + 40 * np.sqrt(arrays['community_sizes']), 100))
+        node_colors = np.where(highlighted, 'red', np.where(is_post, 'lightcoral',
+                                                            np.where(is_community, 'lightgreen', 'skyblue')))
+        node_labels = {node: (f"{data['size']} nodes" if data['type'] == 'community' else node)
+                       for node, data in graph.nodes(data=True)}
+        edge_widths = np.where(arrays['edge_weights'] > 1, 1.0 + np.log(arrays['edge_weights']), 1.0)
+        return {'graph': graph, 'fingerprint': fingerprint, 'arrays': arrays, 'dimensions': dimensions,
+                'comment_weight': comment_weight, 'view_weight': view_weight, 'node_sizes': node_sizes,
+                'node_colors': node_colors, 'node_labels': node_labels, 'edge_widths': edge_widths,
+                'timings': timings}
+
+    def _draw_diagram(self, snapshot, layout_algorithm=nx.spring_layout, show_labels=True, output_path=None):
+        """Lays out and renders a _diagram_snapshot; returns create_diagram's timings."""
+        graph, arrays, dimensions = snapshot['graph'], snapshot['arrays'], snapshot['dimensions']
+        comment_weight, view_weight = snapshot['comment_weight'], snapshot['view_weight']
+        node_sizes, node_colors = snapshot['node_sizes'], snapshot['node_colors']
+        node_labels, edge_widths = snapshot['node_labels'], snapshot['edge_widths']
+        nodes = arrays['nodes']
+        timings = dict(snapshot['timings'])
+
+        stage_start = time.perf_counter()
+        pos = self.layout_cache.get_layout(graph, snapshot['fingerprint'], layout_algorithm)
+        timings['layout'] = time.perf_counter() - stage_start
+
+        if nodes:
+            positions = np.array([pos[node] for node in nodes], dtype=float)
+        else:
+            positions = np.zeros((0, 3 if dimensions == '3d' else 2))
+        if dimensions == '3d' and positions.shape[1] < 3:
+            positions = np.column_stack([positions[:, :2], np.zeros(len(nodes))])
+
+        if output_path is not None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(figsize=(12, 10))
+            FigureCanvasAgg(fig)
+        else:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize=(12, 10))
 
         if dimensions == '2d':
             ax = fig.add_subplot(111)
-            nx.draw_networkx_nodes(self.graph, pos, node_size=node_sizes, node_color=node_colors, ax=ax)
-            nx.draw_networkx_edges(self.graph, pos, edgelist=[(u, v) for u, v, d in self.graph.edges(data=True) if d['relation'] != 'commented_on'],
-                                   arrowsize=10, ax=ax, alpha=0.5)
+            stage_start = time.perf_counter()
+            nx.draw_networkx_nodes(graph, pos, nodelist=nodes, node_size=node_sizes,
+                                   node_color=node_colors.tolist(), ax=ax)
+            timings['nodes'] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            keep = ~arrays['is_comment_edge']
+            if output_path is not None:
+                from matplotlib.collections import LineCollection
+                segments = np.stack([positions[arrays['edge_sources'][keep]],
+                                     positions[arrays['edge_targets'][keep]]], axis=1)
+                ax.add_collection(LineCollection(segments, colors='k', alpha=0.5, linewidths=edge_widths[keep]))
+                ax.autoscale_view()
+            else:
+                edgelist = [arrays['edges'][i] for i in np.flatnonzero(keep)]
+                nx.draw_networkx_edges(graph, pos, edgelist=edgelist, width=edge_widths[keep].tolist(),
+                                       arrowsize=10, ax=ax, alpha=0.5)
+            timings['edges'] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
             if show_labels:
-                nx.draw_networkx_labels(self.graph, pos, labels=node_labels, font_size=8, ax=ax)
+                nx.draw_networkx_labels(graph, pos, labels=node_labels, font_size=8, ax=ax)
+            timings['labels'] = time.perf_counter() - stage_start
+
             ax.set_title(f'Social Network Diagram (2D) - Importance: Comments={comment_weight}, Views={view_weight}')
             ax.set_facecolor('lightgray')
-            plt.axis('off')
+            ax.axis('off')
 
-        elif dimensions == '3d':
+        else:
             from mpl_toolkits.mplot3d import Axes3D
+            from mpl_toolkits.mplot3d.art3d import Line3DCollection
             ax = fig.add_subplot(111, projection='3d')
+            x_coords, y_coords, z_coords = positions[:, 0], positions[:, 1], positions[:, 2]
 
-            if all(len(p) == 3 for p in pos.values()):
-                node_xyz = [(pos[v][0], pos[v][1], pos[v][2]) for v in self.graph.nodes()]
-            else:
-                node_xyz = [(pos[v][0], pos[v][1], 0) for v in self.graph.nodes()]
-
-            x_coords, y_coords, z_coords = zip(*node_xyz)
-
+            stage_start = time.perf_counter()
             ax.scatter(x_coords, y_coords, z_coords, s=node_sizes, c=node_colors, alpha=0.8, edgecolors='w')
+            timings['nodes'] = time.perf_counter() - stage_start
 
-            for edge in self.graph.edges():
-                x = [pos[edge[0]][0], pos[edge[1]][0]]
-                y = [pos[edge[0]][1], pos[edge[1]][1]]
-                z = [pos[edge[0]][2] if len(pos[edge[0]]) == 3 else 0,
-                     pos[edge[1]][2] if len(pos[edge[1]]) == 3 else 0]
-                ax.plot(x, y, z, c='gray', alpha=0.5, linewidth=0.8)
+            stage_start = time.perf_counter()
+            segments = np.stack([positions[arrays['edge_sources']], positions[arrays['edge_targets']]], axis=1)
+            ax.add_collection3d(Line3DCollection(segments, colors='gray', alpha=0.5, linewidths=0.8 * edge_widths))
+            timings['edges'] = time.perf_counter() - stage_start
 
+            stage_start = time.perf_counter()
             if show_labels:
-                for node, (x, y, z) in zip(self.graph.nodes(), node_xyz):
+                for node, (x, y, z) in zip(nodes, positions):
                     ax.text(x, y, z, s=node_labels[node], size=8, zorder=1, color='k')
+            timings['labels'] = time.perf_counter() - stage_start
 
             ax.set_title(f'Social Network Diagram (3D) - Importance: Comments={comment_weight}, Views={view_weight}')
             ax.set_xlabel('X')
@@ -217,72 +2220,296 @@ class SocialMediaAnalyzer:
             ax.set_xticks([])
             ax.set_yticks([])
             ax.set_zticks([])
-            max_range = max(max(x_coords) - min(x_coords), max(y_coords) - min(y_coords), max(z_coords) - min(z_coords))
-            mid_x = (max(x_coords) + min(x_coords)) * 0.5
-            mid_y = (max(y_coords) + min(y_coords)) * 0.5
-            mid_z = (max(z_coords) + min(z_coords)) * 0.5
-            ax.set_xlim(mid_x - max_range / 2, mid_x + max_range / 2)
-            ax.set_ylim(mid_y - max_range / 2, mid_y + max_range / 2)
-            ax.set_zlim(mid_z - max_range / 2, mid_z + max_range / 2)
-
+            if len(nodes):
+                lows, highs = positions.min(axis=0), positions.max(axis=0)
+                max_range = (highs - lows).max()
+                mid_x, mid_y, mid_z = (highs + lows) * 0.5
+                ax.set_xlim(mid_x - max_range / 2, mid_x + max_range / 2)
+                ax.set_ylim(mid_y - max_range / 2, mid_y + max_range / 2)
+                ax.set_zlim(mid_z - max_range / 2, mid_z + max_range / 2)
+
+        stage_start = time.perf_counter()
+        if output_path is not None:
+            fig.savefig(output_path)
         else:
-            raise ValueError("Dimensions must be '2d' or '3d'.")
+            plt.show()
+        timings['render'] = time.perf_counter() - stage_start
+
+        if self.instrumentation is not None:
+            for stage, seconds in timings.items():
+                self.instrumentation.record(f'diagram.{stage}', seconds)
+            self.instrumentation.count('nodes_drawn', len(nodes))
+            self.instrumentation.count('edges_drawn', len(arrays['edges']) if dimensions == '3d'
+                                       else int((~arrays['is_comment_edge']).sum()))
+        return timings
+
+    def _structure_fingerprint(self):
+        """
+        Order-independent hash of the graph's nodes and edges, recomputed only
+        when structure_version changes (new users, posts, connections or
+        user -> post edges). Repeated views and comments only update edge
+        attributes, so they neither rehash nor change the fingerprint.
+        """
+        if self._fingerprint_state is not None and self._fingerprint_state[0] == self.structure_version:
+            return self._fingerprint_state[1]
+        total = sum(_stable_hash(('node', node)) for node in self.graph)
+        total += sum(_stable_hash(('edge', u, v)) for u, v in self.graph.edges())
+        fingerprint = f"{total % (1 << 64):016x}-{self.graph.number_of_nodes()}-{self.graph.number_of_edges()}"
+        self._fingerprint_state = (self.structure_version, fingerprint)
+        return fingerprint
+
+    def _diagram_arrays(self):
+        """
+        Returns node and edge index arrays for drawing, cached until the
+        analyzer's version changes.
+        """
+        cached = self._diagram_cache
+        if cached is not None and cached['version'] == self.version:
+            return cached
+        self._diagram_cache = self._graph_arrays(self.graph)
+        self._diagram_cache['version'] = self.version
+        return self._diagram_cache
+
+    def _graph_arrays(self, graph):
+        """Builds the drawing arrays for graph, which may contain community super-nodes."""
+        nodes = list(graph.nodes())
+        node_index = {node: i for i, node in enumerate(nodes)}
+        node_types = [data['type'] for _, data in graph.nodes(data=True)]
+        is_post = np.fromiter((node_type == 'post' for node_type in node_types), dtype=bool, count=len(nodes))
+        is_community = np.fromiter((node_type == 'community' for node_type in node_types),
+                                   dtype=bool, count=len(nodes))
+        community_sizes = np.fromiter((data.get('size', 0) for _, data in graph.nodes(data=True)),
+                                      dtype=np.int64, count=len(nodes))
+        post_rows = np.fromiter((self._importance.post_index[node] for node, post in zip(nodes, is_post) if post),
+                                dtype=np.int64, count=int(is_post.sum()))
+        edges = list(graph.edges(data=True))
+        edge_sources = np.fromiter((node_index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+        edge_targets = np.fromiter((node_index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+        is_comment_edge = np.fromiter((data.get('relation') == 'commented_on' for _, _, data in edges),
+                                      dtype=bool, count=len(edges))
+        edge_weights = np.fromiter((data.get('weight', 1) for _, _, data in edges),
+                                   dtype=np.int64, count=len(edges))
+
+        return {
+            'nodes': nodes,
+            'is_post': is_post,
+            'is_community': is_community,
+            'community_sizes': community_sizes,
+            'post_rows': post_rows,
+            'edges': [(u, v) for u, v, _ in edges],
+            'edge_sources': edge_sources,
+            'edge_targets': edge_targets,
+            'is_comment_edge': is_comment_edge,
+            'edge_weights': edge_weights,
+        }
+
+    def level_of_detail_graph(self, max_nodes, comment_weight=0.5, view_weight=0.5, max_communities=None):
+        """
+        Reduces the graph to at most max_nodes nodes for drawing.
+
+        The most important posts are kept together with their authors until
+        half of the detail budget is used, then the users engaging most with
+        the kept posts fill the rest (any leftover room goes back to posts).
+        Every other node is collapsed into community super-nodes found by
+        label propagation: the largest max_communities - 1 communities keep
+        their own super-node and the remainder share one. Super-nodes are
+        ('community', i) tuples with type='community' and a size attribute.
+        Edges touching a super-node are merged into one edge per direction
+        with relation='aggregated' and a weight giving the number of edges.
 
-        plt.show()
+        Args:
+            max_nodes (int): Total node budget, super-nodes included.
+            comment_weight (float): Weight for comments when ranking posts.
+            view_weight (float): Weight for views when ranking posts.
+            max_communities (int): Maximum number of super-nodes; defaults to
+                a tenth of max_nodes (at least one).
+
+        Returns:
+            nx.DiGraph: The reduced graph, cached until the analyzer changes.
+                graph.graph['fingerprint'] identifies its structure for layout caching.
+        """
+        if max_nodes <= 0:
+            raise ValueError("max_nodes must be positive.")
+        if max_communities is None:
+            max_communities = max(1, max_nodes // 10)
+        if max_communities <= 0 or max_communities >= max_nodes:
+            raise ValueError("max_communities must be positive and smaller than max_nodes.")
+        key = (self.version, self._importance.version, max_nodes, comment_weight, view_weight, max_communities)
+        cached = self._detail_cache.get(key)
+        if cached is not None:
+            return cached
+
+        graph = self.graph
+        if graph.number_of_nodes() <= max_nodes:
+            reduced = graph.copy()
+        else:
+            kept = self._detail_nodes(max_nodes - max_communities, comment_weight, view_weight)
+            reduced = self._collapse_communities(kept, max_communities)
+        for username, post_id, views in self._sketched_view_pairs():
+            # Sketched views between drawn nodes stand in for the edges approximate mode does not store.
+            if username in reduced and post_id in reduced and not reduced.has_edge(username, post_id):
+                reduced.add_edge(username, post_id, relation='viewed', views=views, comments=0)
+
+        total = sum(_stable_hash(('node', node)) for node in reduced)
+        total += sum(_stable_hash(('edge', u, v)) for u, v in reduced.edges())
+        reduced.graph['fingerprint'] = (f"lod-{total % (1 << 64):016x}-"
+                                        f"{reduced.number_of_nodes()}-{reduced.number_of_edges()}")
+        self._detail_cache = {key: reduced}
+        return reduced
+
+    def _detail_nodes(self, budget, comment_weight, view_weight):
+        """Picks the nodes that level_of_detail_graph draws individually, in priority order."""
+        scores = self._importance.scores(comment_weight, view_weight)
+        post_order = iter([self._importance.post_ids[i] for i in np.argsort(-scores, kind='stable')])
+        kept = {}
+
+        def add_posts(limit):
+            while len(kept) < limit:
+                post_id = next(post_order, None)
+                if post_id is None:
+                    return
+                author = self.posts[post_id].author.username
+                if len(kept) + (author not in kept) + 1 > budget:
+                    return
+                kept[post_id] = None
+                kept[author] = None
+
+        add_posts((budget + 1) // 2)
+        engagement = Counter()
+        for post_id in [node for node in kept if node in self.posts]:
+            for username in self.graph.predecessors(post_id):
+                if username not in kept:
+                    engagement[username] += 1
+        for username, post_id, _ in self._sketched_view_pairs():
+            if post_id in kept and username not in kept and not self.graph.has_edge(username, post_id):
+                engagement[username] += 1
+        for username, _ in engagement.most_common(budget - len(kept)):
+            kept[username] = None
+        add_posts(budget)
+        return kept
+
+    def _sketched_view_pairs(self):
+        """(username, post_id, estimated views) for the heavy view pairs of approximate mode."""
+        if self.approximate is None:
+            return []
+        return [(username, post_id, views) for (username, post_id), views in self.approximate.heavy_view_pairs()]
+
+    def _collapse_communities(self, kept, max_communities):
+        """Builds the reduced graph: kept nodes as-is, the rest merged into super-nodes."""
+        graph = self.graph
+        rest = nx.Graph()
+        rest.add_nodes_from(node for node in graph if node not in kept)
+        rest.add_edges_from((u, v) for u, v in graph.edges() if u not in kept and v not in kept)
+        communities = sorted(nx.community.label_propagation_communities(rest),
+                             key=lambda members: (-len(members), min(map(str, members))))
+        if len(communities) > max_communities:
+            overflow = set().union(*communities[max_communities - 1:])
+            communities = communities[:max_communities - 1] + [overflow]
+
+        reduced = nx.DiGraph()
+        for node in kept:
+            reduced.add_node(node, **graph.nodes[node])
+        community_of = {}
+        for i, members in enumerate(communities):
+            super_node = ('community', i)
+            reduced.add_node(super_node, type='community', size=len(members))
+            for member in members:
+                community_of[member] = super_node
+
+        for u, v, data in graph.edges(data=True):
+            source = community_of.get(u, u)
+            target = community_of.get(v, v)
+            if source == target:
+                continue
+            if u in kept and v in kept:
+                reduced.add_edge(u, v, **data)
+            elif reduced.has_edge(source, target):
+                reduced[source][target]['weight'] += 1
+            else:
+                reduced.add_edge(source, target, relation='aggregated', weight=1)
+        return reduced
 
+    @_instrumented('filter')
     def _get_filtered_posts(self, include_keywords=None, exclude_keywords=None,
                             user_attribute_filters=None, post_time_range=None):
         """
         Filters posts based on keywords, user attributes, and time range.
-        Returns a list of Post objects that match the criteria.
+        Returns a list of Post objects that match the criteria. Matched ids
+        are cached in self.query_cache until a user or post is added.
         """
-        filtered_posts = []
+        cache = self.query_cache
+        if cache is not None:
+            key = _normalize_filter_spec(include_keywords, exclude_keywords,
+                                         user_attribute_filters, post_time_range)
+            cached_ids = cache.get_post_ids(key, self.content_version)
+            if cached_ids is not None:
+                return [self.posts[post_id] for post_id in cached_ids]
 
         include_keywords = [k.lower() for k in include_keywords] if include_keywords else []
         exclude_keywords = [k.lower() for k in exclude_keywords] if exclude_keywords else []
         user_attribute_filters = user_attribute_filters if user_attribute_filters is not None else {}
 
-        for post_id, post in self.posts.items():
-            if post_time_range:
-                start_time, end_time = post_time_range
-                if not (start_time <= post.creation_time <= end_time):
-                    continue
-
-            user_match = True
-            for attr_key, attr_value in user_attribute_filters.items():
-                if attr_key not in post.author.attributes or post.author.attributes[attr_key] != attr_value:
-                    user_match = False
-                    break
-            if not user_match:
-                continue
-
-            post_content_lower = post.content.lower()
-
-            if include_keywords:
-                found_include_keyword = False
-                for keyword in include_keywords:
-                    if keyword in post_content_lower:
-                        found_include_keyword = True
-                        break
-                if not found_include_keyword:
-                    continue
-            
-            found_exclude_keyword = False
-            for keyword in exclude_keywords:
-                if keyword in post_content_lower:
-                    found_exclude_keyword = True
-                    break
-            if found_exclude_keyword:
-                continue
-
-            filtered_posts.append(post)
-
-        return filtered_posts
+        stats = {} if self.instrumentation is not None else None
+        matched_ids = self._post_index.match(include_keywords, exclude_keywords,
+                                             user_attribute_filters, post_time_range, stats)
+        if cache is not None:
+            cache.put_post_ids(key, self.content_version, matched_ids)
+        if stats is not None:
+            self.instrumentation.count('posts_scanned', stats['posts_scanned'])
+            self.instrumentation.count('posts_matched', len(matched_ids))
+        return [self.posts[post_id] for post_id in matched_ids]
+
+    @staticmethod
+    def _stopword_set(stopwords=None):
+        if not stopwords:
+            return _default_stopwords()
+        return _default_stopwords().union(word.lower() for word in stopwords)
+
+    def _filtered_word_frequencies(self, filter_key, posts, final_stopwords):
+        """
+        _word_frequencies for the posts matched by filter_key, served from
+        self.query_cache when possible. In approximate mode these are the
+        count-min heavy hitters instead. The returned Counter is shared with
+        the cache and must not be modified.
+        """
+        cache = self.query_cache
+        word_counts = None
+        if cache is not None:
+            word_counts = cache.get_frequencies(filter_key, final_stopwords, self.content_version)
+        if word_counts is None:
+            if self.approximate is not None:
+                # Tokenize uncovered posts without caching Counters on them.
+                sketch = self.approximate.word_sketch(posts, final_stopwords,
+                                                      tokenize=lambda post: _count_tokens(post.content))
+                word_counts = Counter(dict(sketch.most_common()))
+            else:
+                word_counts = self._word_frequencies(posts, final_stopwords)
+            if cache is not None:
+                cache.put_frequencies(filter_key, final_stopwords, self.content_version, word_counts)
+        return word_counts
 
+    @_instrumented('tokenize')
+    def _word_frequencies(self, posts, final_stopwords=None):
+        """
+        Sums the cached per-post token counts and drops stopwords, giving the
+        same Counter as tokenizing the joined post text.
+        """
+        if final_stopwords is None:
+            final_stopwords = _default_stopwords()
+        word_counts = Counter()
+        for post in posts:
+            word_counts.update(post.token_counts())
+        if self.instrumentation is not None:
+            self.instrumentation.count('tokens_counted', word_counts.total())
+        for word in final_stopwords & word_counts.keys():
+            del word_counts[word]
+        return word_counts
+
+    @_instrumented('generate_word_cloud')
     def generate_word_cloud(self, include_keywords=None, exclude_keywords=None,
                             user_attribute_filters=None, post_time_range=None,
                             max_words=200, stopwords=None, background_color='white'):
-        print("Generating word cloud...")
+        logger.debug("Generating word cloud...")
         filtered_posts = self._get_filtered_posts(
             include_keywords=include_keywords,
             exclude_keywords=exclude_keywords,
@@ -291,39 +2518,163 @@ class SocialMediaAnalyzer:
         )
 
         if not filtered_posts:
-            print("No posts matched the filtering criteria. Cannot generate word cloud.")
+            logger.info("No posts matched the filtering criteria. Cannot generate word cloud.")
+            if self.instrumentation is not None:
+                self.instrumentation.emit('no_posts_matched', include_keywords=include_keywords,
+                                          exclude_keywords=exclude_keywords,
+                                          user_attribute_filters=user_attribute_filters,
+                                          post_time_range=post_time_range)
             return
 
-        all_text = " ".join([post.content for post in filtered_posts])
-
-        words = re.findall(r'\b\w+\b', all_text.lower())
-
-        final_stopwords = set(STOPWORDS)
-        if stopwords:
-            final_stopwords.update(word.lower() for word in stopwords)
-
-        meaningful_words = [word for word in words if word not in final_stopwords and len(word) > 1]
-
-        word_counts = Counter(meaningful_words)
-
-        wordcloud = WordCloud(width=800, height=400,
-                              background_color=background_color,
-                              max_words=max_words,
-                              stopwords=final_stopwords,
-                              min_font_size=10).generate_from_frequencies(word_counts)
-
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        
-        filter_summary = []
-        if include_keywords: filter_summary.append(f"Inc. Keywords: {', '.join(include_keywords)}")
-        if exclude_keywords: filter_summary.append(f"Exc. Keywords: {', '.join(exclude_keywords)}")
-        if user_attribute_filters: filter_summary.append(f"User Attrs: {user_attribute_filters}")
-        if post_time_range: filter_summary.append(f"Time: {post_time_range[0].strftime('%Y-%m-%d')} to {post_time_range[1].strftime('%Y-%m-%d')}")
-        
-        title = "Word Cloud"
-        if filter_summary:
-            title += f" ({'; '.join(filter_summary)})"
-        plt.title(title)
-        plt.show()
\ No newline at end of file
+        final_stopwords = self._stopword_set(stopwords)
+        filter_key = _normalize_filter_spec(include_keywords, exclude_keywords,
+                                            user_attribute_filters, post_time_range)
+        word_counts = self._filtered_word_frequencies(filter_key, filtered_posts, final_stopwords)
+
+        with self._stage('render'):
+            import matplotlib.pyplot as plt
+            from wordcloud import WordCloud
+            wordcloud = WordCloud(width=800, height=400,
+                                  background_color=background_color,
+                                  max_words=max_words,
+                                  stopwords=final_stopwords,
+                                  min_font_size=10).generate_from_frequencies(word_counts)
+
+            plt.figure(figsize=(10, 5))
+            plt.imshow(wordcloud, interpolation='bilinear')
+            plt.axis('off')
+            plt.title(_word_cloud_title(include_keywords, exclude_keywords, user_attribute_filters, post_time_range))
+        plt.show()
+
+    @_instrumented('generate_word_clouds')
+    def generate_word_clouds(self, filter_specs, output_dir, max_words=200, stopwords=None,
+                             background_color='white', image_format='png', max_workers=None):
+        """
+        Generates one word cloud image per filter spec. Filtering runs once
+        per distinct spec, then one shared pass tokenizes every matched post
+        once and adds its counts to each spec that matched it; the WordCloud
+        images are then rendered in a process pool straight to files in
+        output_dir.
+
+        Args:
+            filter_specs (list): Dicts of _get_filtered_posts keyword arguments
+                (include_keywords, exclude_keywords, user_attribute_filters,
+                post_time_range), optionally with a 'name' used in the file name.
+            output_dir (str): Directory for the images; created if missing.
+            image_format (str): File extension, e.g. 'png' or 'svg'.
+            max_workers (int): Pool size; 1 renders in this process.
+
+        Returns:
+            list: One dict per spec with 'path' (None if no posts matched),
+            'num_posts', 'num_words', 'filter_seconds', 'count_seconds' and
+            'render_seconds'.
+        """
+        results, render_jobs = self._word_cloud_jobs(filter_specs, output_dir, max_words, stopwords,
+                                                     background_color, image_format)
+        self._render_word_cloud_jobs(render_jobs, max_workers)
+        return results
+
+    def _word_cloud_jobs(self, filter_specs, output_dir, max_words=200, stopwords=None,
+                         background_color='white', image_format='png'):
+        """
+        The part of generate_word_clouds that reads the analyzer. Returns the
+        per-spec results and the (result, arguments) render jobs, whose word
+        counts are copies that _render_word_cloud_jobs can render while the
+        analyzer keeps changing.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        final_stopwords = self._stopword_set(stopwords)
+        matched = {}
+        entries = []
+        for i, spec in enumerate(filter_specs):
+            spec = dict(spec)
+            name = spec.pop('name', None) or f"wordcloud_{i:03d}"
+            key = _normalize_filter_spec(**spec)
+            result = {'spec': spec, 'path': None, 'filter_seconds': 0.0, 'count_seconds': 0.0,
+                      'render_seconds': 0.0}
+            if key not in matched:
+                stage_start = time.perf_counter()
+                matched[key] = self._get_filtered_posts(**spec)
+                result['filter_seconds'] = time.perf_counter() - stage_start
+            entries.append((name, key, spec, result))
+
+        cache = self.query_cache
+        frequencies = {}
+        count_seconds = {}
+        pending = {}
+        for key, posts in matched.items():
+            stage_start = time.perf_counter()
+            if self.approximate is not None:
+                frequencies[key] = self._filtered_word_frequencies(key, posts, final_stopwords)
+            elif cache is not None:
+                frequencies[key] = cache.get_frequencies(key, final_stopwords, self.content_version)
+            if frequencies.get(key) is None:
+                pending[key] = posts
+            else:
+                count_seconds[key] = time.perf_counter() - stage_start
+        if pending:
+            stage_start = time.perf_counter()
+            shared = self._shared_word_frequencies(pending, final_stopwords)
+            # One pass serves every pending filter, so its time is split evenly between them.
+            share = (time.perf_counter() - stage_start) / len(pending)
+            for key, word_counts in shared.items():
+                if cache is not None:
+                    cache.put_frequencies(key, final_stopwords, self.content_version, word_counts)
+                frequencies[key] = word_counts
+                count_seconds[key] = share
+
+        results = []
+        render_jobs = []
+        for name, key, spec, result in entries:
+            word_counts = frequencies[key]
+            # Repeated filters are computed once; only their first spec reports the time.
+            result['count_seconds'] = count_seconds.pop(key, 0.0)
+            result['num_posts'] = len(matched[key])
+            result['num_words'] = len(word_counts)
+            results.append(result)
+            if word_counts:
+                file_name = re.sub(r'[^\w.-]', '_', str(name))
+                path = os.path.join(output_dir, f"{file_name}.{image_format}")
+                title = _word_cloud_title(spec.get('include_keywords'), spec.get('exclude_keywords'),
+                                          spec.get('user_attribute_filters'), spec.get('post_time_range'))
+                render_jobs.append((result, (dict(word_counts), path, title, max_words, background_color)))
+        return results, render_jobs
+
+    @_instrumented('tokenize')
+    def _shared_word_frequencies(self, posts_by_key, final_stopwords):
+        """
+        _word_frequencies for several post lists in one pass: every post in
+        their union is tokenized once and its counts are added to each list
+        that holds it. Posts are visited in index order, so each Counter
+        lists its words in the same order _word_frequencies would.
+        """
+        keys_of = defaultdict(list)
+        for key, posts in posts_by_key.items():
+            for post in posts:
+                keys_of[post.post_id].append(key)
+        counts = {key: Counter() for key in posts_by_key}
+        for post_id in sorted(keys_of, key=self._post_index.positions.__getitem__):
+            tokens = self.posts[post_id].token_counts()
+            for key in keys_of[post_id]:
+                counts[key].update(tokens)
+        for word_counts in counts.values():
+            if self.instrumentation is not None:
+                self.instrumentation.count('tokens_counted', word_counts.total())
+            for word in final_stopwords & word_counts.keys():
+                del word_counts[word]
+        return counts
+
+    @staticmethod
+    def _render_word_cloud_jobs(render_jobs, max_workers=None):
+        """Renders _word_cloud_jobs output to files, filling in each result's path and render time."""
+        if max_workers == 1 or len(render_jobs) <= 1:
+            for result, job in render_jobs:
+                result['render_seconds'] = _render_word_cloud_file(*job)
+                result['path'] = job[1]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [(result, job[1], pool.submit(_render_word_cloud_file, *job))
+                           for result, job in render_jobs]
+                for result, path, future in futures:
+                    result['render_seconds'] = future.result()
+                    result['path'] = path
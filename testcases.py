@@ -1,5 +1,11 @@
 import datetime
-from socialMediaAnalysis import User, Post, Comment, SocialMediaAnalyzer
+import json
+import os
+import tempfile
+import networkx as nx
+from socialMediaAnalysis import (User, Post, Comment, SocialMediaAnalyzer, ViewEventStore, LayoutCache, Instrumentation,
+                                 EngagementTimeSeries)
+from eventLoader import EventLoader
 
 def test_basic_functionality():
     """Test basic user and post creation"""
@@ -198,6 +204,1005 @@ def test_complex_scenario():
         num_important_posts_to_highlight=3
     )
 
+def test_importance_engine():
+    """Test vectorized importance scores and top-k ranking"""
+    print("\n=== Test 6: Importance Engine ===")
+
+    analyzer = test_basic_functionality()
+    engine = analyzer._importance
+
+    scores = engine.scores(comment_weight=0.7, view_weight=0.3)
+    for post_id, score in zip(engine.post_ids, scores):
+        assert abs(analyzer.graph.nodes[post_id]['importance'] - score) < 1e-12
+
+    # Cached per weight pair until the counts change
+    assert engine.scores(0.7, 0.3) is scores
+    engine.invalidate()
+    assert engine.scores(0.7, 0.3) is not scores
+
+    top = engine.top_k(2, comment_weight=0.7, view_weight=0.3)
+    print(f"Top 2 posts: {top}")
+    assert [post_id for post_id, _ in top] == ["post1", "post2"]
+    assert engine.top_k(10) == engine.top_k(3)
+    assert engine.top_k(0) == []
+    assert abs(engine.highlight_threshold(2, 0.7, 0.3) - 0.65) < 1e-12
+
+    # Views and comments added on the posts directly are counted too
+    post3 = analyzer.posts["post3"]
+    views_before = post3.get_num_views()
+    post3.add_viewer(analyzer.users["alice"], datetime.datetime(2023, 1, 5, 9, 0))
+    post3.add_comment(Comment("c_direct", analyzer.users["bob"], post3, "Direct", datetime.datetime(2023, 1, 5, 9, 5)))
+    row = engine.post_index["post3"]
+    assert engine.view_counts[row] == views_before + 1 == post3.get_num_views()
+    assert engine.comment_counts[row] == post3.get_num_comments()
+    # Watched posts still pickle; the copy has no watchers
+    import pickle
+    copy = pickle.loads(pickle.dumps(post3))
+    assert (copy.post_id, copy.content, copy.get_num_views()) == ("post3", post3.content, post3.get_num_views())
+    assert copy._watchers is None
+
+    empty =SocialMediaAnalyzer([User("alice")], [])
+    assert empty._importance.top_k(5) == []
+    assert empty._importance.highlight_threshold(5) == 0
+
+def _scan_filtered_posts(analyzer, include_keywords=None, exclude_keywords=None,
+                         user_attribute_filters=None, post_time_range=None):
+    """Reference linear scan used to check the indexed filters"""
+    include_keywords = [k.lower() for k in include_keywords or []]
+    exclude_keywords = [k.lower() for k in exclude_keywords or []]
+    matched = []
+    for post in analyzer.posts.values():
+        content = post.content.lower()
+        if post_time_range and not (post_time_range[0] <= post.creation_time <= post_time_range[1]):
+            continue
+        if any(post.author.attributes.get(k, object()) != v for k, v in (user_attribute_filters or {}).items()):
+            continue
+        if include_keywords and not any(k in content for k in include_keywords):
+            continue
+        if any(k in content for k in exclude_keywords):
+            continue
+        matched.append(post)
+    return matched
+
+def test_filter_indexes():
+    """Test that indexed filtering matches a linear scan"""
+    print("\n=== Test 7: Filter Indexes ===")
+
+    analyzer = test_basic_functionality()
+    base_time = datetime.datetime(2024, 1, 1)
+    filter_specs = [
+        {},
+        {"include_keywords": ["technology", "AI"]},
+        {"include_keywords": ["ai"]},  # substring match, e.g. "again"
+        {"include_keywords": ["machine learning", "LA!"]},
+        {"exclude_keywords": ["weather"]},
+        {"exclude_keywords": ["!"]},
+        {"user_attribute_filters": {"location": "NYC"}},
+        {"user_attribute_filters": {"location": "NYC", "age": 22}},
+        {"user_attribute_filters": {"missing": 1}},
+        {"post_time_range": (datetime.datetime(2024, 1, 2), datetime.datetime(2024, 12, 31))},
+        {"post_time_range": (base_time, datetime.datetime(2024, 1, 2, 14, 30))},
+        {"include_keywords": ["post", "book"], "exclude_keywords": ["hello"],
+         "user_attribute_filters": {"location": "NYC"}},
+    ]
+    for spec in filter_specs:
+        indexed = analyzer._get_filtered_posts(**spec)
+        print(f"{spec}: {[post.post_id for post in indexed]}")
+        assert indexed == _scan_filtered_posts(analyzer, **spec)
+
+def test_incremental_updates():
+    """Test that incremental mutations match a full rebuild"""
+    print("\n=== Test 8: Incremental Updates ===")
+
+    alice = User("alice", {"location": "NYC"})
+    bob = User("bob", {"location": "LA"})
+    analyzer = SocialMediaAnalyzer([alice], [])
+    start_version = analyzer.version
+
+    post1 = Post("post1", alice, "Incremental graphs about technology", datetime.datetime(2024, 1, 1))
+    analyzer.add_post(post1)
+    analyzer.record_view(bob, post1, datetime.datetime(2024, 1, 1, 9, 0))
+    analyzer.record_comment(Comment("c1", bob, post1, "Nice", datetime.datetime(2024, 1, 1, 9, 30)))
+    analyzer.record_view(bob, post1, datetime.datetime(2024, 1, 1, 10, 0))
+    analyzer.add_connection(alice, bob, "friend")
+
+    post2 = Post("post2", bob, "Sunny weather", datetime.datetime(2024, 1, 2))
+    post2.add_viewer(alice, datetime.datetime(2024, 1, 2, 8, 0))
+    analyzer.add_post(post2)
+
+    assert analyzer.version > start_version
+    assert bob.posts_read[-1][0] is post1 and len(bob.comments_made) == 1
+
+    rebuilt = SocialMediaAnalyzer([alice, bob], [post1, post2])
+    assert set(analyzer.graph.nodes) == set(rebuilt.graph.nodes)
+    assert sorted(analyzer.graph.edges(data=True)) == sorted(rebuilt.graph.edges(data=True))
+    assert analyzer.graph.nodes["bob"] == rebuilt.graph.nodes["bob"]
+
+    analyzer._calculate_post_importance(0.5, 0.5)
+    rebuilt._calculate_post_importance(0.5, 0.5)
+    for post_id in rebuilt.posts:
+        assert analyzer.graph.nodes[post_id]['importance'] == rebuilt.graph.nodes[post_id]['importance']
+    assert [p.post_id for p in analyzer._get_filtered_posts(include_keywords=["weather"])] == ["post2"]
+
+    # Cached keyword matches catch up on posts added later, and the keyword cache stays bounded
+    index = analyzer._post_index
+    index.max_cached_keywords = 2
+    analyzer.add_post(Post("post3", alice, "More sunny weather", datetime.datetime(2024, 1, 3)))
+    assert [p.post_id for p in analyzer._get_filtered_posts(include_keywords=["weather"])] == ["post2", "post3"]
+    for keyword in ("sunny", "graphs", "more"):
+        analyzer._get_filtered_posts(include_keywords=[keyword])
+    assert list(index._keyword_cache) == ["graphs", "more"]
+
+    try:
+        analyzer.add_post(post1)
+        print("ERROR: Should have raised ValueError")
+    except ValueError as e:
+        print(f"Correctly caught error: {e}")
+
+def test_compact_storage():
+    """Test compact mode with a columnar view event store"""
+    print("\n=== Test 9: Compact Storage ===")
+
+    regular = test_basic_functionality()
+    expected_views = {post_id: list(post.viewers) for post_id, post in regular.posts.items()}
+    expected_edges = sorted(regular.graph.edges(data=True))
+    bob = regular.users["bob"]
+
+    # A read recorded only on the user side joins the shared log on adoption
+    dana = User("dana")
+    dana.add_read_post(regular.posts["post2"], datetime.datetime(2024, 1, 2, 18, 0))
+    bob.add_read_post(regular.posts["post2"], datetime.datetime(2024, 1, 2, 18, 0))
+    expected_views["post2"].append((bob, datetime.datetime(2024, 1, 2, 18, 0)))
+    expected_views["post2"].append((dana, datetime.datetime(2024, 1, 2, 18, 0)))
+
+    compact = SocialMediaAnalyzer(list(regular.users.values()) + [dana], list(regular.posts.values()),
+                                  compact=True)
+    for post_id, post in compact.posts.items():
+        assert post.viewers == expected_views[post_id]
+        assert post.get_num_views() == len(expected_views[post_id])
+    assert len(compact.graph.edges) == len(expected_edges) + 1  # bob already has an authorship edge to post2
+    assert [(p.post_id, t) for p, t in bob.posts_read] == [
+        ("post1", datetime.datetime(2024, 1, 1, 11, 0)),
+        ("post3", datetime.datetime(2024, 1, 3, 11, 0)),
+        ("post2", datetime.datetime(2024, 1, 2, 18, 0)),
+    ]
+
+    post3 = compact.posts["post3"]
+    compact.record_view(bob, post3, datetime.datetime(2024, 1, 3, 12, 0))
+    assert post3.get_num_views() == 3 and len(bob.posts_read) == 4
+    assert compact._importance.view_counts[compact._importance.post_index["post3"]] == 3
+
+    try:
+        post3.viewers = []
+        print("ERROR: Should have raised AttributeError")
+    except AttributeError as e:
+        print(f"Correctly caught error: {e}")
+
+    usage = compact.view_store.memory_usage()
+    print(f"Compact view storage: {usage}")
+    assert usage['events'] == len(compact.view_store) == 9
+    assert usage['column_bytes'] == 24 * usage['events']
+    # Reading viewers and posts_read built cached argsorts, which are counted too
+    groupings = compact.view_store._groupings.values()
+    assert usage['index_bytes'] == sum(16 * sorted_length for sorted_length, _, _ in groupings) > 0
+    assert usage['bytes'] == usage['column_bytes'] + usage['index_bytes']
+    assert 24 < usage['bytes_per_event'] < usage['legacy_bytes_per_event']
+
+    store = ViewEventStore()
+    aware_post = Post("aware", User("dana"), "Timezones", datetime.datetime(2024, 1, 1))
+    aware_time = datetime.datetime(2024, 1, 1, 5, 0, tzinfo=datetime.timezone.utc)
+    store.attach_post(aware_post)
+    aware_post.add_viewer(User("erin"), aware_time)
+    assert aware_post.viewers[0][1] == aware_time
+
+    # Reads between appends scan the unsorted tail instead of re-sorting the whole log
+    store = ViewEventStore()
+    readers = [User(f"reader{i}") for i in range(3)]
+    streamed = [Post(f"stream{i}", readers[0], "Streaming", datetime.datetime(2024, 1, 1)) for i in range(2)]
+    expected = {post.post_id: [] for post in streamed}
+    for post in streamed:
+        store.attach_post(post)
+    for i in range(6000):
+        view = (readers[i % 3], datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=i))
+        streamed[i % 2].add_viewer(*view)
+        expected[streamed[i % 2].post_id].append(view)
+        if i % 1000 == 0:
+            assert streamed[0].viewers == expected["stream0"]
+    assert store._groupings['post'][0] < len(store)
+    assert [post.viewers for post in streamed] == [expected["stream0"], expected["stream1"]]
+
+def test_event_loader():
+    """Test streaming ingestion from JSONL and CSV event dumps"""
+    print("\n=== Test 10: Event Loader ===")
+
+    events = [
+        {"type": "view", "username": "bob", "post_id": "post1", "view_time": "2024-01-01T11:00:00"},
+        {"type": "post", "post_id": "post1", "author": "alice",
+         "content": "Hello world! This is my first post about technology.", "creation_time": "2024-01-01T10:00:00"},
+        {"type": "user", "username": "alice", "attributes": {"age": 25, "location": "NYC"}},
+        {"type": "user", "username": "bob", "attributes": {"age": 30, "location": "LA"}},
+        {"type": "comment", "comment_id": "c1", "username": "bob", "post_id": "post1",
+         "content": "Great first post!", "creation_time": "2024-01-01T11:30:00"},
+        {"type": "connection", "username": "alice", "other_username": "bob", "category": "friend"},
+        {"type": "view", "username": "carol", "post_id": "post1", "view_time": "2024-01-01T12:00:00"},
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl_path = os.path.join(tmp, "events.jsonl")
+        with open(jsonl_path, "w") as handle:
+            handle.writelines(json.dumps(event) + "\n" for event in events)
+
+        analyzer = SocialMediaAnalyzer([], [])
+        loader = EventLoader(analyzer, batch_size=2)
+        batches = []
+        stats = loader.load(jsonl_path, progress=batches.append)
+        print(f"Loaded JSONL: {stats}")
+
+        assert len(batches) == 4
+        assert stats['rows'] == 7 and stats['applied'] == 6 and stats['pending'] == 1
+        assert loader.missing_entities() == [("user", "carol")]
+        post1 = analyzer.posts["post1"]
+        assert post1.get_num_views() == 1 and post1.get_num_comments() == 1
+        assert analyzer.graph["bob"]["post1"]["relation"] == "commented_on"
+        assert analyzer.graph["alice"]["bob"]["relation"] == "friend"
+
+        loader.create_missing_users()
+        assert loader.pending_count == 0 and post1.get_num_views() == 2
+
+        csv_path = os.path.join(tmp, "more.csv")
+        with open(csv_path, "w") as handle:
+            handle.write("type,username,attributes,post_id,author,content,creation_time,view_time\n")
+            handle.write('post,,,post2,carol,Weekend hiking trip,2024-01-02T08:00:00,\n')
+            handle.write('view,alice,,post2,,,,2024-01-02T09:00:00\n')
+            handle.write('user,bob,"{""age"": 30}",,,,,\n')
+        stats = loader.load(csv_path)
+        print(f"Loaded CSV: {stats}")
+        assert stats['duplicates'] == 1
+        assert [p.post_id for p in analyzer._get_filtered_posts(include_keywords=["hiking"])] == ["post2"]
+
+    # A chunk's views are recorded in one bulk call, with the same result as one record_view per view
+    views = [{"type": "view", "username": f"u{i % 3}", "post_id": f"p{i % 2}",
+              "view_time": f"2024-01-0{1 + i % 4}T10:00:00"} for i in range(12)]
+    setup = [{"type": "user", "username": f"u{i}"} for i in range(3)] + \
+            [{"type": "post", "post_id": f"p{i}", "author": "u0", "content": "bulk", "creation_time": "2024-01-01T09:00:00"}
+             for i in range(2)]
+    for compact in (False, True):
+        bulk = SocialMediaAnalyzer([], [], compact=compact)
+        EventLoader(bulk, batch_size=100).load_chunks([views + setup])
+        single = SocialMediaAnalyzer([], [], compact=compact)
+        single_loader = EventLoader(single)
+        for row in setup + views:
+            single_loader.apply(row)
+        assert sorted(bulk.graph.edges(data=True)) == sorted(single.graph.edges(data=True))
+        assert bulk._calculate_post_importance() == single._calculate_post_importance()
+        assert [(user.username, t) for user, t in bulk.posts["p0"].viewers] == \
+               [(user.username, t) for user, t in single.posts["p0"].viewers]
+        assert [(post.post_id, t) for post, t in bulk.users["u1"].posts_read] == \
+               [(post.post_id, t) for post, t in single.users["u1"].posts_read]
+        edge_views = lambda columns: {key: int(columns.column("views")[slot]) for key, slot in columns._slots.items()}
+        assert edge_views(bulk.edge_columns) == edge_views(single.edge_columns)
+
+def test_headless_diagram():
+    """Test rendering diagrams straight to image files"""
+    print("\n=== Test 11: Headless Diagram ===")
+    import matplotlib.pyplot as plt
+
+    analyzer = test_basic_functionality()
+    open_figures = plt.get_fignums()
+    with tempfile.TemporaryDirectory() as tmp:
+        for dimensions, extension in (("2d", "png"), ("3d", "svg")):
+            path = os.path.join(tmp, f"diagram_{dimensions}.{extension}")
+            timings = analyzer.create_diagram(dimensions=dimensions, output_path=path,
+                                              num_important_posts_to_highlight=2)
+            print(f"{dimensions} render timings: {timings}")
+            assert set(timings) == {"layout", "nodes", "edges", "labels", "render"}
+            assert os.path.getsize(path) > 0
+    assert plt.get_fignums() == open_figures
+
+    arrays = analyzer._diagram_arrays()
+    assert arrays is analyzer._diagram_arrays()
+    assert int(arrays['is_comment_edge'].sum()) == 3
+    analyzer.add_user(User("dana"))
+    assert analyzer._diagram_arrays() is not arrays
+
+def test_layout_cache():
+    """Test layout reuse, warm starts and on-disk persistence"""
+    print("\n=== Test 12: Layout Cache ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = test_basic_functionality()
+        analyzer.layout_cache = LayoutCache(tmp)
+        image_path = os.path.join(tmp, "diagram.png")
+
+        analyzer.create_diagram(output_path=image_path)
+        first_layout = analyzer.layout_cache.get_layout(analyzer.graph, analyzer._structure_fingerprint(),
+                                                        nx.spring_layout)
+        analyzer.create_diagram(comment_weight=0.9, view_weight=0.1, output_path=image_path)
+        print(f"Layout cache stats after weight tweak: {analyzer.layout_cache.stats}")
+        assert analyzer.layout_cache.stats['misses'] == 1 and analyzer.layout_cache.stats['hits'] == 2
+
+        # A repeated view changes no structure, so the fingerprint is neither changed nor recomputed
+        fingerprint = analyzer._structure_fingerprint()
+        state = analyzer._fingerprint_state
+        analyzer.record_view(analyzer.users["bob"], analyzer.posts["post1"], datetime.datetime(2024, 1, 5))
+        assert analyzer._structure_fingerprint() == fingerprint
+        assert analyzer._fingerprint_state is state
+
+        analyzer.add_user(User("dana"))
+        analyzer.create_diagram(output_path=image_path)
+        warm_layout = analyzer.layout_cache.get_layout(analyzer.graph, analyzer._structure_fingerprint(),
+                                                       nx.spring_layout)
+        assert analyzer.layout_cache.stats['warm_starts'] == 1
+        assert all((warm_layout[node] == first_layout[node]).all() for node in first_layout)
+        assert "dana" in warm_layout
+
+        # Another process (a fresh cache on the same directory) reuses the saved layout
+        other = LayoutCache(tmp)
+        reloaded = other.get_layout(analyzer.graph, analyzer._structure_fingerprint(), nx.spring_layout)
+        assert other.stats['disk_hits'] == 1
+        assert all((reloaded[node] == warm_layout[node]).all() for node in warm_layout)
+
+        assert all(name.endswith(".npz") for name in os.listdir(tmp) if name != "diagram.png")
+
+        # Different lambdas are different layouts, even though they share a qualified name
+        fingerprint = analyzer._structure_fingerprint()
+        circle = other.get_layout(analyzer.graph, fingerprint, lambda graph: nx.circular_layout(graph))
+        shell = other.get_layout(analyzer.graph, fingerprint, lambda graph: nx.shell_layout(graph))
+        assert other.stats['misses'] == 2
+        assert circle is not shell
+
+        # A first view by a user adds a user -> post edge, which is a structure change
+        analyzer.record_view(analyzer.users["dana"], analyzer.posts["post1"], datetime.datetime(2024, 1, 6))
+        assert analyzer._structure_fingerprint() != fingerprint
+
+        timings = analyzer.create_diagram(layout_algorithm=nx.circular_layout, output_path=image_path)
+        assert timings['layout'] >= 0
+
+def test_cached_word_frequencies():
+    """Test that cached per-post token counts give the same word frequencies"""
+    print("\n=== Test 13: Cached Word Frequencies ===")
+    import re
+    from collections import Counter
+    from wordcloud import STOPWORDS
+
+    analyzer = test_basic_functionality()
+    for spec, extra_stopwords in (({}, None), ({"include_keywords": ["post", "LA"]}, ["first"]),
+                                  ({"user_attribute_filters": {"location": "NYC"}}, ["Hello"])):
+        posts = analyzer._get_filtered_posts(**spec)
+        words = re.findall(r'\b\w+\b', " ".join(post.content for post in posts).lower())
+        stopwords = set(STOPWORDS) | {word.lower() for word in extra_stopwords or []}
+        expected = Counter(word for word in words if word not in stopwords and len(word) > 1)
+        frequencies = analyzer._word_frequencies(posts, analyzer._stopword_set(extra_stopwords))
+        print(f"{spec}: {dict(frequencies)}")
+        assert list(frequencies.items()) == list(expected.items())
+
+    post1 = analyzer.posts["post1"]
+    assert post1.token_counts() is post1.token_counts()
+    assert [p.post_id for p in analyzer._get_filtered_posts(include_keywords=["i"])] == ["post1", "post2", "post3"]
+
+def test_batch_word_clouds():
+    """Test batch word cloud generation rendered in a process pool"""
+    print("\n=== Test 14: Batch Word Clouds ===")
+
+    analyzer = test_basic_functionality()
+    filter_specs = [
+        {"name": "nyc", "user_attribute_filters": {"location": "NYC"}},
+        {"name": "tech", "include_keywords": ["technology", "AI"]},
+        {"name": "tech_again", "include_keywords": ["ai", "Technology"]},
+        {"name": "none", "include_keywords": ["blockchain"]},
+        {"post_time_range": (datetime.datetime(2024, 1, 2), datetime.datetime(2024, 12, 31))},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = analyzer.generate_word_clouds(filter_specs, tmp, max_workers=2)
+        for result in results:
+            print(f"{result['path']}: {result['num_posts']} posts, {result['num_words']} words, "
+                  f"render {result['render_seconds']:.3f}s")
+
+        assert [os.path.basename(r['path']) if r['path'] else None for r in results] == [
+            "nyc.png", "tech.png", "tech_again.png", None, "wordcloud_004.png"]
+        assert all(os.path.getsize(r['path']) > 0 for r in results if r['path'])
+        assert results[2]['num_words'] == results[1]['num_words'] and results[2]['filter_seconds'] == 0.0
+        assert results[3]['num_posts'] == 0
+        assert [r['num_posts'] for r in results] == [
+            len(analyzer._get_filtered_posts(**{k: v for k, v in spec.items() if k != "name"}))
+            for spec in filter_specs]
+
+    # Counting is one shared pass: each matched post is tokenized once for all specs
+    from collections import Counter
+    stopword_set = analyzer._stopword_set()
+    posts_by_spec = {i: analyzer._get_filtered_posts(**{k: v for k, v in spec.items() if k != "name"})
+                     for i, spec in enumerate(filter_specs)}
+    calls = Counter()
+    token_counts = Post.token_counts
+    Post.token_counts = lambda post: (calls.update([post.post_id]), token_counts(post))[1]
+    try:
+        shared = analyzer._shared_word_frequencies(posts_by_spec, stopword_set)
+    finally:
+        Post.token_counts = token_counts
+    assert calls and set(calls.values()) == {1}
+    for i, posts in posts_by_spec.items():
+        assert list(shared[i].items()) == list(analyzer._word_frequencies(posts, stopword_set).items())
+
+def test_engagement_time_series():
+    """Test time-bucketed engagement counts and windowed importance"""
+    print("\n=== Test 15: Engagement Time Series ===")
+
+    analyzer = test_basic_functionality()
+    day = datetime.datetime(2024, 1, 1)
+
+    # The series is filled in bulk on first use, with the same buckets as recording event by event
+    assert not analyzer._engagement_filled
+    reference = EngagementTimeSeries()
+    for post in analyzer.posts.values():
+        for viewer, view_time in post.viewers:
+            reference.record(post.post_id, viewer.username, "view", view_time)
+        for comment in post.comments:
+            reference.record(post.post_id, comment.author.username, "comment", comment.creation_time)
+    assert analyzer.engagement._series == reference._series
+    assert analyzer.engagement._bucket_activity == reference._bucket_activity
+
+    views = analyzer.engagement.series("post", "post1", "view")
+    print(f"post1 views per hour: {views}")
+    assert views == [(day.replace(hour=11), 1), (day.replace(hour=12), 1)]
+    assert analyzer.engagement.window_count("user", "bob", "view") == 2
+    assert analyzer.engagement.window_count("post", "post1", "comment",
+                                            start=day.replace(hour=12), end=day.replace(hour=13)) == 1
+
+    # A window spanning all history matches the regular importance scores
+    analyzer._calculate_post_importance(0.7, 0.3)
+    windowed = analyzer.windowed_post_importance(comment_weight=0.7, view_weight=0.3)
+    for post_id, score in windowed.items():
+        assert abs(score - analyzer.graph.nodes[post_id]['importance']) < 1e-12
+
+    analyzer.record_view(analyzer.users["alice"], analyzer.posts["post3"], datetime.datetime(2024, 1, 3, 10, 30))
+    analyzer.record_comment(Comment("c4", analyzer.users["bob"], analyzer.posts["post3"], "Which book?",
+                                    datetime.datetime(2024, 1, 3, 11, 15)))
+    top = analyzer.top_engaging_posts(2, window=datetime.timedelta(hours=24))
+    print(f"Most engaging posts in the last 24h: {top}")
+    assert [post_id for post_id, _ in top] == ["post3", "post2"]  # post2 was engaged on Jan 2 after 12:00
+    assert analyzer.top_engaging_posts(2, window=datetime.timedelta(hours=6)) == [("post3", 1.0)]
+    assert analyzer.engagement.series("post", "post3", "view") == [
+        (datetime.datetime(2024, 1, 3, 10), 2), (datetime.datetime(2024, 1, 3, 11), 1)]
+
+    empty = SocialMediaAnalyzer([User("alice")], [])
+    assert empty.top_engaging_posts(3) == []
+
+def test_user_influence():
+    """Test sparse-matrix influence ranking against networkx PageRank"""
+    print("\n=== Test 16: User Influence ===")
+
+    analyzer = test_basic_functionality()
+    top = analyzer.top_influential_users(3)
+    print(f"Influence ranking: {top}")
+
+    weights = analyzer.influence.relation_weights
+    endorsements = nx.DiGraph()
+    endorsements.add_nodes_from(analyzer.users)
+    for source, target, data in analyzer.graph.edges(data=True):
+        if target in analyzer.posts:
+            target = analyzer.posts[target].author.username
+            weight = data['views'] * weights['viewed'] + data['comments'] * weights['commented_on']
+        else:
+            weight = weights.get(data['relation'], 1.0)
+        if source != target and weight > 0:
+            previous = endorsements.get_edge_data(source, target, {}).get('weight', 0)
+            endorsements.add_edge(source, target, weight=previous + weight)
+    expected = nx.pagerank(endorsements, alpha=0.85, tol=1e-12)
+    for username, score in top:
+        assert abs(score - expected[username]) < 1e-6
+    assert abs(sum(score for _, score in top) - 1) < 1e-9
+
+    # After an update the ranking restarts from the previous vector
+    cold_iterations = analyzer.influence.iterations
+    analyzer.add_connection(analyzer.users["charlie"], analyzer.users["alice"], "friend")
+    analyzer.add_user(User("dana"))
+    warm = analyzer.top_influential_users(4)
+    assert len(warm) == 4 and analyzer.influence.iterations <= cold_iterations
+
+    # The ranker's edge columns follow every graph update without a rebuild
+    analyzer.record_view(analyzer.users["dana"], analyzer.posts["post1"], datetime.datetime(2024, 1, 4, 9, 0))
+    edges = analyzer.edge_columns
+    assert edges.size == analyzer.graph.number_of_edges()
+    assert edges.column('views').sum() == sum(views for _, _, views in analyzer.graph.edges(data='views', default=0))
+    assert dict(analyzer.top_influential_users(4))["alice"] > dict(warm)["alice"]
+
+    assert SocialMediaAnalyzer([], []).top_influential_users(5) == []
+
+def test_snapshot_round_trip():
+    """Test binary snapshot save/load with memory-mapped sections"""
+    print("\n=== Test 17: Snapshot Round Trip ===")
+    import numpy as np
+
+    analyzer = test_basic_functionality()
+    analyzer.users["alice"].add_post(analyzer.posts["post1"])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "analyzer.snap")
+        analyzer.save(path)
+        loaded = SocialMediaAnalyzer.load(path)
+        print(f"Snapshot size: {os.path.getsize(path)} bytes, loaded {len(loaded.users)} users, "
+              f"{len(loaded.posts)} posts")
+
+        assert isinstance(loaded.view_store.time_column, np.memmap)
+        assert list(loaded.users) == list(analyzer.users)
+        assert sorted(loaded.graph.edges(data=True)) == sorted(analyzer.graph.edges(data=True))
+        def edge_views(columns):
+            return {key: int(columns.column('views')[slot]) for key, slot in columns._slots.items()}
+        assert edge_views(loaded.edge_columns) == edge_views(analyzer.edge_columns)
+        for post_id, post in analyzer.posts.items():
+            copy = loaded.posts[post_id]
+            assert (copy.content, copy.creation_time, copy.author.username) == \
+                   (post.content, post.creation_time, post.author.username)
+            assert [(u.username, t) for u, t in copy.viewers] == [(u.username, t) for u, t in post.viewers]
+            assert [(c.comment_id, c.author.username, c.content, c.creation_time) for c in copy.comments] == \
+                   [(c.comment_id, c.author.username, c.content, c.creation_time) for c in post.comments]
+        alice = loaded.users["alice"]
+        assert {k: [u.username for u in v] for k, v in alice.connections.items()} == \
+               {"friend": ["bob"], "colleague": ["charlie"]}
+        assert [p.post_id for p in alice.posts_authored] == ["post1"]
+        assert loaded.users["alice"].attributes == {"age": 25, "location": "NYC"}
+
+        loaded._calculate_post_importance(0.7, 0.3)
+        analyzer._calculate_post_importance(0.7, 0.3)
+        for post_id in analyzer.posts:
+            assert loaded.graph.nodes[post_id]['importance'] == analyzer.graph.nodes[post_id]['importance']
+
+        # Writing to a loaded analyzer copies the mapped columns instead of touching the file
+        loaded.record_view(loaded.users["charlie"], loaded.posts["post3"], datetime.datetime(2024, 1, 4))
+        assert loaded.posts["post3"].get_num_views() == 3
+        assert SocialMediaAnalyzer.load(path).posts["post3"].get_num_views() == 2
+
+        # Compact analyzers snapshot straight from their columns
+        compact_path = os.path.join(tmp, "compact.snap")
+        loaded.save(compact_path)
+        reloaded = SocialMediaAnalyzer.load(compact_path)
+        assert reloaded.posts["post3"].viewers[-1][1] == datetime.datetime(2024, 1, 4)
+
+        with open(os.path.join(tmp, "bogus.snap"), "wb") as handle:
+            handle.write(b"not a snapshot at all, definitely")
+        try:
+            SocialMediaAnalyzer.load(os.path.join(tmp, "bogus.snap"))
+            print("ERROR: Should have raised ValueError")
+        except ValueError as e:
+            print(f"Correctly caught error: {e}")
+
+def test_benchmark_suite():
+    """Smoke test for the synthetic benchmark suite"""
+    print("\n=== Test 18: Benchmark Suite ===")
+    import benchmark
+
+    users, posts = benchmark.generate_synthetic_data(200, seed=7)
+    again_users, again_posts = benchmark.generate_synthetic_data(200, seed=7)
+    assert [p.content for p in posts] == [p.content for p in again_posts]
+    assert sum(p.get_num_views() for p in posts) == sum(p.get_num_views() for p in again_posts)
+    assert sum(len(others) for u in users for others in u.connections.values()) > len(users)
+
+    results = benchmark.run_benchmarks([200], seed=7, measure_memory=False, diagram_max_posts=200)
+    operations = results['results']['200']
+    assert set(operations) == {'init', 'calculate_post_importance', 'get_filtered_posts',
+                               'word_frequencies', 'create_diagram'}
+
+    slower = json.loads(json.dumps(results))
+    slower['results']['200']['init']['seconds'] = operations['init']['seconds'] * 2
+    assert benchmark.compare_to_baseline(results, results) == []
+    assert [r[:3] for r in benchmark.compare_to_baseline(slower, results)] == [('200', 'init', 'seconds')]
+
+def test_instrumentation():
+    """Test structured stage timings, counters and callbacks"""
+    print("\n=== Test 19: Instrumentation ===")
+    alice = User("alice", {"location": "NYC"})
+    bob = User("bob", {"location": "LA"})
+    time = datetime.datetime(2024, 1, 1)
+    post1 = Post("post1", alice, "Data science and data pipelines", time)
+    post2 = Post("post2", bob, "Weather is sunny", time)
+    post1.add_viewer(bob, time)
+    analyzer = SocialMediaAnalyzer([alice, bob], [post1, post2])
+    assert analyzer.instrumentation is None
+
+    events = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with analyzer.instrument(callbacks=[lambda event, fields: events.append((event, fields))],
+                                 profile=True) as stats:
+            analyzer.generate_word_clouds([{"include_keywords": ["data"]}], tmp)
+            analyzer.generate_word_cloud(include_keywords=["nothing-matches-this"])
+            analyzer.create_diagram(output_path=os.path.join(tmp, "diagram.png"))
+    assert analyzer.instrumentation is None
+
+    summary = stats.summary()
+    print(f"Summary: {summary}")
+    assert {'filter', 'tokenize', 'generate_word_clouds', 'generate_word_cloud', 'importance',
+            'create_diagram', 'diagram.layout', 'diagram.render'} <= set(summary['timings'])
+    assert summary['stage_calls']['filter'] == 2
+    assert summary['counters']['posts_matched'] == 1
+    assert summary['counters']['tokens_counted'] == 5
+    assert summary['counters']['nodes_drawn'] == 4
+    assert summary['counters']['edges_drawn'] == 3
+    assert any(event == 'no_posts_matched' for event, _ in events)
+    assert any(event == 'importance_calculated' and fields['num_posts'] == 2 for event, fields in events)
+    assert any(event == 'stage' and fields['stage'] == 'filter' for event, fields in events)
+    assert set(stats.profiles) == {'generate_word_clouds', 'generate_word_cloud', 'create_diagram'}
+
+    built = SocialMediaAnalyzer([alice, bob], [post1, post2], instrumentation=Instrumentation())
+    assert built.instrumentation.stage_calls['build_graph'] == 1
+
+def test_lazy_plotting_imports():
+    """Test that the analytics core imports without the plotting stack"""
+    print("\n=== Test 20: Lazy Plotting Imports ===")
+    import benchmark
+
+    record = benchmark.measure_import_time("socialMediaAnalysis", repeats=2)
+    print(f"import socialMediaAnalysis: {record['seconds']:.3f}s, heavy modules: {record['heavy_modules']}")
+    assert record['heavy_modules'] == []
+    assert record['seconds'] > 0
+
+    from wordcloud import STOPWORDS
+    assert SocialMediaAnalyzer._stopword_set() == frozenset(STOPWORDS)
+
+    baseline = {'import': {'socialMediaAnalysis': {'seconds': record['seconds'] / 2}}, 'results': {}}
+    current = {'import': {'socialMediaAnalysis': record}, 'results': {}}
+    assert [r[:3] for r in benchmark.compare_to_baseline(current, baseline)] == \
+        [('import', 'socialMediaAnalysis', 'seconds')]
+
+def test_level_of_detail_diagram():
+    """Test level-of-detail reduction of large graphs for diagrams"""
+    print("\n=== Test 21: Level-of-Detail Diagram ===")
+    import benchmark
+
+    users, posts = benchmark.generate_synthetic_data(600, seed=3)
+    analyzer = SocialMediaAnalyzer(users, posts)
+    full_nodes = analyzer.graph.number_of_nodes()
+
+    reduced = analyzer.level_of_detail_graph(80, comment_weight=0.6, view_weight=0.4, max_communities=8)
+    print(f"Reduced {full_nodes} nodes to {reduced.number_of_nodes()}")
+    assert reduced.number_of_nodes() <= 80
+    assert reduced is analyzer.level_of_detail_graph(80, 0.6, 0.4, 8)
+
+    communities = [node for node, data in reduced.nodes(data=True) if data['type'] == 'community']
+    assert 1 <= len(communities) <= 8
+    detailed = [node for node in reduced if node not in communities]
+    assert sum(reduced.nodes[node]['size'] for node in communities) + len(detailed) == full_nodes
+
+    top_post, _ = analyzer._importance.top_k(1, 0.6, 0.4)[0]
+    assert top_post in reduced
+    assert analyzer.posts[top_post].author.username in reduced
+    for u, v, data in reduced.edges(data=True):
+        if u in communities or v in communities:
+            assert data['relation'] == 'aggregated' and data['weight'] >= 1
+        else:
+            assert analyzer.graph.has_edge(u, v)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with analyzer.instrument() as stats:
+            timings = analyzer.create_diagram(0.6, 0.4, output_path=os.path.join(tmp, "lod.png"),
+                                              max_nodes=80, max_communities=8)
+        assert 'reduce' in timings
+        assert os.path.getsize(os.path.join(tmp, "lod.png")) > 0
+        assert stats.counters['nodes_drawn'] == reduced.number_of_nodes()
+
+    small = SocialMediaAnalyzer(users[:3], [])
+    assert small.level_of_detail_graph(80).number_of_nodes() == 3
+    try:
+        analyzer.level_of_detail_graph(10, max_communities=10)
+        print("ERROR: Should have raised ValueError")
+    except ValueError as e:
+        print(f"Correctly caught error: {e}")
+
+def test_query_service():
+    """Test the asyncio query service with concurrent clients and ingest"""
+    print("\n=== Test 22: Query Service ===")
+    import asyncio
+    from queryService import QueryService, QueryClient, ReadWriteLock
+
+    alice = User("alice", {"location": "NYC"})
+    bob = User("bob", {"location": "LA"})
+    time = datetime.datetime(2024, 1, 1)
+    post1 = Post("post1", alice, "Data science is fun", time)
+    post2 = Post("post2", bob, "Sunny weather today", time)
+    post1.add_viewer(bob, time)
+    analyzer = SocialMediaAnalyzer([alice, bob], [post1, post2])
+
+    async def scenario(tmp):
+        async with QueryService(analyzer) as service:
+            host, port = service.address
+            clients = [await QueryClient.connect(host, port) for _ in range(4)]
+            queries = [client.request("filter", include_keywords=["data"]) for client in clients for _ in range(5)]
+            ingest = clients[0].request("ingest", events=[
+                {"type": "post", "post_id": "post3", "author": "bob", "content": "More data please",
+                 "creation_time": "2024-01-02T00:00:00"},
+                {"type": "view", "username": "alice", "post_id": "post3", "view_time": "2024-01-02T01:00:00"},
+                {"type": "view", "username": "alice", "post_id": "post3", "view_time": "2024-01-02T02:00:00"},
+            ])
+            results = await asyncio.gather(*queries, ingest)
+            for result in results[:-1]:
+                assert result['post_ids'] in (["post1"], ["post1", "post3"])
+            assert results[-1]['applied'] == 3
+
+            assert (await clients[1].request("filter", include_keywords=["data"]))['post_ids'] == ["post1", "post3"]
+            ranked = await clients[1].request("importance", k=1, comment_weight=0.0, view_weight=1.0)
+            assert ranked[0][0] == "post3"
+            window = await clients[2].request("filter", post_time_range=["2024-01-01T12:00:00", "2024-01-03T00:00:00"])
+            assert window['post_ids'] == ["post3"]
+            frequencies = dict(map(tuple, await clients[2].request("word_frequencies", include_keywords=["data"])))
+            assert frequencies["data"] == 2
+            clouds = await clients[3].request("word_clouds", output_dir=tmp, max_workers=1,
+                                              filter_specs=[{"include_keywords": ["data"], "name": "data"}])
+            assert os.path.exists(clouds[0]['path'])
+            timings = await clients[3].request("diagram", output_path=os.path.join(tmp, "diagram.png"))
+            assert 'render' in timings
+            try:
+                await clients[0].request("no_such_op")
+                print("ERROR: Should have raised ValueError")
+            except ValueError as e:
+                print(f"Correctly caught error: {e}")
+            # Unexpected handler failures (here an OSError from savefig) are answered too
+            try:
+                await clients[3].request("diagram", output_path=os.path.join(tmp, "missing", "diagram.png"))
+                print("ERROR: Should have raised ValueError")
+            except ValueError as e:
+                print(f"Correctly caught error: {e}")
+
+            stats = await clients[0].request("stats")
+            for client in clients:
+                await client.close()
+        return stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = asyncio.run(scenario(tmp))
+    print(f"Stats: {stats}")
+    assert stats['requests']['filter'] == 22
+    assert stats['errors'] == {'no_such_op': 1, 'diagram': 1}
+    assert stats['latency']['filter']['p50'] <= stats['latency']['filter']['p99']
+    assert stats['max_queue_depth'] >= 1 and stats['queue_depth'] == 1
+
+    async def lock_order():
+        lock, order = ReadWriteLock(), []
+        async def reader(name, delay):
+            await asyncio.sleep(delay)
+            async with lock.read():
+                order.append(f"{name} start")
+                await asyncio.sleep(0.02)
+                order.append(f"{name} end")
+        async def writer():
+            await asyncio.sleep(0.005)
+            async with lock.write():
+                order.append("write")
+        await asyncio.gather(reader("r1", 0), writer(), reader("r2", 0.01))
+        return order
+    assert asyncio.run(lock_order()) == ["r1 start", "r1 end", "write", "r2 start", "r2 end"]
+
+    async def render_order():
+        # Renders only hold the read lock while preparing, so ingest and later reads need not wait for drawing
+        import time as clock
+        async with QueryService(analyzer) as service:
+            order = []
+            render = asyncio.create_task(service._run_render(
+                lambda: order.append("prepared"), lambda _: (clock.sleep(0.2), order.append("rendered"))))
+            await asyncio.sleep(0.05)
+            async with service.lock.write():
+                order.append("write")
+            await service.handle({"op": "filter", "params": {}})
+            order.append("read")
+            await render
+        return order
+    assert asyncio.run(render_order()) == ["prepared", "write", "read", "rendered"]
+
+def test_aggregated_engagement_edges():
+    """Test that repeated engagement aggregates into one edge per user and post"""
+    print("\n=== Test 23: Aggregated Engagement Edges ===")
+    alice = User("alice")
+    bob = User("bob")
+    start = datetime.datetime(2024, 1, 1, 9)
+    post = Post("post1", alice, "Hello", start)
+    post.add_viewer(bob, start + datetime.timedelta(hours=3))
+    post.add_viewer(bob, start + datetime.timedelta(hours=1))
+    analyzer = SocialMediaAnalyzer([alice, bob], [post])
+
+    edge = analyzer.graph["bob"]["post1"]
+    assert edge['relation'] == 'viewed' and edge['views'] == 2 and edge['comments'] == 0
+    assert edge['first_time'] == start + datetime.timedelta(hours=1)
+    assert edge['last_time'] == start + datetime.timedelta(hours=3)
+
+    edges_before = analyzer.graph.number_of_edges()
+    for hours in range(4, 10):
+        analyzer.record_view(bob, post, start + datetime.timedelta(hours=hours))
+    analyzer.record_comment(Comment("c1", bob, post, "Nice", start + datetime.timedelta(hours=12)))
+    analyzer.record_view(bob, post, start + datetime.timedelta(hours=11))
+    assert analyzer.graph.number_of_edges() == edges_before
+    print(f"Aggregated edge: {edge}")
+    assert edge['relation'] == 'commented_on' and edge['views'] == 9 and edge['comments'] == 1
+    assert edge['last_time'] == start + datetime.timedelta(hours=12)
+
+    author_edge = analyzer.graph["alice"]["post1"]
+    assert author_edge['relation'] == 'authorship' and author_edge['views'] == 0
+    assert author_edge['first_time'] is None
+
+    for post_id, row in analyzer._importance.post_index.items():
+        in_edges = analyzer.graph.in_edges(post_id, data=True)
+        assert sum(data['views'] for _, _, data in in_edges) == analyzer._importance.view_counts[row]
+        assert sum(data['comments'] for _, _, data in in_edges) == analyzer._importance.comment_counts[row]
+
+    rebuilt = SocialMediaAnalyzer(list(analyzer.users.values()), list(analyzer.posts.values()))
+    assert sorted(rebuilt.graph.edges(data=True)) == sorted(analyzer.graph.edges(data=True))
+
+def test_query_result_cache():
+    """Test the versioned LRU cache for filter results and word frequencies"""
+    print("\n=== Test 24: Query Result Cache ===")
+    from socialMediaAnalysis import QueryResultCache, _normalize_filter_spec
+    alice = User("alice", {"location": "NYC"})
+    bob = User("bob", {"location": "LA"})
+    time = datetime.datetime(2024, 1, 1)
+    posts = [Post("post1", alice, "Data science and data pipelines", time),
+             Post("post2", bob, "Weather is sunny", time),
+             Post("post3", alice, "More data please", time)]
+    analyzer = SocialMediaAnalyzer([alice, bob], posts)
+    cache = analyzer.query_cache
+
+    first = analyzer._get_filtered_posts(include_keywords=["Data"], user_attribute_filters={"location": "NYC"})
+    again = analyzer._get_filtered_posts(include_keywords=["data"], user_attribute_filters={"location": "NYC"})
+    assert [p.post_id for p in first] == [p.post_id for p in again] == ["post1", "post3"]
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+    # Engagement does not change filter results, so it keeps the cache warm
+    analyzer.record_view(bob, posts[0], time)
+    key = _normalize_filter_spec(["data"], None, {"location": "NYC"})
+    stopwords = analyzer._stopword_set()
+    counts = analyzer._filtered_word_frequencies(key, first, stopwords)
+    assert counts is analyzer._filtered_word_frequencies(key, first, stopwords)
+    assert counts["data"] == 3 and cache.stats['hits'] == 2
+
+    analyzer.add_post(Post("post4", bob, "Data for everyone", time))
+    refreshed = analyzer._get_filtered_posts(include_keywords=["data"])
+    assert [p.post_id for p in refreshed] == ["post1", "post3", "post4"]
+    assert cache.stats['invalidations'] == 1 and len(cache) == 1
+
+    small = SocialMediaAnalyzer([alice, bob], [])
+    small.query_cache = QueryResultCache(max_entries=2)
+    for keyword in ("a", "b", "c"):
+        small._get_filtered_posts(include_keywords=[keyword])
+    info = small.query_cache.info()
+    print(f"Cache info: {info}")
+    assert info['entries'] == 2 and info['evictions'] == 1 and info['bytes'] > 0
+
+    tiny = QueryResultCache(max_entries=None, max_bytes=1)
+    tiny.put_post_ids("key", 0, ["post1"])
+    assert len(tiny) == 0 and tiny.bytes == 0
+
+    analyzer.query_cache = None
+    assert [p.post_id for p in analyzer._get_filtered_posts(include_keywords=["data"])] == ["post1", "post3", "post4"]
+    try:
+        QueryResultCache(max_entries=0)
+        print("ERROR: Should have raised ValueError")
+    except ValueError as e:
+        print(f"Correctly caught error: {e}")
+
+def test_partitioned_queries():
+    """Test that partitioned map-reduce queries match the serial results"""
+    print("\n=== Test 25: Partitioned Queries ===")
+    import benchmark
+    import numpy as np
+
+    users, posts = benchmark.generate_synthetic_data(400, seed=5)
+    analyzer = SocialMediaAnalyzer(users, posts)
+    analyzer.query_cache = None
+    specs = benchmark.FILTER_SPECS + [
+        {"post_time_range": (posts[50].creation_time, posts[150].creation_time)},
+        {"include_keywords": ["music"], "exclude_keywords": ["coffee"]},
+    ]
+    stopwords = analyzer._stopword_set()
+
+    with analyzer.partitioned(3) as partitioned:
+        partitioned.sync()
+        assert len(partitioned.partitions) == 3
+        assert sum(partition['size'] for partition in partitioned.partitions) == 400
+        for spec in specs:
+            serial = analyzer._get_filtered_posts(**spec)
+            assert partitioned.get_filtered_posts(**spec) == serial
+            expected = analyzer._word_frequencies(serial, stopwords)
+            actual = partitioned.word_frequencies(**spec)
+            assert actual == expected and list(actual) == list(expected)
+        assert np.array_equal(partitioned.importance_scores(0.6, 0.4), analyzer._importance.scores(0.6, 0.4))
+
+        # Engagement-only changes resend counts; new posts are shipped to the partition covering them
+        analyzer.record_view(users[0], posts[7], posts[7].creation_time)
+        assert np.array_equal(partitioned.importance_scores(0.6, 0.4), analyzer._importance.scores(0.6, 0.4))
+        assert partitioned.top_k(5, 0.6, 0.4) == analyzer._importance.top_k(5, 0.6, 0.4)
+        posts[9].add_viewer(users[2], posts[9].creation_time)
+        assert np.array_equal(partitioned.importance_scores(0.6, 0.4), analyzer._importance.scores(0.6, 0.4))
+        pools, sizes = list(partitioned._pools), [p['size'] for p in partitioned.partitions]
+        analyzer.add_user(User("newcomer", {"location": "Oslo"}))
+        late_post = Post("late", analyzer.users["newcomer"], "Data science late post", datetime.datetime(2030, 1, 1))
+        late_post.add_viewer(users[0], datetime.datetime(2030, 1, 2))
+        analyzer.add_post(late_post)
+        late = partitioned.filter_post_ids(include_keywords=["data"],
+                                           post_time_range=(datetime.datetime(2029, 1, 1), datetime.datetime(2031, 1, 1)))
+        assert late == ["late"]
+        assert partitioned._pools == pools
+        assert [p['size'] for p in partitioned.partitions] == sizes[:-1] + [sizes[-1] + 1]
+        assert partitioned.partitions[-1]['end'] == datetime.datetime(2030, 1, 1)
+        assert partitioned.get_filtered_posts(user_attribute_filters={"location": "Oslo"}) == [late_post]
+        assert np.array_equal(partitioned.importance_scores(0.6, 0.4), analyzer._importance.scores(0.6, 0.4))
+        for spec in specs:
+            assert partitioned.get_filtered_posts(**spec) == analyzer._get_filtered_posts(**spec)
+        print(f"Partitions: {[(p['start'], p['end'], p['size']) for p in partitioned.partitions]}")
+
+    empty = SocialMediaAnalyzer([], [])
+    with empty.partitioned(2) as partitioned:
+        assert partitioned.filter_post_ids() == [] and len(partitioned.importance_scores()) == 0
+
+def test_approximate_counters():
+    """Test HyperLogLog viewers and count-min word frequencies in approximate mode"""
+    print("\n=== Test 26: Approximate Counters ===")
+    from collections import Counter
+    from approximateCounters import HyperLogLog, CountMinSketch, ApproximateAnalytics
+
+    left, right = HyperLogLog(error=0.02), HyperLogLog(error=0.02)
+    for i in range(20000):
+        (left if i % 2 else right).add(f"user{i % 15000}")
+    merged = left.merge(right).count()
+    print(f"HyperLogLog estimate for 15000 distinct: {merged}")
+    assert abs(merged - 15000) < 15000 * 0.06
+    assert left.memory_usage() == 1 << left.precision
+
+    words = ["data"] * 500 + ["music"] * 300 + ["coffee"] * 100 + [f"rare{i}" for i in range(2000)]
+    exact = Counter(words)
+    shards = [CountMinSketch(epsilon=1e-3, delta=0.01, heavy_hitters=3) for _ in range(2)]
+    for i, shard in enumerate(shards):
+        shard.update(Counter(words[i::2]))
+    combined = shards[0].merge(shards[1])
+    assert [word for word, _ in combined.most_common()] == ["data", "music", "coffee"]
+    assert all(exact[word] <= combined.estimate(word) <= exact[word] + 1e-3 * combined.total * 3
+               for word in ("data", "music", "rare7"))
+    try:
+        combined.merge(CountMinSketch(epsilon=1e-2))
+        print("ERROR: Should have raised ValueError")
+    except ValueError as e:
+        print(f"Correctly caught error: {e}")
+
+    alice, bob, carol = User("alice"), User("bob"), User("carol")
+    time = datetime.datetime(2024, 1, 1)
+    post1 = Post("post1", alice, "Data data science", time)
+    post2 = Post("post2", bob, "Music and coffee", time)
+    post1.add_viewer(bob, time)
+    post1.add_viewer(bob, time)
+    analyzer = SocialMediaAnalyzer([alice, bob, carol], [post1, post2],
+                                   approximate=ApproximateAnalytics(heavy_hitters=2))
+    assert analyzer.distinct_viewers(post1) == 1
+    for _ in range(5):
+        analyzer.record_view(carol, post2, time)
+    analyzer.record_view(alice, post2, time)
+    assert post2.get_num_views() == 0 and analyzer.distinct_viewers(post2) == 2
+    # New views add no per-pair edges; the view pair sketch feeds influence ranking and level of detail
+    assert not analyzer.graph.has_edge("carol", "post2")
+    assert dict(analyzer.approximate.heavy_view_pairs())[("carol", "post2")] == 5
+    usernames, transition = analyzer.influence.build_matrix(analyzer)
+    assert transition[usernames.index("bob"), usernames.index("carol")] == 1.0
+    assert analyzer.level_of_detail_graph(100)["carol"]["post2"]["views"] == 5
+    assert list(analyzer._importance.view_counts) == [1, 2]
+    analyzer._calculate_post_importance(0.0, 1.0)
+    assert analyzer.graph.nodes["post2"]["importance"] == 1.0
+
+    frequencies = analyzer._filtered_word_frequencies(None, list(analyzer.posts.values()), analyzer._stopword_set())
+    print(f"Approximate frequencies: {frequencies}")
+    assert len(frequencies) == 2 and frequencies["data"] == 2
+
+    # Words are sketched per shard at ingest; queries merge whole shards and tokenize the rest uncached
+    post3 = Post("post3", carol, "Science music", time)
+    sharded = SocialMediaAnalyzer([alice, bob, carol], [post1, post2, post3],
+                                  approximate=ApproximateAnalytics(heavy_hitters=10, shard_posts=2))
+    assert [len(post_ids) for _, post_ids in sharded.approximate.word_shards] == [2, 1]
+    everything = sharded._filtered_word_frequencies(None, [post1, post2, post3], sharded._stopword_set(["coffee"]))
+    assert everything == Counter({"data": 2, "science": 2, "music": 2})
+    partial = sharded._filtered_word_frequencies(("partial",), [post1, post3], sharded._stopword_set())
+    assert partial == Counter({"data": 2, "science": 2, "music": 1})
+    assert all(post._token_counts is None for post in (post1, post2, post3))
+    # A query's own stopwords do not eat into the heavy hitters it returns
+    wordy = SocialMediaAnalyzer([alice], [Post("wordy", alice, "alpha alpha alpha beta beta gamma", time)],
+                                approximate=ApproximateAnalytics(heavy_hitters=2))
+    words = wordy._filtered_word_frequencies(None, list(wordy.posts.values()), wordy._stopword_set(["alpha"]))
+    assert words == Counter({"beta": 2, "gamma": 1})
+
+    exact_analyzer = SocialMediaAnalyzer([alice, bob, carol], [post1, post2])
+    assert exact_analyzer.distinct_viewers(post1) == 1 and exact_analyzer.approximate is None
+
 if __name__ == "__main__":
     # Run all tests
     test_basic_functionality()
@@ -205,5 +1210,26 @@ if __name__ == "__main__":
     test_network_visualization()
     test_edge_cases()
     test_complex_scenario()
+    test_importance_engine()
+    test_filter_indexes()
+    test_incremental_updates()
+    test_compact_storage()
+    test_event_loader()
+    test_headless_diagram()
+    test_layout_cache()
+    test_cached_word_frequencies()
+    test_batch_word_clouds()
+    test_engagement_time_series()
+    test_user_influence()
+    test_snapshot_round_trip()
+    test_benchmark_suite()
+    test_instrumentation()
+    test_lazy_plotting_imports()
+    test_level_of_detail_diagram()
+    test_query_service()
+    test_aggregated_engagement_edges()
+    test_query_result_cache()
+    test_partitioned_queries()
+    test_approximate_counters()
     
     print("\n=== All Tests Completed ===")